@@ -2,25 +2,27 @@
 
 from langgraph.graph import StateGraph, END
 from langchain.schema import HumanMessage, SystemMessage
-from langchain_openai.chat_models import ChatOpenAI
+import langchain_core
+from langchain_core.runnables import base as runnable_base
 from typing_extensions import TypedDict
 from typing import Annotated
+import functools
 import operator
 
-from .scenario_no_schedule import no_schedule_node
-from .scenario_out_of_window import out_of_window_node
-from .scenario_gps_out_of_range import gps_out_of_range_node
-from .scenario_wrong_phone import wrong_phone_node
-from .scenario_phone_not_found import phone_not_found_node
-from .scenario_duplicate_call import duplicate_call_node
-from .scenario_general_chat import general_chat_node
+from .scenario_registry import DEFAULT_SCENARIO_ID, SCENARIO_NODES
+from .model_router import TIERS
+from .memory import summary_message
+from .prompt_budget import PromptBudget, fit_context
 
 class ChatState(TypedDict):
     messages: Annotated[list, operator.add]
     scenario_id: str
     context_data: dict
+    # Recent turns before the current message and a summary of older ones (agents/memory.py)
+    history: list
+    summary: str
 
-llm = ChatOpenAI(model="gpt-4o", temperature=0.5)
+llm = TIERS["large"].chat_model(0.5)
 
 def get_scenario_prompt(scenario_id: str) -> str:
     """Get scenario-specific system prompt"""
@@ -49,12 +51,12 @@ def get_scenario_prompt(scenario_id: str) -> str:
     }
     return prompts.get(scenario_id, prompts["general_chat"])
 
-def generate_reply(state: ChatState):
+async def generate_reply(state: ChatState):
     # Check if there are any messages
     if not state["messages"]:
         scenario_id = state.get("scenario_id", "general_chat")
         system_prompt = get_scenario_prompt(scenario_id)
-        response = llm.invoke([
+        response = await llm.ainvoke([
             SystemMessage(content=system_prompt),
             HumanMessage(content="Hello, I need help with my issue")
         ])
@@ -77,64 +79,79 @@ def generate_reply(state: ChatState):
     # Add context data if available
     context_data = state.get("context_data", {})
     if context_data:
+        context_data = fit_context(scenario_id, context_data, context_data.keys(), PromptBudget.from_config().trimming())
         context_str = "Context information: " + ", ".join([f"{k}: {v}" for k, v in context_data.items() if v])
         if context_str != "Context information: ":
             conversation.append(HumanMessage(content=context_str))
     
+    # Earlier conversation: running summary, then the recent turns verbatim
+    if state.get("summary"):
+        conversation.append(summary_message(state["summary"]))
+    conversation.extend(state.get("history") or [])
+
     # Add the user's message
     conversation.append(HumanMessage(content=message_content))
     
-    response = llm.invoke(conversation)
-    return {"messages": state["messages"] + [response]}
+    response = await llm.ainvoke(conversation)
+    # The operator.add reducer appends this to the history; return only the new message
+    return {"messages": [response]}
 
 def route_scenario(state: ChatState) -> str:
-    scenario = state.get("scenario_id", "general_chat")
-    if scenario == "no_schedule":
-        return "no_schedule"
-    elif scenario == "out_of_window":
-        return "out_of_window"
-    elif scenario == "gps_out_of_range":
-        return "gps_out_of_range"
-    elif scenario == "wrong_phone":
-        return "wrong_phone"
-    elif scenario == "phone_not_found":
-        return "phone_not_found"
-    elif scenario == "duplicate_call":
-        return "duplicate_call"
-    else:
-        return "general_chat"
+    scenario = state.get("scenario_id", DEFAULT_SCENARIO_ID)
+    return scenario if scenario in SCENARIO_NODES else DEFAULT_SCENARIO_ID
+
+async def start_node(state: ChatState):
+    # Dummy entry node that immediately routes to the correct scenario.
+    # Returning the state here would re-append every message through the reducer.
+    return {}
+
+# langchain_core 0.1 serializes every node for each callback event, and both
+# RunnableLambda.__repr__ and RunnableLambda.deps re-read the function's source
+# file with inspect.getsource + ast each time - for our nodes and for
+# langgraph's own lambdas (state updates, branches). That is tens of
+# milliseconds of event-loop CPU per turn, which caps async throughput. The
+# graph's functions never change at runtime, so both lookups are memoized in a
+# bounded cache, only on the langchain_core line this was measured on.
+MEMOIZED_LAMBDA_LOOKUPS = ("get_lambda_source", "get_function_nonlocals")
+LAMBDA_LOOKUP_CACHE_SIZE = 256
+
+def _memoized(lookup):
+    cached = functools.lru_cache(maxsize=LAMBDA_LOOKUP_CACHE_SIZE)(lookup)
 
-def start_node(state: ChatState):
-    # Dummy entry node that immediately routes to the correct scenario
-    return state
+    @functools.wraps(lookup)
+    def memoized(func):
+        try:
+            hash(func)
+        except TypeError:
+            return lookup(func)
+        return cached(func)
+
+    memoized.memoized = True
+    return memoized
+
+def _memoize_lambda_lookups():
+    if not langchain_core.__version__.startswith("0.1."):
+        return
+    for name in MEMOIZED_LAMBDA_LOOKUPS:
+        lookup = getattr(runnable_base, name, None)
+        if lookup is not None and not getattr(lookup, "memoized", False):
+            setattr(runnable_base, name, _memoized(lookup))
+
+_memoize_lambda_lookups()
 
 builder = StateGraph(ChatState)
 builder.add_node("start", start_node)
-builder.add_node("no_schedule", no_schedule_node)
-builder.add_node("out_of_window", out_of_window_node)
-builder.add_node("gps_out_of_range", gps_out_of_range_node)
-builder.add_node("wrong_phone", wrong_phone_node)
-builder.add_node("phone_not_found", phone_not_found_node)
-builder.add_node("duplicate_call", duplicate_call_node)
-builder.add_node("general_chat", general_chat_node)
+for scenario_id, scenario_node in SCENARIO_NODES.items():
+    builder.add_node(scenario_id, scenario_node)
 
 builder.set_entry_point("start")
 builder.add_conditional_edges(
     "start", route_scenario,
-    {
-        "no_schedule": "no_schedule",
-        "out_of_window": "out_of_window",
-        "gps_out_of_range": "gps_out_of_range",
-        "wrong_phone": "wrong_phone",
-        "phone_not_found": "phone_not_found",
-        "duplicate_call": "duplicate_call",
-        "general_chat": "general_chat"
-    }
+    {scenario_id: scenario_id for scenario_id in SCENARIO_NODES}
 )
-# Each scenario node can finish or loop as needed; for now, finish after each
-for node in ["no_schedule", "out_of_window", "gps_out_of_range", "wrong_phone", "phone_not_found", "duplicate_call"]:
-    builder.set_finish_point(node)
-builder.set_finish_point("general_chat")
+# Each scenario node finishes the turn
+for scenario_id in SCENARIO_NODES:
+    builder.set_finish_point(scenario_id)
 
 chat_graph = builder.compile()
 
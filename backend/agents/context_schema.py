@@ -0,0 +1,117 @@
+# backend/agents/context_schema.py
+"""
+Typed context schema per scenario.
+
+``context_data`` stays a plain JSON-native dict (it is stored by the session
+backends and sent to clients), but every write goes through the scenario's
+``ContextSchema``: only declared fields are kept, values are coerced to the
+field's type (``"yes"`` -> ``True``, ``9`` -> ``"9"``) and unset fields are
+simply absent, so sessions and prompts only carry fields that have a value.
+"""
+
+from .rule_extractors import DEFAULT_FIELD_RULES
+
+# Field types: "str" (default) or "bool"; every yes/no rule field is a bool
+DEFAULT_FIELD_TYPES = {
+    **{name: "bool" for name, kind in DEFAULT_FIELD_RULES.items() if kind == "yes_no"},
+    "makeup_later": "bool",
+}
+
+_TRUE = frozenset(("true", "yes", "y", "yeah", "yep", "1", "confirmed", "correct", "ok", "okay"))
+_FALSE = frozenset(("false", "no", "n", "nope", "0", "not confirmed", "incorrect"))
+
+# Returned by a coercer when the value cannot be used
+INVALID = object()
+
+
+def coerce_bool(value):
+    if isinstance(value, bool):
+        return value
+    if isinstance(value, (int, float)):
+        return bool(value)
+    if isinstance(value, str):
+        text = value.strip().lower().rstrip(".!")
+        if text in _TRUE:
+            return True
+        if text in _FALSE:
+            return False
+    return INVALID
+
+
+def coerce_str(value):
+    if isinstance(value, str):
+        return value.strip()
+    if isinstance(value, bool):
+        return "Yes" if value else "No"
+    if isinstance(value, (int, float)):
+        return str(value)
+    if isinstance(value, (list, tuple)) and all(isinstance(item, (str, int, float)) for item in value):
+        return ", ".join(str(item) for item in value)
+    return INVALID
+
+
+COERCERS = {"str": coerce_str, "bool": coerce_bool}
+
+
+class ContextSchema:
+    __slots__ = ("scenario_id", "fields", "substeps", "_coercers", "rejected")
+
+    def __init__(self, scenario_id, fields, field_types=None, substeps=()):
+        field_types = {**DEFAULT_FIELD_TYPES, **(field_types or {})}
+        unknown = {field_types.get(name, "str") for name in fields} - set(COERCERS)
+        if unknown:
+            raise ValueError(f"{scenario_id}: unknown context field types {sorted(unknown)}")
+        self.scenario_id = scenario_id
+        self.fields = tuple(fields)
+        self.substeps = frozenset(substeps)
+        self._coercers = {
+            name: COERCERS[field_types.get(name, "str")] for name in self.fields if name != "substep"
+        }
+        # Values dropped because they were undeclared or could not be coerced
+        self.rejected = 0
+
+    def field_types(self):
+        return {name: ("bool" if coercer is coerce_bool else "str") for name, coercer in self._coercers.items()}
+
+    def json_schema(self):
+        """JSON Schema of the fields object in structured replies: every field, null when unknown."""
+        return {
+            "type": "object",
+            "properties": {
+                name: {"type": [("boolean" if kind == "bool" else "string"), "null"]}
+                for name, kind in self.field_types().items()
+            },
+            "required": list(self._coercers),
+            "additionalProperties": False,
+        }
+
+    def coerce(self, name, value):
+        """The typed value for ``name``, or ``INVALID``."""
+        if name == "substep":
+            return value if value in self.substeps else INVALID
+        coercer = self._coercers.get(name)
+        return INVALID if coercer is None else coercer(value)
+
+    def apply(self, context, data, clear_empty=False):
+        """
+        Merge ``data`` into ``context`` in place and return ``context``.
+
+        Undeclared or uncoercible values are ignored. ``None`` and empty
+        strings mean "no value": the field is cleared when ``clear_empty``
+        (client edits) and left alone otherwise (model extraction).
+        """
+        for name, value in data.items():
+            if value is None or value == "":
+                if clear_empty:
+                    context.pop(name, None)
+                continue
+            value = self.coerce(name, value)
+            if value is INVALID or value == "":
+                self.rejected += 1
+                continue
+            context[name] = value
+        return context
+
+    def clean(self, data):
+        """A new sparse, typed context from client-supplied ``data``."""
+        return self.apply({}, data or {})
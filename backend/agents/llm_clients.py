@@ -0,0 +1,153 @@
+# backend/agents/llm_clients.py
+
+import threading
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+import httpx
+
+from config import Config
+
+# The OpenAI SDK and langchain_openai are imported on first use: they are the
+# slowest imports of the app and are not needed to bind the port.
+
+# One pair of OpenAI SDK clients (sync + async) per endpoint and process. Both
+# sit on top of keep-alive httpx pools, so every chat model below reuses warm
+# TLS connections instead of opening a new one per turn.
+_lock = threading.RLock()
+_sdk_clients = {}
+_chat_models = {}
+_chat_model_factory = None
+
+# Usage reported with a streamed completion: langchain-openai 0.0.5 drops the
+# final usage-only chunk, so _UsageReportingCompletions catches it here
+_stream_usage = ContextVar("stream_usage", default=None)
+
+
+def _http_limits():
+    return httpx.Limits(
+        max_connections=Config.LLM_MAX_CONNECTIONS,
+        max_keepalive_connections=Config.LLM_MAX_KEEPALIVE_CONNECTIONS,
+        keepalive_expiry=Config.LLM_KEEPALIVE_EXPIRY,
+    )
+
+
+def _http_timeout():
+    return httpx.Timeout(Config.LLM_REQUEST_TIMEOUT, connect=Config.LLM_CONNECT_TIMEOUT)
+
+
+def _get_sdk_clients(base_url=None, api_key=None):
+    """The (sync, async) SDK clients of an OpenAI-compatible endpoint (default: OPENAI_BASE_URL)."""
+    key = (base_url or Config.OPENAI_BASE_URL, api_key or Config.OPENAI_API_KEY)
+    clients = _sdk_clients.get(key)
+    if clients is None:
+        with _lock:
+            clients = _sdk_clients.get(key)
+            if clients is None:
+                import openai
+
+                sync_client = openai.OpenAI(
+                    api_key=key[1],
+                    base_url=key[0],
+                    # LLMGuard owns retries: SDK retries would hide failures from its breaker
+                    max_retries=0,
+                    http_client=httpx.Client(limits=_http_limits(), timeout=_http_timeout()),
+                )
+                async_client = openai.AsyncOpenAI(
+                    api_key=key[1],
+                    base_url=key[0],
+                    max_retries=0,
+                    http_client=httpx.AsyncClient(limits=_http_limits(), timeout=_http_timeout()),
+                )
+                clients = _sdk_clients[key] = (sync_client, async_client)
+    return clients
+
+
+@contextmanager
+def capture_stream_usage():
+    """
+    Yield a dict that receives the provider-reported usage (``prompt_tokens``,
+    ``completion_tokens``, ...) of the completion streamed inside the block.
+    It stays empty when the endpoint reports none.
+    """
+    usage = {}
+    token = _stream_usage.set(usage)
+    try:
+        yield usage
+    finally:
+        _stream_usage.reset(token)
+
+
+class _UsageReportingCompletions:
+    """``chat.completions`` of the async SDK client, asking streamed calls to report their usage."""
+
+    def __init__(self, completions):
+        self._completions = completions
+
+    async def create(self, **params):
+        if not params.get("stream"):
+            return await self._completions.create(**params)
+        params.setdefault("stream_options", {"include_usage": True})
+        return self._with_usage(await self._completions.create(**params))
+
+    async def _with_usage(self, chunks):
+        async for chunk in chunks:
+            usage = getattr(chunk, "usage", None)
+            sink = _stream_usage.get()
+            if usage is not None and sink is not None:
+                sink.update(usage.model_dump())
+            yield chunk
+
+
+def get_chat_model(model=None, temperature=None, base_url=None, api_key=None):
+    """
+    Return the shared ChatOpenAI for (model, temperature, endpoint), creating
+    it on first use. ``base_url``/``api_key`` select another OpenAI-compatible
+    endpoint (e.g. a local server) than OPENAI_BASE_URL.
+    """
+    model = model or Config.MODEL_NAME
+    temperature = Config.MODEL_TEMPERATURE if temperature is None else float(temperature)
+    key = (model, temperature, base_url, api_key)
+    chat_model = _chat_models.get(key)
+    if chat_model is None:
+        with _lock:
+            chat_model = _chat_models.get(key)
+            if chat_model is None:
+                if _chat_model_factory is not None:
+                    chat_model = _chat_model_factory(model, temperature)
+                else:
+                    from langchain_openai.chat_models import ChatOpenAI
+
+                    sync_client, async_client = _get_sdk_clients(base_url, api_key)
+                    chat_model = ChatOpenAI(
+                        model=model,
+                        temperature=temperature,
+                        client=sync_client.chat.completions,
+                        async_client=_UsageReportingCompletions(async_client.chat.completions),
+                    )
+                _chat_models[key] = chat_model
+    return chat_model
+
+
+def set_chat_model_factory(factory):
+    """Build chat models with ``factory(model, temperature)`` instead of ChatOpenAI.
+
+    Used by the benchmarks to run the graph against a local fake LLM. Must be
+    called before ``agents.caregiver_agent`` is imported so its module-level
+    ``llm`` picks up the override too.
+    """
+    global _chat_model_factory
+    with _lock:
+        _chat_model_factory = factory
+        _chat_models.clear()
+
+
+async def aclose_chat_models():
+    """Close the pooled HTTP connections (call on application shutdown)."""
+    with _lock:
+        clients = list(_sdk_clients.values())
+        _sdk_clients.clear()
+        _chat_models.clear()
+    for sync_client, async_client in clients:
+        sync_client.close()
+        await async_client.close()
@@ -0,0 +1,257 @@
+# backend/agents/llm_resilience.py
+"""
+Deadlines, hedging and a circuit breaker for model calls.
+
+Every model tier has its own guard, so an outage of one endpoint (e.g. a
+local small model) does not open the breaker of the other.
+``guard_for(tier).call(attempt)`` runs ``attempt()`` (one model request) under:
+
+- a deadline for the whole call (``LLM_CALL_DEADLINE``), so a stalled
+  provider never holds the caregiver's turn longer than that;
+- an optional hedge: when the first request has not answered after the
+  recent p95 call time, a second identical request is sent and the first
+  answer wins. A request that fails outright is retried once the same way.
+  The second request takes its own scheduler slot and is skipped when none
+  is free, so it never exceeds ``LLM_MAX_INFLIGHT``;
+- a circuit breaker that opens after ``failure_threshold`` consecutive
+  failed calls. While it is open calls fail immediately; after
+  ``reset_timeout`` one probe call is let through to close it again.
+
+Only transient failures count: timeouts, connection errors and HTTP 429/5xx
+answers. They surface as ``LLMUnavailable``: a small-tier call then moves to
+the large tier (see ``model_router.routed_call``), and a turn with no tier
+left is answered from the step's fallback script. Any other error (a rejected
+request, bad credentials) is a bug rather than an outage: it is raised as
+is and leaves the breaker alone.
+"""
+
+import asyncio
+import logging
+import time
+from collections import deque
+
+from config import Config
+from metrics import LLM_BREAKER_STATE, LLM_CALL_FAILURES, LLM_HEDGED
+
+from .llm_scheduler import llm_scheduler
+
+logger = logging.getLogger(__name__)
+
+# Successful call durations kept for the hedge delay, and how many are needed first
+LATENCY_SAMPLES = 256
+MIN_HEDGE_SAMPLES = 20
+
+_BREAKER_STATES = {"closed": 0, "half_open": 1, "open": 2}
+
+
+class LLMUnavailable(RuntimeError):
+    def __init__(self, reason):
+        # timeout, error or circuit_open
+        self.reason = reason
+        super().__init__(f"Model call failed ({reason})")
+
+
+class LLMInterrupted(RuntimeError):
+    """A streamed call that failed after part of its reply reached the caregiver."""
+
+    def __init__(self, reason):
+        self.reason = reason
+        super().__init__(f"The reply was interrupted ({reason}); please send your message again")
+
+
+def is_transient(error):
+    """Whether a failed model request may succeed when tried again."""
+    status = getattr(error, "status_code", None)
+    if isinstance(status, int):
+        return status == 429 or status >= 500
+    # Imported on the failure path only, off the cold-start path
+    import httpx
+    import openai
+
+    return isinstance(error, (asyncio.TimeoutError, ConnectionError, httpx.TransportError, openai.APIConnectionError))
+
+
+class CircuitBreaker:
+    def __init__(self, failure_threshold=5, reset_timeout=30.0, name="large"):
+        # failure_threshold <= 0 disables the breaker
+        self.name = name
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.state = "closed"
+        self.failures = 0
+        self.opened = 0
+        self._opened_at = 0.0
+        self._probe_started = 0.0
+
+    def _set_state(self, state):
+        if state != self.state:
+            logger.warning("LLM circuit breaker (%s) %s -> %s", self.name, self.state, state)
+        self.state = state
+        LLM_BREAKER_STATE.labels(self.name).set(_BREAKER_STATES[state])
+
+    def allow(self):
+        """Whether a call may go out now (in half-open state, only one probe at a time)."""
+        if self.state == "closed":
+            return True
+        now = time.monotonic()
+        if self.state == "open":
+            if now - self._opened_at < self.reset_timeout:
+                return False
+            self._set_state("half_open")
+        elif now - self._probe_started < self.reset_timeout:
+            # A probe is out; a probe that never reported back expires after reset_timeout
+            return False
+        self._probe_started = now
+        return True
+
+    def record_success(self):
+        self.failures = 0
+        if self.state != "closed":
+            self._set_state("closed")
+
+    def record_failure(self):
+        self.failures += 1
+        if self.failure_threshold <= 0:
+            return
+        if self.state == "half_open" or self.failures >= self.failure_threshold:
+            if self.state != "open":
+                self.opened += 1
+            self._opened_at = time.monotonic()
+            self._set_state("open")
+
+    def stats(self):
+        return {"state": self.state, "consecutive_failures": self.failures, "opened": self.opened}
+
+
+class LLMGuard:
+    def __init__(self, deadline=20.0, hedge=False, hedge_percentile=95.0, hedge_min_delay=1.0, breaker=None, name="large"):
+        # deadline <= 0 disables the deadline
+        self.name = name
+        self.deadline = deadline
+        self.hedge = hedge
+        self.hedge_percentile = hedge_percentile
+        self.hedge_min_delay = hedge_min_delay
+        self.breaker = breaker or CircuitBreaker(name=name)
+        self._durations = deque(maxlen=LATENCY_SAMPLES)
+        self.counts = {"calls": 0, "hedges": 0, "hedge_wins": 0, "retries": 0, "timeouts": 0, "errors": 0, "rejected": 0, "invalid": 0}
+
+    def hedge_delay(self):
+        """Seconds before a hedge is sent: the recent p95 call time, or None while hedging is off."""
+        if not self.hedge or len(self._durations) < MIN_HEDGE_SAMPLES:
+            return None
+        ordered = sorted(self._durations)
+        index = min(len(ordered) - 1, int(len(ordered) * self.hedge_percentile / 100.0))
+        return max(self.hedge_min_delay, ordered[index])
+
+    @staticmethod
+    def _second_attempt(attempt):
+        """A second request under its own scheduler slot, or None when no slot is free."""
+        if not llm_scheduler.try_acquire():
+            return None
+
+        async def run():
+            try:
+                return await attempt()
+            finally:
+                llm_scheduler.release()
+
+        return asyncio.ensure_future(run())
+
+    def _fail(self, reason, count):
+        self.counts[count] += 1
+        LLM_CALL_FAILURES.labels(self.name, reason).inc()
+        if reason != "circuit_open":
+            self.breaker.record_failure()
+        raise LLMUnavailable(reason)
+
+    async def call(self, attempt, hedge=True):
+        """
+        Result of the first successful ``attempt()``. Streamed calls pass
+        ``hedge=False``: their tokens have already reached the caregiver.
+        """
+        if not self.breaker.allow():
+            self._fail("circuit_open", "rejected")
+        self.counts["calls"] += 1
+        hedge = hedge and self.hedge
+        started = time.monotonic()
+        give_up_at = started + self.deadline if self.deadline > 0 else None
+        delay = self.hedge_delay() if hedge else None
+        hedge_at = started + delay if delay is not None else None
+        tasks = [asyncio.ensure_future(attempt())]
+        second = None
+        try:
+            while True:
+                wake = [at for at in (give_up_at, hedge_at) if at is not None]
+                timeout = max(0.0, min(wake) - time.monotonic()) if wake else None
+                done, _ = await asyncio.wait(tasks, timeout=timeout, return_when=asyncio.FIRST_COMPLETED)
+
+                for task in done:
+                    tasks.remove(task)
+                    error = task.exception()
+                    if error is not None and not is_transient(error):
+                        # The endpoint answered, so it is up; the request itself is wrong
+                        self.counts["invalid"] += 1
+                        self.breaker.record_success()
+                        raise error
+                    if error is None:
+                        if task is second:
+                            self.counts["hedge_wins"] += 1
+                            LLM_HEDGED.labels(self.name, "won").inc()
+                        self._durations.append(time.monotonic() - started)
+                        self.breaker.record_success()
+                        return task.result()
+                    logger.warning("LLM request failed: %r", error)
+
+                now = time.monotonic()
+                if give_up_at is not None and now >= give_up_at:
+                    self._fail("timeout", "timeouts")
+                if second is None and hedge:
+                    # A failed request is retried once; a slow one is hedged once, unless
+                    # that would queue behind other calls
+                    kind = None
+                    if done:
+                        kind = "retry"
+                    elif hedge_at is not None and now >= hedge_at:
+                        kind = "hedge"
+                    if kind is not None:
+                        hedge_at = None
+                        second = self._second_attempt(attempt)
+                        if second is not None:
+                            self.counts["retries" if kind == "retry" else "hedges"] += 1
+                            LLM_HEDGED.labels(self.name, kind).inc()
+                            tasks.append(second)
+                if not tasks:
+                    self._fail("error", "errors")
+        finally:
+            for task in tasks:
+                task.cancel()
+
+    def stats(self):
+        return {
+            **self.counts,
+            "hedge_delay_s": self.hedge_delay(),
+            "breaker": self.breaker.stats(),
+        }
+
+
+# tier name -> LLMGuard, created on the tier's first call
+_guards = {}
+
+
+def guard_for(tier):
+    """The guard of a model tier ("large" or "small"), with its own latency samples and breaker."""
+    guard = _guards.get(tier)
+    if guard is None:
+        guard = _guards[tier] = LLMGuard(
+            deadline=Config.LLM_CALL_DEADLINE,
+            hedge=Config.LLM_HEDGE,
+            hedge_percentile=Config.LLM_HEDGE_PERCENTILE,
+            hedge_min_delay=Config.LLM_HEDGE_MIN_DELAY,
+            breaker=CircuitBreaker(Config.LLM_BREAKER_FAILURES, Config.LLM_BREAKER_RESET, name=tier),
+            name=tier,
+        )
+    return guard
+
+
+def guard_stats():
+    return {tier: guard.stats() for tier, guard in sorted(_guards.items())}
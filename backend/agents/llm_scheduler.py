@@ -0,0 +1,182 @@
+# backend/agents/llm_scheduler.py
+"""
+Admission control for model calls.
+
+Every model call (scenario turns, batched extraction, history summaries)
+takes a slot from the process-wide ``llm_scheduler`` first. At most
+``max_inflight`` calls run at once; the rest wait in per-key queues (one key
+per session) that are served round-robin, so one busy conversation cannot
+starve the others.
+
+A call that would wait longer than ``deadline`` seconds is shed with
+``LLMOverloaded`` instead of queueing into a provider timeout: right away
+when the queue is full or the expected wait (queue length x recent call time
+/ slots) is over the deadline, or once it has actually waited that long.
+"""
+
+import asyncio
+import time
+from collections import OrderedDict, deque
+from contextlib import asynccontextmanager
+
+from config import Config
+from metrics import LLM_INFLIGHT, LLM_QUEUE_DEPTH, LLM_QUEUE_WAIT, LLM_SHED
+
+# Weight of the latest call in the moving average of call durations
+_DURATION_SMOOTHING = 0.2
+
+
+class LLMOverloaded(RuntimeError):
+    def __init__(self, reason, retry_after):
+        self.reason = reason
+        self.retry_after = retry_after
+        super().__init__(f"The assistant is busy ({reason}); retry in {retry_after:.0f}s")
+
+
+def scheduler_key(config):
+    """Queue key of a graph call: its session, or a shared key outside sessions."""
+    return ((config or {}).get("configurable") or {}).get("session_id") or "default"
+
+
+class LLMScheduler:
+    def __init__(self, max_inflight=32, deadline=10.0, max_queue=1000):
+        # max_inflight <= 0 disables admission control
+        self.max_inflight = max_inflight
+        self.deadline = deadline
+        self.max_queue = max_queue
+        self._inflight = 0
+        # key -> waiting futures, in round-robin order
+        self._queues = OrderedDict()
+        self._queued = 0
+        self._avg_call = None
+        self._stats = {"admitted": 0, "queued": 0, "shed": 0, "wait_total": 0.0, "wait_max": 0.0}
+
+    def expected_wait(self):
+        """Rough wait of a call queued now, from the recent call duration."""
+        if self._avg_call is None or self.max_inflight <= 0:
+            return 0.0
+        return (self._queued + 1) / self.max_inflight * self._avg_call
+
+    def has_spare_slot(self):
+        """Whether a call admitted now would start right away."""
+        return self.max_inflight <= 0 or (not self._queued and self._inflight < self.max_inflight)
+
+    def try_acquire(self):
+        """Take a slot only if one is free right now, without queueing; give it back with ``release()``."""
+        if self.max_inflight <= 0:
+            return True
+        if not self.has_spare_slot():
+            return False
+        self._inflight += 1
+        self._stats["admitted"] += 1
+        LLM_INFLIGHT.set(self._inflight)
+        return True
+
+    def release(self):
+        """Give back a slot taken with ``try_acquire()``."""
+        if self.max_inflight > 0:
+            self._release()
+
+    def _shed(self, reason):
+        self._stats["shed"] += 1
+        LLM_SHED.labels(reason).inc()
+        raise LLMOverloaded(reason, max(1.0, self.expected_wait()))
+
+    def _grant_next(self):
+        while self._queues and self._inflight < self.max_inflight:
+            key, waiters = next(iter(self._queues.items()))
+            future = waiters.popleft()
+            if waiters:
+                self._queues.move_to_end(key)
+            else:
+                del self._queues[key]
+            if future.done():
+                # Gave up waiting; already taken off the count
+                continue
+            self._queued -= 1
+            self._inflight += 1
+            future.set_result(None)
+        LLM_QUEUE_DEPTH.set(self._queued)
+        LLM_INFLIGHT.set(self._inflight)
+
+    def _release(self):
+        self._inflight -= 1
+        self._grant_next()
+
+    def _abandon(self, future):
+        if not future.done():
+            future.cancel()
+            self._queued -= 1
+            LLM_QUEUE_DEPTH.set(self._queued)
+            return False
+        # Granted just as the waiter gave up: hand the slot on
+        return not future.cancelled()
+
+    async def _acquire(self, key):
+        if self._inflight < self.max_inflight and not self._queued:
+            self._inflight += 1
+            LLM_INFLIGHT.set(self._inflight)
+            return 0.0
+        if self._queued >= self.max_queue:
+            self._shed("queue_full")
+        if self.deadline and self.expected_wait() > self.deadline:
+            self._shed("predicted_wait")
+
+        started = time.monotonic()
+        future = asyncio.get_running_loop().create_future()
+        self._queues.setdefault(key, deque()).append(future)
+        self._queued += 1
+        self._stats["queued"] += 1
+        LLM_QUEUE_DEPTH.set(self._queued)
+        try:
+            await asyncio.wait({future}, timeout=self.deadline or None)
+        except asyncio.CancelledError:
+            if self._abandon(future):
+                self._release()
+            raise
+        if not future.done() or future.cancelled():
+            self._abandon(future)
+            self._shed("timeout")
+        return time.monotonic() - started
+
+    @asynccontextmanager
+    async def slot(self, key="default"):
+        """Hold one model-call slot for the body of the ``async with``."""
+        if self.max_inflight <= 0:
+            yield
+            return
+        waited = await self._acquire(key)
+        LLM_QUEUE_WAIT.observe(waited)
+        self._stats["admitted"] += 1
+        self._stats["wait_total"] += waited
+        self._stats["wait_max"] = max(self._stats["wait_max"], waited)
+        started = time.monotonic()
+        try:
+            yield
+        finally:
+            duration = time.monotonic() - started
+            self._avg_call = duration if self._avg_call is None else (
+                _DURATION_SMOOTHING * duration + (1 - _DURATION_SMOOTHING) * self._avg_call
+            )
+            self._release()
+
+    def stats(self):
+        admitted = self._stats["admitted"]
+        return {
+            "max_inflight": self.max_inflight,
+            "inflight": self._inflight,
+            "queue_depth": self._queued,
+            "admitted": admitted,
+            "queued": self._stats["queued"],
+            "shed": self._stats["shed"],
+            "avg_wait_s": self._stats["wait_total"] / admitted if admitted else 0.0,
+            "max_wait_s": self._stats["wait_max"],
+            "avg_call_s": self._avg_call or 0.0,
+        }
+
+
+llm_scheduler = LLMScheduler(
+    max_inflight=Config.LLM_MAX_INFLIGHT,
+    deadline=Config.LLM_QUEUE_DEADLINE,
+    max_queue=Config.LLM_MAX_QUEUE,
+)
@@ -0,0 +1,158 @@
+# backend/agents/memory.py
+"""
+Conversation memory policy for long calls.
+
+The model sees the last ``window_turns`` turns verbatim plus a running
+summary of everything older. The summary is refreshed by a background task
+after a turn has been answered, never on the request path, so prompt size
+stays bounded however long the call runs.
+
+Sessions carry two extra keys: ``summary`` (text) and ``summarized_upto``
+(how many of ``messages`` the summary covers).
+"""
+
+import asyncio
+import logging
+
+from langchain_core.messages import HumanMessage, SystemMessage
+
+from config import Config
+
+from .llm_resilience import LLMUnavailable, guard_for
+from .llm_scheduler import LLMOverloaded, llm_scheduler
+from .model_router import routed_call
+
+logger = logging.getLogger(__name__)
+
+SUMMARY_PROMPT = (
+    "You maintain a running summary of a phone call between Rosella, a caregiver support representative "
+    "from Independence Care, and a caregiver (and sometimes their client). Update the summary with the new "
+    "messages. Keep names, times, phone numbers, decisions and open questions; drop pleasantries. "
+    "Reply with the updated summary only, in at most 120 words."
+)
+
+
+def summary_message(summary):
+    return SystemMessage(content=f"Summary of the earlier conversation: {summary}")
+
+
+def _transcript(messages):
+    speaker = {"human": "Caregiver", "ai": "Rosella", "system": "Rosella"}
+    return "\n".join(f"{speaker.get(message.type, message.type)}: {message.content}" for message in messages)
+
+
+class ConversationMemory:
+    def __init__(self, window_turns=6, summarize_every=4, tier="small"):
+        self.window_turns = window_turns
+        self.summarize_every = summarize_every
+        self.tier = tier
+        self._tasks = {}
+        self.counts = {"summaries": 0, "summary_failures": 0, "summaries_shed": 0}
+
+    @property
+    def _window_messages(self):
+        return 2 * self.window_turns
+
+    @property
+    def _max_messages(self):
+        # The verbatim window can run ahead of the summary by up to two refreshes
+        return 2 * (self.window_turns + 2 * self.summarize_every)
+
+    def history(self, session):
+        """
+        ``(history, summary)`` for the next turn: the messages before the
+        current user message that the summary does not cover yet (at most a
+        bounded number), and the summary text.
+        """
+        if self.window_turns <= 0:
+            return [], ""
+        prior = session.get("messages", [])[:-1]
+        start = max(session.get("summarized_upto", 0), len(prior) - self._max_messages)
+        return prior[start:], session.get("summary", "")
+
+    def needs_refresh(self, session):
+        unsummarized = len(session.get("messages", ())) - session.get("summarized_upto", 0)
+        return unsummarized >= 2 * (self.window_turns + self.summarize_every)
+
+    def schedule_refresh(self, session_id, session, sessions, locks):
+        """
+        Start a background summary refresh for the session if it is due and
+        not already running. The summary is written under the session's lock
+        in ``locks`` (``SessionLocks``), between turns.
+        """
+        if self.window_turns <= 0 or session_id in self._tasks or not self.needs_refresh(session):
+            return
+        task = asyncio.get_running_loop().create_task(self._refresh(session_id, sessions, locks))
+        self._tasks[session_id] = task
+        task.add_done_callback(lambda _: self._tasks.pop(session_id, None))
+
+    async def _refresh(self, session_id, sessions, locks):
+        session = await sessions.aget(session_id)
+        if session is None:
+            return
+        start = session.get("summarized_upto", 0)
+        cutoff = len(session["messages"]) - self._window_messages
+        if cutoff <= start:
+            return
+        previous = session.get("summary") or "(none yet)"
+        prompt = [
+            SystemMessage(content=SUMMARY_PROMPT),
+            HumanMessage(content=(
+                f"Current summary: {previous}\n\nNew messages:\n{_transcript(session['messages'][start:cutoff])}"
+            )),
+        ]
+
+        async def call(tier):
+            # Imported with the first model call, off the cold-start path
+            from .usage_handler import PrefixCacheUsageHandler
+
+            llm_config = {"callbacks": [PrefixCacheUsageHandler("summary", tier.model, tier.name)]}
+
+            async def invoke():
+                response = await tier.chat_model(0).ainvoke(prompt, config=llm_config)
+                return response.content.strip()
+
+            async with llm_scheduler.slot(f"summary:{session_id}"):
+                return await guard_for(tier.name).call(invoke)
+
+        try:
+            summary = await routed_call("summary", self.tier, call, lambda summary: None)
+        except LLMOverloaded:
+            # Retried after a later turn; the window keeps the prompt bounded meanwhile
+            self.counts["summaries_shed"] += 1
+            return
+        except LLMUnavailable as e:
+            self.counts["summary_failures"] += 1
+            logger.warning("Summary refresh failed for %s: %s", session_id, e.reason)
+            return
+        except Exception:
+            self.counts["summary_failures"] += 1
+            logger.exception("Summary refresh failed for %s", session_id)
+            return
+
+        # Re-read under the lock so a turn that finished meanwhile is not overwritten
+        async with locks.hold(session_id):
+            session = await sessions.aget(session_id)
+            if session is None or session.get("summarized_upto", 0) >= cutoff:
+                return
+            session["summary"] = summary
+            session["summarized_upto"] = cutoff
+            await sessions.aput(session_id, session)
+        self.counts["summaries"] += 1
+
+    async def aclose(self):
+        """Cancel pending refreshes (call on application shutdown)."""
+        tasks = list(self._tasks.values())
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+
+    def stats(self):
+        return {**self.counts, "pending": len(self._tasks)}
+
+
+conversation_memory = ConversationMemory(
+    window_turns=Config.HISTORY_WINDOW_TURNS,
+    summarize_every=Config.HISTORY_SUMMARIZE_EVERY,
+    tier=Config.HISTORY_SUMMARY_TIER,
+)
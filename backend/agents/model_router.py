@@ -0,0 +1,149 @@
+# backend/agents/model_router.py
+"""
+Tiered model routing.
+
+Model calls name a tier instead of a model. "large" is ``MODEL_NAME``;
+"small" is ``SMALL_MODEL_NAME``, optionally served by another
+OpenAI-compatible endpoint (``SMALL_MODEL_BASE_URL``, e.g. a local server).
+Scenario specs pick a tier per spec (``ScenarioSpec.tier``) and per step
+(``WorkflowStep.tier``); context extraction uses ``EXTRACTION_TIER``.
+
+``routed_call`` runs a call on its tier and, when a small-tier result does not
+pass the caller's check (unparseable output, a substep the workflow does not
+allow) or the small tier is unavailable (``LLMUnavailable``), runs it again
+on the large tier. Latency, escalations and cost are
+recorded per route (scenario, tier) in ``route_stats`` and the metrics.
+"""
+
+import threading
+import time
+from collections import defaultdict
+from dataclasses import dataclass
+from typing import Optional
+
+from config import Config
+from metrics import LLM_COST, ROUTE_DURATION, ROUTE_ESCALATIONS
+
+from .llm_clients import get_chat_model
+from .llm_resilience import LLMUnavailable
+
+
+@dataclass(frozen=True)
+class ModelTier:
+    name: str
+    model: str
+    base_url: Optional[str] = None
+    api_key: Optional[str] = None
+
+    def chat_model(self, temperature=None):
+        return get_chat_model(self.model, temperature, base_url=self.base_url, api_key=self.api_key)
+
+
+TIERS = {
+    "large": ModelTier("large", Config.MODEL_NAME),
+    "small": ModelTier("small", Config.SMALL_MODEL_NAME, Config.SMALL_MODEL_BASE_URL, Config.SMALL_MODEL_API_KEY),
+}
+
+
+def resolve_tier(name):
+    """The tier a call named ``name`` runs on (always the large one with MODEL_ROUTING off)."""
+    if not Config.MODEL_ROUTING:
+        return TIERS["large"]
+    return TIERS[name or "large"]
+
+
+def parse_prices(spec):
+    """``{model: (input, cached input, output)}`` in USD per million tokens, from ``Config.MODEL_PRICES``."""
+    prices = {}
+    for item in spec.split(","):
+        model, _, values = item.strip().partition("=")
+        if not model:
+            continue
+        parts = tuple(float(value) for value in values.split("/"))
+        if len(parts) != 3:
+            raise ValueError(f"Bad MODEL_PRICES entry {item!r}: expected model=input/cached/output")
+        prices[model] = parts
+    return prices
+
+
+MODEL_PRICES = parse_prices(Config.MODEL_PRICES)
+
+
+def model_cost(model, prompt_tokens, cached_tokens, completion_tokens):
+    """USD cost of one call; models without a price (e.g. local ones) cost nothing."""
+    prices = MODEL_PRICES.get(model)
+    if prices is None:
+        return 0.0
+    input_price, cached_price, output_price = prices
+    return (
+        (prompt_tokens - cached_tokens) * input_price + cached_tokens * cached_price + completion_tokens * output_price
+    ) / 1e6
+
+
+class RouteStats:
+    """Calls, escalations, latency and cost per (scenario, tier)."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._routes = defaultdict(lambda: {"calls": 0, "escalated": 0, "seconds": 0.0, "cost_usd": 0.0})
+
+    def record_call(self, scenario_id, tier, seconds, escalated=False):
+        ROUTE_DURATION.labels(scenario_id, tier).observe(seconds)
+        with self._lock:
+            route = self._routes[(scenario_id, tier)]
+            route["calls"] += 1
+            route["seconds"] += seconds
+            route["escalated"] += int(escalated)
+
+    def record_usage(self, scenario_id, tier, model, prompt_tokens, cached_tokens, completion_tokens):
+        cost = model_cost(model, prompt_tokens, cached_tokens, completion_tokens)
+        if not cost:
+            return
+        LLM_COST.labels(scenario_id, model).inc(cost)
+        with self._lock:
+            self._routes[(scenario_id, tier)]["cost_usd"] += cost
+
+    def snapshot(self):
+        with self._lock:
+            routes = {key: dict(route) for key, route in self._routes.items()}
+        result = defaultdict(dict)
+        for (scenario_id, tier), route in sorted(routes.items()):
+            calls = route.pop("calls")
+            seconds = route.pop("seconds")
+            result[scenario_id][tier] = {
+                "calls": calls,
+                "avg_latency_s": seconds / calls if calls else 0.0,
+                **route,
+            }
+        return dict(result)
+
+
+route_stats = RouteStats()
+
+
+async def routed_call(scenario_id, tier_name, call, check):
+    """
+    ``await call(tier)`` on the named tier. ``check(result)`` returns None for
+    a usable result or the reason it is not; an unusable small-tier result,
+    or a small tier that is unavailable, is replaced by the large tier's.
+    """
+    tier = resolve_tier(tier_name)
+    started = time.perf_counter()
+    try:
+        result = await call(tier)
+    except LLMUnavailable:
+        if tier.name == "large":
+            raise
+        reason = "unavailable"
+    else:
+        reason = check(result) if tier.name != "large" else None
+    route_stats.record_call(scenario_id, tier.name, time.perf_counter() - started, escalated=reason is not None)
+    if reason is None:
+        return result
+
+    ROUTE_ESCALATIONS.labels(scenario_id, reason).inc()
+    large = TIERS["large"]
+    started = time.perf_counter()
+    result = await call(large)
+    route_stats.record_call(scenario_id, large.name, time.perf_counter() - started)
+    return result
@@ -0,0 +1,200 @@
+# backend/agents/prompt_budget.py
+"""
+Prompt token accounting and per-scenario budgets.
+
+Every model prompt is made of sections: the static instructions, rules,
+workflow and examples of the scenario (counted once per scenario), plus the
+per-turn context, history and user input. Each scenario has a
+``PromptBudget`` for the per-turn sections. Over-budget input is either
+trimmed (unknown context keys dropped, long values and the user message
+truncated, oldest history dropped) or rejected with ``PromptBudgetExceeded``.
+Token counts of every prompt are recorded per scenario and section.
+
+Counting uses tiktoken when an encoding can be loaded, and falls back to a
+characters / 4 estimate otherwise (e.g. offline, without a cached encoding).
+"""
+
+import logging
+import threading
+from dataclasses import dataclass, replace
+
+from config import Config
+from json_codec import canonical_json
+from metrics import PROMPT_TOKENS
+
+logger = logging.getLogger(__name__)
+
+# Candidate tiktoken encodings, best match for the gpt-4o family first
+TOKENIZER_ENCODINGS = ("o200k_base", "cl100k_base")
+# Rough characters per token for the fallback estimate and for cheap pre-checks
+CHARS_PER_TOKEN = 4
+
+_encoding = None
+_encoding_lock = threading.Lock()
+
+
+def get_encoding():
+    """The tiktoken encoding, or None if none could be loaded (tried once per process)."""
+    global _encoding
+    if _encoding is None:
+        with _encoding_lock:
+            if _encoding is None:
+                _encoding = False
+                try:
+                    import tiktoken
+
+                    for name in TOKENIZER_ENCODINGS:
+                        try:
+                            _encoding = tiktoken.get_encoding(name)
+                            break
+                        except Exception:
+                            continue
+                except ImportError:
+                    pass
+                if _encoding is False:
+                    logger.warning("No tiktoken encoding available; estimating tokens as characters / %d", CHARS_PER_TOKEN)
+    return _encoding or None
+
+
+def count_tokens(text):
+    if not text:
+        return 0
+    encoding = get_encoding()
+    if encoding is None:
+        return (len(text) + CHARS_PER_TOKEN - 1) // CHARS_PER_TOKEN
+    return len(encoding.encode(text, disallowed_special=()))
+
+
+def truncate_tokens(text, max_tokens):
+    """``text`` cut to at most ``max_tokens`` tokens."""
+    # Cheap pre-cut so huge inputs are never fully tokenized
+    text = text[:max(0, max_tokens) * CHARS_PER_TOKEN * 2]
+    encoding = get_encoding()
+    if encoding is None:
+        return text[:max(0, max_tokens) * CHARS_PER_TOKEN]
+    tokens = encoding.encode(text, disallowed_special=())
+    return text if len(tokens) <= max_tokens else encoding.decode(tokens[:max(0, max_tokens)])
+
+
+class PromptBudgetExceeded(ValueError):
+    def __init__(self, scenario_id, section, tokens, limit):
+        self.scenario_id = scenario_id
+        self.section = section
+        self.tokens = tokens
+        self.limit = limit
+        super().__init__(f"{section} exceeds the {limit}-token budget for {scenario_id}")
+
+
+@dataclass(frozen=True)
+class PromptBudget:
+    user_input: int = 1000
+    context: int = 1500
+    history: int = 3000
+    # "trim" or "reject"
+    on_overflow: str = "trim"
+
+    @classmethod
+    def from_config(cls):
+        return cls(
+            user_input=Config.PROMPT_BUDGET_USER_INPUT,
+            context=Config.PROMPT_BUDGET_CONTEXT,
+            history=Config.PROMPT_BUDGET_HISTORY,
+            on_overflow=Config.PROMPT_BUDGET_ON_OVERFLOW,
+        )
+
+    def trimming(self):
+        """The same limits, always trimming (used once a turn is already accepted)."""
+        return self if self.on_overflow == "trim" else replace(self, on_overflow="trim")
+
+
+def fit_user_input(scenario_id, text, budget):
+    """The user message within budget: unchanged, truncated, or rejected."""
+    text = text or ""
+    # Anything this short is under budget whatever the tokenizer says
+    if len(text) <= budget.user_input:
+        return text
+    tokens = count_tokens(text[:budget.user_input * CHARS_PER_TOKEN * 4])
+    if tokens <= budget.user_input:
+        return text
+    if budget.on_overflow == "reject":
+        raise PromptBudgetExceeded(scenario_id, "user_input", tokens, budget.user_input)
+    return truncate_tokens(text, budget.user_input)
+
+
+def _context_tokens(context):
+    return count_tokens(canonical_json(context))
+
+
+def fit_context(scenario_id, context, fields, budget):
+    """
+    ``context`` within budget. Trimming first drops keys the scenario does not
+    declare, then truncates the longest string values until it fits.
+    """
+    tokens = _context_tokens(context)
+    if tokens <= budget.context:
+        return context
+    if budget.on_overflow == "reject":
+        raise PromptBudgetExceeded(scenario_id, "context", tokens, budget.context)
+
+    known = set(fields) | {"substep"}
+    trimmed = {k: v for k, v in context.items() if k in known}
+    tokens = _context_tokens(trimmed)
+    while tokens > budget.context:
+        longest = max(
+            (k for k, v in trimmed.items() if isinstance(v, str) and v),
+            key=lambda k: len(trimmed[k]),
+            default=None,
+        )
+        if longest is None:
+            break
+        value = trimmed[longest]
+        keep = max(0, count_tokens(value) - (tokens - budget.context) - 1)
+        trimmed[longest] = truncate_tokens(value, keep) if keep else ""
+        tokens = _context_tokens(trimmed)
+    return trimmed
+
+
+def fit_history(messages, budget):
+    """The most recent messages whose combined size fits the history budget."""
+    kept, total = [], 0
+    for message in reversed(messages):
+        tokens = count_tokens(message.content)
+        if total + tokens > budget.history:
+            break
+        kept.append(message)
+        total += tokens
+    kept.reverse()
+    return kept
+
+
+class PromptAccounting:
+    """Per-scenario token counts of the prompts actually sent, by section."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._scenarios = {}
+
+    def record(self, scenario_id, sections):
+        total = sum(sections.values())
+        for section, tokens in sections.items():
+            PROMPT_TOKENS.labels(scenario_id, section).observe(tokens)
+        PROMPT_TOKENS.labels(scenario_id, "total").observe(total)
+        with self._lock:
+            entry = self._scenarios.setdefault(scenario_id, {"turns": 0, "tokens": {}, "max_total": 0})
+            entry["turns"] += 1
+            for section, tokens in sections.items():
+                entry["tokens"][section] = entry["tokens"].get(section, 0) + tokens
+            entry["max_total"] = max(entry["max_total"], total)
+
+    def snapshot(self):
+        with self._lock:
+            result = {}
+            for scenario_id, entry in self._scenarios.items():
+                turns = entry["turns"]
+                average = {section: tokens / turns for section, tokens in entry["tokens"].items()}
+                average["total"] = sum(average.values())
+                result[scenario_id] = {"turns": turns, "avg_tokens": average, "max_total": entry["max_total"]}
+            return result
+
+
+prompt_accounting = PromptAccounting()
@@ -0,0 +1,93 @@
+# backend/agents/prompt_cache.py
+"""
+Helpers for provider-side prompt prefix caching.
+
+Scenario system prompts are split into a static prefix, compiled once at
+import and byte-identical on every turn, and a small per-turn suffix with the
+current substep and a canonical (sorted-key) dump of the context. Providers
+cache the longest previously seen prompt prefix, so keeping everything
+dynamic at the very end lets every turn after the first reuse the cached
+prefix.
+"""
+
+import hashlib
+import threading
+import time
+
+from json_codec import canonical_json
+
+# OpenAI keeps cached prefixes for roughly 5-10 minutes of inactivity
+PREFIX_CACHE_WINDOW_SECONDS = 300.0
+
+
+def build_system_prompt(scenario_id, prefix, context, prefilled=(), extraction_done=False):
+    """
+    Append the per-turn suffix to a scenario's static prefix and record prefix
+    reuse. ``prefilled`` names fields already taken from the latest message;
+    with ``extraction_done`` the model only has to propose the next substep.
+    """
+    prefix_stats.record_prefix(scenario_id, prefix)
+    prompt = (
+        f"{prefix}"
+        f"Current workflow step: {context.get('substep', 'greet')}\n"
+        f"Current context: {canonical_json(context)}\n"
+    )
+    if prefilled:
+        prompt += f"Already extracted from the latest message (do not repeat): {', '.join(sorted(prefilled))}\n"
+    if extraction_done:
+        prompt += "All fields for this step are filled; only the next 'substep' is needed.\n"
+    return prompt
+
+
+class PrefixCacheStats:
+    """
+    Per-scenario prefix cache accounting.
+
+    ``warm``/``cold`` is a local estimate: a turn is warm when the same prefix
+    was sent within the provider's cache window. ``prompt_tokens`` and
+    ``cached_tokens`` are what the provider actually reported, when it does.
+    """
+
+    def __init__(self, window=PREFIX_CACHE_WINDOW_SECONDS):
+        self.window = window
+        self._lock = threading.Lock()
+        self._last_seen = {}
+        self._scenarios = {}
+
+    def _entry(self, scenario_id):
+        return self._scenarios.setdefault(
+            scenario_id, {"warm": 0, "cold": 0, "prompt_tokens": 0, "cached_tokens": 0}
+        )
+
+    def record_prefix(self, scenario_id, prefix):
+        digest = hashlib.blake2b(prefix.encode("utf-8"), digest_size=8).digest()
+        now = time.monotonic()
+        with self._lock:
+            last_seen = self._last_seen.get(digest)
+            self._last_seen[digest] = now
+            warm = last_seen is not None and now - last_seen <= self.window
+            self._entry(scenario_id)["warm" if warm else "cold"] += 1
+        return warm
+
+    def record_usage(self, scenario_id, prompt_tokens, cached_tokens):
+        with self._lock:
+            entry = self._entry(scenario_id)
+            entry["prompt_tokens"] += prompt_tokens
+            entry["cached_tokens"] += cached_tokens
+
+    def snapshot(self):
+        with self._lock:
+            result = {}
+            for scenario_id, entry in self._scenarios.items():
+                turns = entry["warm"] + entry["cold"]
+                result[scenario_id] = {
+                    **entry,
+                    "prefix_hit_rate": entry["warm"] / turns if turns else 0.0,
+                    "cached_token_rate": (
+                        entry["cached_tokens"] / entry["prompt_tokens"] if entry["prompt_tokens"] else 0.0
+                    ),
+                }
+            return result
+
+
+prefix_stats = PrefixCacheStats()
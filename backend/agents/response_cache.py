@@ -0,0 +1,102 @@
+# backend/agents/response_cache.py
+"""
+Response cache in front of the scenario-node LLM call.
+
+A lot of traffic repeats itself: many caregivers send the same message into
+the same scenario step with the same context. A turn is keyed on the
+scenario, the current substep, the normalized user text and a hash of the
+scenario's context fields, and the cached ``(reply, extracted_json)`` pair
+answers the turn without calling the model. Entries are bounded by count
+(LRU) and by age (TTL).
+"""
+
+import copy
+import hashlib
+import re
+import threading
+import time
+from collections import OrderedDict, defaultdict
+
+from config import Config
+from json_codec import canonical_json
+
+_PUNCTUATION = re.compile(r"[^\w\s]")
+_WHITESPACE = re.compile(r"\s+")
+
+
+def normalize_user_text(text):
+    """Case-, punctuation- and whitespace-insensitive form of a caregiver message."""
+    text = _PUNCTUATION.sub(" ", (text or "").lower())
+    return _WHITESPACE.sub(" ", text).strip()
+
+
+def context_digest(context, fields):
+    """Stable hash of the given context fields (missing and empty values are equivalent)."""
+    relevant = {name: context.get(name) for name in fields if context.get(name) not in (None, "")}
+    return hashlib.blake2b(canonical_json(relevant).encode("utf-8"), digest_size=16).hexdigest()
+
+
+class ResponseCache:
+    def __init__(self, max_entries=5000, ttl=3600.0, disabled_scenarios=()):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.disabled_scenarios = frozenset(disabled_scenarios)
+        self._lock = threading.Lock()
+        # key -> (reply, extracted_json, stored_at)
+        self._entries = OrderedDict()
+        self._counts = defaultdict(lambda: {"hits": 0, "misses": 0})
+        self.evictions = {"ttl": 0, "lru": 0}
+
+    def enabled_for(self, scenario_id):
+        return self.max_entries > 0 and scenario_id not in self.disabled_scenarios
+
+    def make_key(self, scenario_id, substep, user_input, context, fields):
+        return (scenario_id, substep, normalize_user_text(user_input), context_digest(context, fields))
+
+    def get(self, key):
+        """Return a copy of the cached ``(reply, extracted_json)``, or None."""
+        now = time.monotonic()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and now - entry[2] > self.ttl:
+                del self._entries[key]
+                self.evictions["ttl"] += 1
+                entry = None
+            counts = self._counts[key[0]]
+            if entry is None:
+                counts["misses"] += 1
+                return None
+            counts["hits"] += 1
+            self._entries.move_to_end(key)
+        return entry[0], copy.deepcopy(entry[1])
+
+    def put(self, key, reply, extracted_json):
+        with self._lock:
+            self._entries[key] = (reply, copy.deepcopy(extracted_json), time.monotonic())
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self.evictions["lru"] += 1
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def snapshot(self):
+        with self._lock:
+            scenarios = {}
+            for scenario_id, counts in self._counts.items():
+                lookups = counts["hits"] + counts["misses"]
+                scenarios[scenario_id] = {**counts, "hit_rate": counts["hits"] / lookups if lookups else 0.0}
+            return {
+                "entries": len(self._entries),
+                "evictions": dict(self.evictions),
+                "scenarios": scenarios,
+            }
+
+
+response_cache = ResponseCache(
+    max_entries=Config.RESPONSE_CACHE_MAX_ENTRIES,
+    ttl=Config.RESPONSE_CACHE_TTL,
+    disabled_scenarios=Config.RESPONSE_CACHE_DISABLED_SCENARIOS,
+)
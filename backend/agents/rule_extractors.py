@@ -0,0 +1,256 @@
+# backend/agents/rule_extractors.py
+"""
+Rule-based extraction of well-formed context fields.
+
+Phone numbers, clock times, weekdays, dates and yes/no answers have a fixed
+shape, so compiled regular expressions pull them out of a caregiver message
+in microseconds. Scenario nodes run these rules before calling the model and
+fill ``context_data`` with whatever they find; the model is then told those
+fields are done. Every extractor returns None when it is not sure, and the
+model keeps the final say on anything the rules leave unset.
+"""
+
+import datetime
+import re
+
+WEEKDAYS = ("Monday", "Tuesday", "Wednesday", "Thursday", "Friday", "Saturday", "Sunday")
+MONTHS = (
+    "january", "february", "march", "april", "may", "june",
+    "july", "august", "september", "october", "november", "december",
+)
+
+_PHONE = re.compile(r"(?<!\d)(?:\+?1[\s.-]?)?\(?(\d{3})\)?[\s.-]?(\d{3})[\s.-]?(\d{4})(?!\d)")
+# A bare h:mm is only a time when the hour is 0 or 13-23, or a part of the day
+# follows ("9:05 in the morning"); "1:15" alone could be either
+_TIME = re.compile(
+    r"\b(?:(noon|midday|midnight)|(\d{1,2})(?::(\d{2}))?\s*([ap])\.?\s*m\b\.?"
+    r"|([01]?\d|2[0-3]):([0-5]\d)(?:\s+(?:in\s+the\s+)?(morning|afternoon|evening|tonight|at\s+night))?)",
+    re.IGNORECASE,
+)
+# Bare "sat", "sun" and "wed" are ordinary words, so those days need their full name
+_WEEKDAY = re.compile(
+    r"\b(monday|tuesday|wednesday|thursday|friday|saturday|sunday|mon|tues?|thu(?:rs?)?|fri)\b",
+    re.IGNORECASE,
+)
+_WEEKDAY_RANGE = re.compile(
+    r"\b(mon|tue|wed|thu|fri|sat|sun)[a-z]*\.?\s*(?:-|–|to|through|thru)\s*(mon|tue|wed|thu|fri|sat|sun)[a-z]*\b",
+    re.IGNORECASE,
+)
+_ISO_DATE = re.compile(r"\b(\d{4})-(\d{1,2})-(\d{1,2})\b")
+_US_DATE = re.compile(r"\b(\d{1,2})/(\d{1,2})(?:/(\d{2,4}))?\b")
+_MONTH_DATE = re.compile(
+    r"\b(" + "|".join(month[:3] for month in MONTHS) + r")[a-z]*\.?\s+(\d{1,2})(?:st|nd|rd|th)?(?:,?\s+(\d{4}))?\b",
+    re.IGNORECASE,
+)
+# "No problem" answers "is that okay?" with a yes; "I can't" is not "I can"
+_AFFIRM = re.compile(
+    r"^\W*(?:yes|yeah|yea|yep|yup|sure|correct|absolutely|definitely|of course|that['’]?s right|i['’]?m here|i am here"
+    r"|i can(?!['’]?t\b)|no problem|not a problem|no worries)\b",
+    re.IGNORECASE,
+)
+# "Ok so the app broke" and "Right now I'm at the house" are not answers
+_AFFIRM_ALONE = re.compile(r"^\W*(?:ok|okay|alright|all right|right)\W*$", re.IGNORECASE)
+_NEGATE = re.compile(r"^\W*(?:no|nope|nah|not really|negative|i can['’]?t|i cannot|i won['’]?t|i don['’]?t)\b", re.IGNORECASE)
+_NEGATION_WORD = re.compile(r"\b(?:no|not|can['’]?t|cannot|won['’]?t|don['’]?t|never|but)\b", re.IGNORECASE)
+
+
+def _day_name(token):
+    prefix = token[:2].lower()
+    for day in WEEKDAYS:
+        if day[:2].lower() == prefix:
+            return day
+    return None
+
+
+def _format_time(hour, minute):
+    suffix = "AM" if hour < 12 else "PM"
+    return f"{hour % 12 or 12}:{minute:02d} {suffix}"
+
+
+def _times(text):
+    times = []
+    for match in _TIME.finditer(text):
+        word, hour, minute, meridiem, hour24, minute24, daypart = match.groups()
+        if word:
+            times.append("12:00 AM" if word.lower() == "midnight" else "12:00 PM")
+        elif meridiem:
+            hour = int(hour)
+            if not 1 <= hour <= 12:
+                continue
+            minute = int(minute or 0)
+            if minute > 59:
+                continue
+            hour = hour % 12 + (12 if meridiem.lower() == "p" else 0)
+            times.append(_format_time(hour, minute))
+        else:
+            hour = int(hour24)
+            if daypart:
+                if not 1 <= hour <= 12:
+                    continue
+                hour = hour % 12 + (0 if daypart.lower() == "morning" else 12)
+            elif 1 <= hour <= 12:
+                continue
+            times.append(_format_time(hour, int(minute24)))
+    return times
+
+
+def _weekdays(text):
+    days = []
+    for match in _WEEKDAY_RANGE.finditer(text):
+        start, end = WEEKDAYS.index(_day_name(match.group(1))), WEEKDAYS.index(_day_name(match.group(2)))
+        span = range(start, end + 1) if start <= end else list(range(start, 7)) + list(range(0, end + 1))
+        days.extend(WEEKDAYS[i] for i in span)
+    text = _WEEKDAY_RANGE.sub(" ", text)
+    days.extend(_day_name(match.group(1)) for match in _WEEKDAY.finditer(text))
+    return list(dict.fromkeys(days))
+
+
+def extract_phone(text):
+    """A single US phone number as ``555-123-4567``."""
+    numbers = {"-".join(match.groups()) for match in _PHONE.finditer(text)}
+    return numbers.pop() if len(numbers) == 1 else None
+
+
+def extract_time(text):
+    """A single clock time as ``9:30 AM``."""
+    times = set(_times(text))
+    return times.pop() if len(times) == 1 else None
+
+
+def extract_weekday(text):
+    """A single weekday name."""
+    days = _weekdays(text)
+    return days[0] if len(days) == 1 else None
+
+
+def extract_date(text, today=None, explicit=False):
+    """
+    A single calendar date as ISO ``YYYY-MM-DD`` (the current year if none is
+    given). With ``explicit``, a bare ``1/2`` (which may be a fraction) does
+    not count: only ISO dates, month names and ``M/D/YYYY``.
+    """
+    year = (today or datetime.date.today()).year
+    found = set()
+    for match in _ISO_DATE.finditer(text):
+        found.add((int(match.group(1)), int(match.group(2)), int(match.group(3))))
+    for match in _US_DATE.finditer(text):
+        y = match.group(3)
+        if y is None and explicit:
+            continue
+        y = year if y is None else int(y) + (2000 if len(y) == 2 else 0)
+        found.add((y, int(match.group(1)), int(match.group(2))))
+    for match in _MONTH_DATE.finditer(text):
+        month = [m[:3] for m in MONTHS].index(match.group(1).lower()[:3]) + 1
+        found.add((int(match.group(3)) if match.group(3) else year, month, int(match.group(2))))
+    if len(found) != 1:
+        return None
+    try:
+        return datetime.date(*found.pop()).isoformat()
+    except ValueError:
+        return None
+
+
+def extract_schedule(text):
+    """Working days plus an optional time range, e.g. ``Monday, Tuesday 9:00 AM-5:00 PM``."""
+    days = _weekdays(text)
+    if not days:
+        return None
+    schedule = ", ".join(days)
+    times = _times(text)
+    if len(times) == 2:
+        schedule += f" {times[0]}-{times[1]}"
+    return schedule
+
+
+def extract_yes_no(text):
+    """True/False for a message that opens with a clear yes or no, else None."""
+    if _AFFIRM_ALONE.match(text):
+        return True
+    if _AFFIRM.match(text):
+        # "Yes, but I can't" is not a yes
+        rest = text[_AFFIRM.match(text).end():]
+        return None if _NEGATION_WORD.search(rest) else True
+    if _NEGATE.match(text):
+        return False
+    return None
+
+
+EXTRACTORS = {
+    "phone": extract_phone,
+    "time": extract_time,
+    "weekday": extract_weekday,
+    "date": extract_date,
+    "schedule": extract_schedule,
+    "yes_no": extract_yes_no,
+}
+
+# Values that identify their field on their own, whatever step the conversation
+# is on, and the extractor that only accepts unmistakable ones
+SELF_EVIDENT_KINDS = {
+    "phone": extract_phone,
+    "date": lambda text: extract_date(text, explicit=True),
+}
+
+# Extractor kind for every context field that has a fixed shape
+DEFAULT_FIELD_RULES = {
+    "unregistered_phone": "phone",
+    "scheduled_start_time": "time",
+    "actual_start_time": "time",
+    "makeup_time": "time",
+    "today_date": "date",
+    "remove_day": "weekday",
+    "regular_schedule": "schedule",
+    "is_regular_schedule": "yes_no",
+    "client_on_phone": "yes_no",
+    "client_name_confirmed": "yes_no",
+    "swap_confirmed": "yes_no",
+    "can_try_again": "yes_no",
+    "unscheduled_visit_attempted": "yes_no",
+    "client_can_confirm": "yes_no",
+    "new_phone_confirmed": "yes_no",
+    "app_works": "yes_no",
+    "coordinator_ok": "yes_no",
+    "can_makeup_hours": "yes_no",
+}
+
+
+def extract_field(field_name, text, rules=DEFAULT_FIELD_RULES):
+    """Run the rule for one field; None if the field has no rule or nothing was found."""
+    kind = rules.get(field_name)
+    if kind is None or not text:
+        return None
+    return EXTRACTORS[kind](text)
+
+
+def prefill_fields(text, rules, step_fields, context):
+    """
+    Values the rules can fill from the latest message.
+
+    Fields of the current step are always candidates. A phone number or an
+    unmistakable date also fills a field outside the step when it is still
+    unset and no other field of the scenario takes that kind of value, so an
+    ambiguous value is never guessed into the wrong field. A yes/no answer is only attributed
+    when the current step asks exactly one yes/no question.
+    """
+    if not text:
+        return {}
+    kinds = {}
+    for name, kind in rules.items():
+        kinds.setdefault(kind, []).append(name)
+    step_yes_no = [name for name in step_fields if rules.get(name) == "yes_no"]
+
+    candidates = {name: EXTRACTORS[rules[name]] for name in step_fields if name in rules}
+    for kind, names in kinds.items():
+        if kind not in SELF_EVIDENT_KINDS or len(names) != 1:
+            continue
+        if names[0] not in candidates and context.get(names[0]) in (None, ""):
+            candidates[names[0]] = SELF_EVIDENT_KINDS[kind]
+
+    values = {}
+    for name, extractor in candidates.items():
+        if rules[name] == "yes_no" and len(step_yes_no) != 1:
+            continue
+        value = extractor(text)
+        if value is not None:
+            values[name] = value
+    return values
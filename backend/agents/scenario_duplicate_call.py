@@ -1,76 +1,36 @@
-from langchain_openai.chat_models import ChatOpenAI
-from langchain_core.messages import SystemMessage, HumanMessage
-import json
+from .scenario_engine import ScenarioSpec, WorkflowStep
 
-def duplicate_call_node(state):
-    llm = ChatOpenAI(model="gpt-4o", temperature=0.5)
-    context = state.get("context_data", {})
-    messages = state["messages"]
-    user_input = None
-    for msg in reversed(messages):
-        if isinstance(msg, HumanMessage):
-            user_input = msg.content
-            break
-
-    context_fields = [
+SPEC = ScenarioSpec(
+    scenario_id="duplicate_call",
+    name="Duplicate Call",
+    description="Caregiver accidentally clocked in or out more than once; no call needed, call will be rejected.",
+    context_fields=[
         "caregiver_name",
         "client_name",
         "duplicate_call_reason",
         "substep"
-    ]
-    workflow = [
-        {"substep": "greet", "description": "Greet and explain duplicate call.", "extract": []},
-        {"substep": "explain_duplicate", "description": "Explain why duplicate calls are rejected and answer any questions.", "extract": ["duplicate_call_reason"]},
-        {"substep": "end", "description": "End the conversation politely.", "extract": []},
-    ]
-    scenario_examples = """
-Example 1:
-Caregiver: Why was my call rejected?
-Agent: You made a duplicate clock-in/out call. No call is needed for duplicate clock-in/out. The call will be rejected.
-"""
-    system_prompt = (
-        f"You are Rosella from Independence Care, a professional caregiver support representative.\n"
-        f"Your main job is to extract and update all relevant context fields for this scenario after each message.\n"
-        f"Extraction rules (ALWAYS follow):\n"
-        f"- After every message, extract and update ALL context fields you can infer from the conversation so far, even if not explicitly stated.\n"
-        f"- Always make sense of the conversation as a whole.\n"
-        f"- If a field is already present and valid, do not ask for it again.\n"
-        f"- Only ask for missing or unclear information.\n"
-        f"- If the workflow is complete, set 'substep' to 'end'.\n"
-        f"- If you need more information, keep the substep the same and ask for clarification.\n"
-        f"- Never break, always handle the situation gracefully.\n"
-        f"Context fields: {', '.join(context_fields)}\n"
-        f"Current context: {json.dumps(context)}\n"
-        f"Current workflow step: {context.get('substep', 'greet')}\n"
-        f"Workflow steps (in order):\n" + "\n".join([
-            f"- {step['substep']}: {step['description']} (extract: {', '.join(step['extract']) if step['extract'] else 'none'})" for step in workflow
-        ]) + "\n"
-        f"Example:\nCaregiver: Why was my call rejected?\nAgent: You made a duplicate clock-in/out call. No call is needed for duplicate clock-in/out. The call will be rejected.\n" \
-        f"After your response, append a delimiter '---EXTRACTED---' and then the extracted data as JSON on a new line. Do not write anything like ``` json ``` or anything like that.\n"
-        f"The extracted JSON should include any relevant fields and MUST include the next substep as 'substep'.\n"
-    )
-    conversation = [SystemMessage(content=system_prompt)]
-    if user_input:
-        conversation.append(HumanMessage(content=user_input))
-    else:
-        conversation.append(HumanMessage(content=""))
-    response = llm.invoke(conversation)
-    content = response.content
-    if '---EXTRACTED---' in content:
-        reply, extracted = content.split('---EXTRACTED---', 1)
-        reply = reply.strip()
-        if not reply.endswith('\n'):
-            reply = reply + '\n'
-        extracted = extracted.strip()
-        try:
-            extracted_json = json.loads(extracted)
-        except Exception:
-            extracted_json = {}
-    else:
-        reply = content.strip()
-        extracted_json = {}
-    if isinstance(extracted_json, dict):
-        context.update({k: v for k, v in extracted_json.items() if v is not None})
-    if extracted_json.get("substep"):
-        context["substep"] = extracted_json["substep"]
-    return {"messages": messages + [SystemMessage(content=reply)], "context_data": context}
\ No newline at end of file
+    ],
+    # Only the greeting is a template; explaining the rejection and closing are
+    # short model turns the small tier handles (unusable replies go to the large one)
+    tier="small",
+    workflow=[
+        WorkflowStep("greet", "Greet and explain duplicate call.", next=("explain_duplicate",), templates=(
+            "Hello {caregiver_name}, this is Rosella, I am calling from Independence Care. I see you clocked in or out more than once, so one of those calls was a duplicate.",
+            "Hello, this is Rosella, I am calling from Independence Care. I see you clocked in or out more than once, so one of those calls was a duplicate.",
+        )),
+        WorkflowStep("explain_duplicate", "Explain why duplicate calls are rejected and answer any questions.", extract=("duplicate_call_reason",), next=("end",), fallback="Do you have any questions about the duplicate call?"),
+        WorkflowStep("end", "End the conversation politely.", next=("end",)),
+    ],
+    rules=[
+        "After every message, extract and update ALL context fields you can infer from the conversation so far, even if not explicitly stated.",
+        "Always make sense of the conversation as a whole.",
+        "If a field is already present and valid, do not ask for it again.",
+        "Only ask for missing or unclear information.",
+        "If the workflow is complete, set 'substep' to 'end'.",
+        "If you need more information, keep the substep the same and ask for clarification.",
+        "Never break, always handle the situation gracefully.",
+    ],
+    examples=(
+        "Example:\nCaregiver: Why was my call rejected?\nAgent: You made a duplicate clock-in/out call. No call is needed for duplicate clock-in/out. The call will be rejected.\n"
+    ),
+)
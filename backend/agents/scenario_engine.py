@@ -0,0 +1,457 @@
+# backend/agents/scenario_engine.py
+"""
+Table-driven scenario engine.
+
+Each ``scenario_*.py`` module only declares a ``ScenarioSpec`` (context fields,
+workflow, scenario-specific rules and examples). ``build_scenario_node``
+compiles a spec once at startup - static prompt prefix, step index,
+allowed substep transitions, response templates and the typed context
+schema - and returns the LangGraph node that runs it. Turns on a templated step are answered locally
+from ``context_data`` without a model call, and repeated turns are answered
+from the response cache. When the model is unavailable (deadline, errors or
+an open circuit breaker, see ``llm_resilience``) the step's fallback line is
+sent instead and the caregiver stays on the same step. Model turns run on the
+step's model tier (see ``model_router``); small-tier turns are not streamed,
+so an unusable one can be replaced by a large-tier answer. With
+``REPLY_FORMAT=json_schema`` model turns use structured output: the reply,
+the context fields and the next substep come back as one JSON object whose
+schema is compiled from the scenario's context fields and workflow.
+"""
+
+import string
+import threading
+import time
+from collections import defaultdict
+from dataclasses import dataclass, field
+from functools import cached_property
+from typing import Dict, List, Optional, Tuple
+
+from langchain_core.messages import HumanMessage, SystemMessage
+
+from config import Config
+from metrics import NODE_DURATION
+
+from .context_schema import ContextSchema
+from .llm_resilience import LLMUnavailable
+from .llm_scheduler import LLMOverloaded
+from .memory import summary_message
+from .model_router import TIERS, routed_call
+from .prompt_budget import (
+    PromptBudget,
+    count_tokens,
+    fit_context,
+    fit_history,
+    fit_user_input,
+    prompt_accounting,
+)
+from .prompt_cache import build_system_prompt
+from .response_cache import response_cache
+from .rule_extractors import DEFAULT_FIELD_RULES, prefill_fields
+from .streaming import emit_text, generate_turn
+
+PROMPT_HEADER = (
+    "You are Rosella from Independence Care, a professional caregiver support representative.\n"
+    "Your main job is to extract and update all relevant context fields for this scenario after each message.\n"
+    "Extraction rules (ALWAYS follow):\n"
+)
+
+EXTRACTED_INSTRUCTIONS = (
+    "After your response, append a delimiter '---EXTRACTED---' and then the extracted data as JSON on a new line. Do not write anything like ``` json ``` or anything like that.\n"
+    "The extracted JSON should include any relevant fields and MUST include the next substep as 'substep'.\n"
+)
+
+STRUCTURED_INSTRUCTIONS = (
+    "Respond with a JSON object: 'reply' is your message to the caregiver, 'substep' MUST be the next substep "
+    "and 'fields' holds every context field (null when it is unknown or unchanged).\n"
+)
+
+# Opening of every reply sent while the model is unavailable
+FALLBACK_PREFIX = "Sorry, I'm having a little trouble on my end. "
+DEFAULT_FALLBACK = "Could you please say that again?"
+
+
+@dataclass(frozen=True)
+class WorkflowStep:
+    substep: str
+    description: str
+    extract: Tuple[str, ...] = ()
+    # Allowed next substeps. None means any step of the workflow. A step that
+    # extracts fields may also stay on itself; one that extracts nothing and
+    # has a single next substep always moves on.
+    next: Optional[Tuple[str, ...]] = None
+    # Scripted replies filled from context_data, most specific first. The first
+    # one whose placeholders are all set answers the turn without calling the
+    # model, so the caregiver's message is not read: only allowed on steps that
+    # extract nothing and have a single next substep other than themselves.
+    templates: Tuple[str, ...] = ()
+    # Question sent (after FALLBACK_PREFIX) when the model is unavailable;
+    # it should ask again for the fields this step extracts.
+    fallback: str = ""
+    # Model tier for this step's turns ("small" or "large"); None uses the spec's tier
+    tier: Optional[str] = None
+
+
+@dataclass
+class ScenarioSpec:
+    scenario_id: str
+    name: str
+    description: str
+    context_fields: List[str]
+    workflow: List[WorkflowStep]
+    rules: List[str]
+    examples: str = ""
+    # Model tier of the model turns (see agents/model_router.py); steps may override it
+    tier: str = "large"
+    temperature: float = 0.5
+    # Serve repeated turns from the response cache. ``cache_fields`` are the
+    # context fields that go into the cache key (default: all context fields).
+    cacheable: bool = True
+    cache_fields: Optional[Tuple[str, ...]] = None
+    # field -> rule_extractors kind, filled before the model is called
+    # (default: the fields of DEFAULT_FIELD_RULES this scenario uses).
+    rule_fields: Optional[Dict[str, str]] = None
+    # field -> "str" or "bool" (default: context_schema.DEFAULT_FIELD_TYPES,
+    # everything else a string); values are coerced to these types.
+    field_types: Optional[Dict[str, str]] = None
+    # Send the recent turns and the conversation summary along with the
+    # latest message (see agents/memory.py). Such turns are never cached.
+    use_history: bool = False
+    # Per-turn token limits for context, history and user input
+    budget: PromptBudget = field(default_factory=PromptBudget.from_config)
+
+
+def render_workflow(workflow):
+    return "Workflow steps (in order):\n" + "\n".join([
+        f"- {step.substep}: {step.description} (extract: {', '.join(step.extract) if step.extract else 'none'})" for step in workflow
+    ]) + "\n"
+
+
+class TurnStats:
+    """
+    Per-scenario counters of template-, cache- and LLM-served turns, turns
+    shed by the LLM scheduler and turns answered from the fallback script.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._counts = defaultdict(lambda: {"template": 0, "cache": 0, "llm": 0, "shed": 0, "fallback": 0})
+
+    def record(self, scenario_id, source):
+        with self._lock:
+            self._counts[scenario_id][source] += 1
+
+    def snapshot(self):
+        with self._lock:
+            return {scenario_id: dict(counts) for scenario_id, counts in self._counts.items()}
+
+
+turn_stats = TurnStats()
+
+
+def _record(config, record, *args):
+    """
+    ``record(*args)`` now, or, for a speculative turn (``deferred_stats`` in
+    the graph config), once the turn is served: see ``record_deferred``.
+    """
+    deferred = ((config or {}).get("configurable") or {}).get("deferred_stats")
+    if deferred is None:
+        record(*args)
+    else:
+        deferred.append((record, args))
+
+
+def record_deferred(deferred_stats):
+    """Record the turn stats a served speculative turn deferred; a discarded one's are never recorded."""
+    for record, args in deferred_stats:
+        record(*args)
+
+
+def build_response_format(scenario_id, schema, substeps):
+    """
+    The structured output format of a scenario's model turns: the reply
+    first (so it can be streamed), then the next substep and every context
+    field, all required as strict mode demands. A completion cut off in the
+    fields object still keeps the reply and the substep.
+    """
+    return {
+        "type": "json_schema",
+        "json_schema": {
+            "name": f"{scenario_id}_turn",
+            "strict": True,
+            "schema": {
+                "type": "object",
+                "properties": {
+                    "reply": {"type": "string"},
+                    "substep": {"type": "string", "enum": list(substeps)},
+                    "fields": schema.json_schema(),
+                },
+                "required": ["reply", "substep", "fields"],
+                "additionalProperties": False,
+            },
+        },
+    }
+
+
+def reply_instructions(response_format):
+    return STRUCTURED_INSTRUCTIONS if response_format is not None else EXTRACTED_INSTRUCTIONS
+
+
+def _template_fields(template):
+    return frozenset(name for _, name, _, _ in string.Formatter().parse(template) if name)
+
+
+def last_human_input(messages):
+    for msg in reversed(messages):
+        if isinstance(msg, HumanMessage):
+            return msg.content
+    return None
+
+
+@dataclass
+class CompiledScenario:
+    spec: ScenarioSpec
+    prompt_prefix: str
+    steps: Dict[str, WorkflowStep]
+    transitions: Dict[str, Tuple[str, ...]] = field(default_factory=dict)
+    # substep -> [(template, required context fields), ...]
+    templates: Dict[str, List[Tuple[str, frozenset]]] = field(default_factory=dict)
+    rule_fields: Dict[str, str] = field(default_factory=dict)
+    schema: Optional[ContextSchema] = None
+    # Structured output format of the model turns; None with the ---EXTRACTED--- protocol
+    response_format: Optional[dict] = None
+
+    @classmethod
+    def compile(cls, spec):
+        steps = {step.substep: step for step in spec.workflow}
+        all_substeps = tuple(steps)
+        transitions = {}
+        for step in spec.workflow:
+            allowed = step.next if step.next is not None else all_substeps
+            unknown = set(allowed) - set(steps)
+            if unknown:
+                raise ValueError(f"{spec.scenario_id}: step '{step.substep}' transitions to unknown substeps {sorted(unknown)}")
+            allowed = tuple(allowed)
+            if step.extract and len(allowed) == 1 and allowed != (step.substep,):
+                # A step that asks for fields may stay put until the caregiver has answered
+                allowed += (step.substep,)
+            transitions[step.substep] = allowed
+        unknown_tiers = {step.tier for step in spec.workflow if step.tier} | {spec.tier}
+        unknown_tiers -= set(TIERS)
+        if unknown_tiers:
+            raise ValueError(f"{spec.scenario_id}: unknown model tiers {sorted(unknown_tiers)}")
+        templates = {}
+        for step in spec.workflow:
+            if not step.templates:
+                continue
+            if len(transitions[step.substep]) != 1 or transitions[step.substep] == (step.substep,):
+                raise ValueError(f"{spec.scenario_id}: templated step '{step.substep}' needs a single next substep other than itself")
+            if step.extract:
+                raise ValueError(f"{spec.scenario_id}: templated step '{step.substep}' cannot extract fields")
+            templates[step.substep] = [(template, _template_fields(template)) for template in step.templates]
+            undeclared = set().union(*(fields for _, fields in templates[step.substep])) - set(spec.context_fields)
+            if undeclared:
+                raise ValueError(f"{spec.scenario_id}: templates of '{step.substep}' use undeclared fields {sorted(undeclared)}")
+        if Config.REPLY_FORMAT not in ("json_schema", "delimiter"):
+            raise ValueError(f"Unknown REPLY_FORMAT {Config.REPLY_FORMAT!r}: expected json_schema or delimiter")
+        schema = ContextSchema(spec.scenario_id, spec.context_fields, spec.field_types, all_substeps)
+        response_format = build_response_format(spec.scenario_id, schema, all_substeps) if Config.REPLY_FORMAT == "json_schema" else None
+        prompt_prefix = (
+            PROMPT_HEADER
+            + "".join(f"- {rule}\n" for rule in spec.rules)
+            + f"Context fields: {', '.join(spec.context_fields)}\n"
+            + render_workflow(spec.workflow)
+            + spec.examples
+            + reply_instructions(response_format)
+        )
+        if spec.rule_fields is not None:
+            rule_fields = dict(spec.rule_fields)
+        else:
+            rule_fields = {name: DEFAULT_FIELD_RULES[name] for name in spec.context_fields if name in DEFAULT_FIELD_RULES}
+        return cls(
+            spec=spec, prompt_prefix=prompt_prefix, steps=steps, transitions=transitions,
+            templates=templates, rule_fields=rule_fields, schema=schema, response_format=response_format,
+        )
+
+    @property
+    def first_substep(self):
+        return self.spec.workflow[0].substep
+
+    def deterministic_next(self, substep):
+        """The next substep if the workflow leaves only one choice, else None."""
+        allowed = self.transitions.get(substep)
+        if allowed is not None and len(allowed) == 1:
+            return allowed[0]
+        return None
+
+    @property
+    def cache_fields(self):
+        fields = self.spec.cache_fields if self.spec.cache_fields is not None else self.spec.context_fields
+        return tuple(name for name in fields if name != "substep")
+
+    @cached_property
+    def section_tokens(self):
+        """Token counts of the static prompt sections, sent on every model call."""
+        spec = self.spec
+        return {
+            "instructions": count_tokens(
+                PROMPT_HEADER + f"Context fields: {', '.join(spec.context_fields)}\n" + reply_instructions(self.response_format)
+            ),
+            "rules": count_tokens("".join(f"- {rule}\n" for rule in spec.rules)),
+            "workflow": count_tokens(render_workflow(spec.workflow)),
+            "examples": count_tokens(spec.examples),
+        }
+
+    def prefill(self, substep, user_input, context):
+        """Rule-extracted values from the latest message, and whether the step's fields are now all set."""
+        step = self.steps.get(substep)
+        step_fields = step.extract if step is not None else ()
+        values = prefill_fields(user_input, self.rule_fields, step_fields, context)
+        done = bool(step_fields) and all(
+            values.get(name, context.get(name)) not in (None, "") for name in step_fields
+        )
+        return values, done
+
+    def render_template(self, substep, context):
+        """The scripted reply for this substep, or None if the turn needs the model."""
+        for template, required in self.templates.get(substep, ()):
+            if all(context.get(name) not in (None, "") for name in required):
+                return template.format_map(context)
+        return None
+
+    def tier_for(self, substep):
+        """The model tier named for turns on this substep."""
+        step = self.steps.get(substep)
+        return (step.tier if step is not None else None) or self.spec.tier
+
+    def route_check(self, substep, extracted_json):
+        """Why a small-tier turn's extracted JSON cannot be used (it goes to the large tier), or None."""
+        if not extracted_json:
+            return "parse_failure"
+        if self.deterministic_next(substep) is None and extracted_json.get("substep") not in self.transitions.get(substep, ()):
+            return "bad_substep"
+        return None
+
+    def fallback_reply(self, substep):
+        """The reply of a turn on this substep when the model is unavailable."""
+        step = self.steps.get(substep)
+        return FALLBACK_PREFIX + (step.fallback if step is not None and step.fallback else DEFAULT_FALLBACK) + "\n"
+
+    def next_substep(self, substep, proposed):
+        """
+        Resolve the substep after this turn. Deterministic transitions win over
+        whatever the model proposed; otherwise the model's proposal is accepted
+        only if the workflow allows it, and the substep stays put if not.
+        """
+        deterministic = self.deterministic_next(substep)
+        if deterministic is not None:
+            return deterministic
+        allowed = self.transitions.get(substep, tuple(self.steps))
+        if proposed in allowed:
+            return proposed
+        return substep
+
+
+def build_scenario_node(spec):
+    compiled = CompiledScenario.compile(spec)
+    use_cache = spec.cacheable and not spec.use_history and response_cache.enabled_for(spec.scenario_id)
+
+    node_name = f"{spec.scenario_id}_node"
+    # Requests over budget were already trimmed or rejected in main.py; context
+    # that grows during the call is trimmed rather than failing the turn.
+    budget = spec.budget.trimming()
+
+    async def run_turn(state, config):
+        """Answer one turn; returns ``(state update, source)`` with source template, cache, llm or fallback."""
+        context = state.get("context_data", {})
+        messages = state["messages"]
+        substep = context.get("substep", compiled.first_substep)
+
+        reply = compiled.render_template(substep, context)
+        if reply is not None:
+            await emit_text(config, reply)
+            context["substep"] = compiled.next_substep(substep, None)
+            return {"messages": [SystemMessage(content=reply)], "context_data": context}, "template"
+
+        user_input = last_human_input(messages)
+        prefilled, extraction_done = compiled.prefill(substep, user_input, context)
+        context.update(prefilled)
+
+        cache_key = None
+        cached = None
+        if use_cache:
+            cache_key = response_cache.make_key(spec.scenario_id, substep, user_input, context, compiled.cache_fields)
+            cached = response_cache.get(cache_key)
+
+        if cached is not None:
+            source = "cache"
+            reply, extracted_json = cached
+            await emit_text(config, reply)
+        else:
+            source = "llm"
+            prompt_context = fit_context(spec.scenario_id, context, spec.context_fields, budget)
+            system_prompt = build_system_prompt(
+                spec.scenario_id, compiled.prompt_prefix, prompt_context, prefilled, extraction_done
+            )
+            conversation = [SystemMessage(content=system_prompt)]
+            if spec.use_history:
+                if state.get("summary"):
+                    conversation.append(summary_message(state["summary"]))
+                conversation.extend(fit_history(state.get("history") or [], budget))
+            user_text = fit_user_input(spec.scenario_id, user_input, budget)
+            conversation.append(HumanMessage(content=user_text))
+            _record(config, prompt_accounting.record, spec.scenario_id, {
+                **compiled.section_tokens,
+                "context": count_tokens(system_prompt[len(compiled.prompt_prefix):]),
+                "history": sum(count_tokens(message.content) for message in conversation[1:-1]),
+                "user_input": count_tokens(user_text),
+            })
+
+            async def call(tier):
+                # Only the large tier streams: a small-tier reply may still be replaced
+                streamed = tier.name == "large"
+                reply, extracted_json = await generate_turn(
+                    tier.chat_model(spec.temperature), conversation, config,
+                    scenario_id=spec.scenario_id, tier=tier.name, stream=streamed,
+                    response_format=compiled.response_format,
+                )
+                return reply, extracted_json, streamed
+
+            try:
+                reply, extracted_json, streamed = await routed_call(
+                    spec.scenario_id, compiled.tier_for(substep), call,
+                    lambda result: compiled.route_check(substep, result[1]),
+                )
+            except LLMUnavailable:
+                # Ask again on the same step; values the rules extracted are kept
+                reply = compiled.fallback_reply(substep)
+                await emit_text(config, reply)
+                context["substep"] = substep
+                return {"messages": [SystemMessage(content=reply)], "context_data": context}, "fallback"
+            if not streamed:
+                await emit_text(config, reply)
+            # Only well-formed completions are worth replaying
+            if cache_key is not None and extracted_json:
+                response_cache.put(cache_key, reply, extracted_json)
+
+        # Typed update with the declared fields; the substep goes through the workflow transitions
+        compiled.schema.apply(context, {k: v for k, v in extracted_json.items() if k != "substep"})
+        context["substep"] = compiled.next_substep(substep, extracted_json.get("substep"))
+
+        # Only the new message: the ChatState reducer appends it to the history
+        return {"messages": [SystemMessage(content=reply)], "context_data": context}, source
+
+    async def scenario_node(state, config=None):
+        started = time.perf_counter()
+        try:
+            update, source = await run_turn(state, config)
+        except LLMOverloaded:
+            _record(config, NODE_DURATION.labels(node_name, "shed").observe, time.perf_counter() - started)
+            _record(config, turn_stats.record, spec.scenario_id, "shed")
+            raise
+        _record(config, NODE_DURATION.labels(node_name, source).observe, time.perf_counter() - started)
+        _record(config, turn_stats.record, spec.scenario_id, source)
+        return update
+
+    scenario_node.__name__ = scenario_node.__qualname__ = node_name
+    scenario_node.compiled = compiled
+    return scenario_node
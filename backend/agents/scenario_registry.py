@@ -0,0 +1,47 @@
+# backend/agents/scenario_registry.py
+
+from json_codec import dumps_bytes
+
+from .scenario_engine import build_scenario_node
+from .scenario_general_chat import SPEC as GENERAL_CHAT
+from .scenario_no_schedule import SPEC as NO_SCHEDULE
+from .scenario_out_of_window import SPEC as OUT_OF_WINDOW
+from .scenario_gps_out_of_range import SPEC as GPS_OUT_OF_RANGE
+from .scenario_wrong_phone import SPEC as WRONG_PHONE
+from .scenario_phone_not_found import SPEC as PHONE_NOT_FOUND
+from .scenario_duplicate_call import SPEC as DUPLICATE_CALL
+
+DEFAULT_SCENARIO_ID = "general_chat"
+
+# Ordered as listed by /scenarios
+SCENARIO_SPECS = {
+    spec.scenario_id: spec
+    for spec in (
+        GENERAL_CHAT,
+        NO_SCHEDULE,
+        OUT_OF_WINDOW,
+        GPS_OUT_OF_RANGE,
+        WRONG_PHONE,
+        PHONE_NOT_FOUND,
+        DUPLICATE_CALL,
+    )
+}
+
+# Compiled once at startup: prompt prefix, step index and substep transitions
+SCENARIO_NODES = {scenario_id: build_scenario_node(spec) for scenario_id, spec in SCENARIO_SPECS.items()}
+
+# Typed context schema per scenario, used to validate every context write
+SCENARIO_SCHEMAS = {scenario_id: node.compiled.schema for scenario_id, node in SCENARIO_NODES.items()}
+
+# What /scenarios lists, built and serialized once
+SCENARIO_CATALOG = [
+    {
+        "id": spec.scenario_id,
+        "name": spec.name,
+        "description": spec.description,
+        "context_fields": list(spec.context_fields),
+        "field_types": SCENARIO_SCHEMAS[spec.scenario_id].field_types(),
+    }
+    for spec in SCENARIO_SPECS.values()
+]
+SCENARIO_CATALOG_JSON = dumps_bytes(SCENARIO_CATALOG)
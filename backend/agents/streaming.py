@@ -0,0 +1,341 @@
+# backend/agents/streaming.py
+
+import re
+import threading
+import time
+from collections import defaultdict
+from json.decoder import scanstring
+
+from json_codec import decode_model_object
+from metrics import EXTRACTION_PARSE_FAILURES, LLM_REQUEST_DURATION, LLM_TIME_TO_FIRST_TOKEN, REPLY_DECODES
+
+from .llm_clients import capture_stream_usage
+from .llm_resilience import LLMInterrupted, LLMUnavailable, guard_for
+from .llm_scheduler import llm_scheduler, scheduler_key
+
+EXTRACTED_DELIMITER = "---EXTRACTED---"
+
+# Start of the reply string in a structured completion
+_REPLY_KEY = re.compile(r'"reply"\s*:\s*"')
+# Complete characters and escapes of a JSON string body
+_STRING_BODY = re.compile(r'(?:[^"\\]|\\["\\/bfnrt]|\\u[0-9a-fA-F]{4})*')
+# A \uD800-\uDBFF escape at the end: its low surrogate is still to come
+_HIGH_SURROGATE_END = re.compile(r'(?<!\\)(?:\\\\)*\\u[dD][89abAB][0-9a-fA-F]{2}$')
+
+
+class ExtractedStreamSplitter:
+    """
+    Incrementally split a scenario completion into the caregiver-facing reply
+    and the JSON block that follows ``---EXTRACTED---``.
+
+    ``feed()`` returns the text that is safe to show the caregiver right away.
+    Text that could be the start of the delimiter is held back until the next
+    chunk disambiguates it, and everything after the delimiter is buffered and
+    never shown. ``close()`` returns ``(reply, extracted_json)`` with the same
+    normalization the scenario nodes have always applied.
+    """
+
+    def __init__(self):
+        self._pending = ""
+        self._reply_parts = []
+        self._tail_parts = []
+        self._in_tail = False
+        # Why the extracted JSON was unusable, if it was: missing_delimiter,
+        # invalid_json or not_object
+        self.parse_error = None
+        # How it was decoded: clean, salvaged or failed
+        self.outcome = None
+
+    def feed(self, chunk):
+        if not chunk:
+            return ""
+        if self._in_tail:
+            self._tail_parts.append(chunk)
+            return ""
+
+        buffered = self._pending + chunk
+        index = buffered.find(EXTRACTED_DELIMITER)
+        if index >= 0:
+            self._in_tail = True
+            self._pending = ""
+            self._tail_parts.append(buffered[index + len(EXTRACTED_DELIMITER):])
+            return self._emit(buffered[:index])
+
+        # Hold back the longest suffix that is still a prefix of the delimiter.
+        hold = 0
+        for size in range(min(len(buffered), len(EXTRACTED_DELIMITER) - 1), 0, -1):
+            if EXTRACTED_DELIMITER.startswith(buffered[-size:]):
+                hold = size
+                break
+        self._pending = buffered[len(buffered) - hold:] if hold else ""
+        return self._emit(buffered[:len(buffered) - hold])
+
+    def _emit(self, text):
+        if text:
+            self._reply_parts.append(text)
+        return text
+
+    def flush(self):
+        """Release held-back text once the stream has ended without a delimiter."""
+        text, self._pending = self._pending, ""
+        return self._emit(text)
+
+    @property
+    def saw_delimiter(self):
+        return self._in_tail
+
+    def close(self):
+        self.flush()
+        reply = "".join(self._reply_parts).strip()
+        if not self._in_tail:
+            self.parse_error = "missing_delimiter"
+            self.outcome = "failed"
+            return reply, {}
+        # Ensure reply ends with a single newline before the delimiter
+        if not reply.endswith("\n"):
+            reply = reply + "\n"
+        # Tolerates code fences and trailing text around the object
+        extracted_json, how = decode_model_object("".join(self._tail_parts))
+        if extracted_json is None:
+            self.parse_error, self.outcome = how, "failed"
+            return reply, {}
+        self.outcome = how
+        return reply, extracted_json
+
+
+class StructuredReplyParser:
+    """
+    Incrementally parse a structured scenario completion: a JSON object with
+    the caregiver-facing ``reply``, the next ``substep`` and the ``fields``
+    object (see ``scenario_engine.build_response_format``).
+
+    Same interface as ``ExtractedStreamSplitter``: ``feed()`` returns the
+    decoded characters of the ``reply`` string as they arrive (an escape split
+    across chunks is held back), and ``close()`` returns
+    ``(reply, extracted_json)`` with the non-null fields and the substep. A
+    completion cut off mid-object keeps its complete members; one that is not
+    JSON at all becomes the reply with nothing extracted.
+    """
+
+    def __init__(self):
+        self._parts = []
+        self._buffer = ""
+        # Offset of the unread reply characters in _buffer while streaming the
+        # reply; None before it starts, -1 once it has ended
+        self._reply_at = None
+        self._reply_parts = []
+        # Why the context update was unusable, if it was: invalid_json,
+        # not_object or missing_fields
+        self.parse_error = None
+        # How it was decoded: clean, salvaged, partial or failed
+        self.outcome = None
+
+    def feed(self, chunk):
+        if not chunk:
+            return ""
+        self._parts.append(chunk)
+        if self._reply_at == -1:
+            return ""
+        self._buffer += chunk
+        if self._reply_at is None:
+            match = _REPLY_KEY.search(self._buffer)
+            if match is None:
+                return ""
+            self._buffer = self._buffer[match.end():]
+            self._reply_at = 0
+        return self._read_reply()
+
+    def _read_reply(self):
+        body = _STRING_BODY.match(self._buffer, self._reply_at)
+        end = body.end()
+        if end < len(self._buffer) and self._buffer[end] == '"':
+            # Closing quote: the rest of the object is only parsed by close()
+            text = self._buffer[self._reply_at:end]
+            self._buffer, self._reply_at = "", -1
+        else:
+            text = self._buffer[self._reply_at:end]
+            if _HIGH_SURROGATE_END.search(text):
+                text = text[:-6]
+            self._buffer = self._buffer[self._reply_at + len(text):]
+            self._reply_at = 0
+        if not text:
+            return ""
+        decoded = scanstring(text + '"', 0, False)[0]
+        self._reply_parts.append(decoded)
+        return decoded
+
+    def flush(self):
+        """Release the completion once the stream has ended if it was not JSON after all."""
+        if self._reply_at is None and not "".join(self._parts).lstrip().startswith(("{", "`")):
+            text = "".join(self._parts)
+            self._reply_parts.append(text)
+            self._reply_at = -1
+            return text
+        return ""
+
+    def close(self):
+        self.flush()
+        content = "".join(self._parts)
+        data, how = decode_model_object(content, partial=True)
+        if data is None:
+            self.parse_error, self.outcome = how, "failed"
+            reply = "".join(self._reply_parts) or content
+            return _with_newline(reply.strip()), {}
+
+        reply = data.get("reply")
+        if not isinstance(reply, str):
+            # Cut off inside the reply: keep what was decoded (and shown)
+            reply = "".join(self._reply_parts)
+        fields = data.get("fields")
+        extracted_json = {name: value for name, value in fields.items() if value is not None} if isinstance(fields, dict) else {}
+        if isinstance(data.get("substep"), str):
+            extracted_json["substep"] = data["substep"]
+        if not extracted_json:
+            self.parse_error, self.outcome = "missing_fields", "failed"
+        else:
+            self.outcome = how
+        return _with_newline(reply.strip()), extracted_json
+
+
+def _with_newline(reply):
+    return reply if reply.endswith("\n") else reply + "\n"
+
+
+class ReplyDecodeStats:
+    """
+    Per-scenario outcomes of decoding model turns. ``turns_saved`` are the
+    turns whose context update was only recovered by the lenient decoding
+    (salvaged or partial JSON): without it the update would have been lost
+    and the caregiver asked the same question again.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._counts = defaultdict(lambda: {"clean": 0, "salvaged": 0, "partial": 0, "failed": 0})
+
+    def record(self, scenario_id, reply_format, outcome):
+        REPLY_DECODES.labels(scenario_id, reply_format, outcome).inc()
+        with self._lock:
+            self._counts[scenario_id][outcome] += 1
+
+    def snapshot(self):
+        with self._lock:
+            counts = {scenario_id: dict(outcomes) for scenario_id, outcomes in self._counts.items()}
+        result = {}
+        for scenario_id, outcomes in sorted(counts.items()):
+            turns = sum(outcomes.values())
+            result[scenario_id] = {
+                "turns": turns,
+                **outcomes,
+                "failure_rate": outcomes["failed"] / turns if turns else 0.0,
+                "turns_saved": outcomes["salvaged"] + outcomes["partial"],
+            }
+        return result
+
+
+reply_decode_stats = ReplyDecodeStats()
+
+
+def split_extracted(content):
+    """Split a complete scenario completion into ``(reply, extracted_json)``."""
+    splitter = ExtractedStreamSplitter()
+    splitter.feed(content)
+    return splitter.close()
+
+
+def _token_sink(config):
+    return ((config or {}).get("configurable") or {}).get("token_sink")
+
+
+async def emit_text(config, text):
+    """Send a reply produced without the model to the stream, if the turn is streamed."""
+    token_sink = _token_sink(config)
+    if token_sink is not None and text:
+        await token_sink(text)
+
+
+async def generate_turn(llm, conversation, config=None, scenario_id=None, tier="large", stream=True, response_format=None):
+    """
+    Run one scenario LLM call and return ``(reply, extracted_json)``.
+
+    With a ``response_format`` the model is asked for structured output and
+    the completion is read by ``StructuredReplyParser``; without one it is
+    split at ``---EXTRACTED---``.
+
+    When the graph is invoked with a ``token_sink`` coroutine in
+    ``config["configurable"]`` (and ``stream`` is left on) the completion is
+    streamed and every visible piece of the reply is awaited into the sink as
+    soon as it arrives. With ``stream=False`` nothing is sent to the sink.
+    Provider-reported prompt caching, token counts, latency and how the
+    completion was decoded are recorded under ``scenario_id``. The call waits for a
+    slot of the LLM scheduler, queued under the session of the graph call,
+    and raises ``LLMOverloaded`` if it is shed. The call runs under
+    the tier's guard (deadline, hedging of invoked calls, circuit breaker) and
+    raises ``LLMUnavailable`` when it fails, or ``LLMInterrupted`` when a
+    streamed call fails after part of the reply was sent: a fallback line
+    cannot follow half a reply.
+    """
+    # Imported with the first model call, off the cold-start path
+    from .usage_handler import PrefixCacheUsageHandler
+
+    token_sink = _token_sink(config) if stream else None
+    model = getattr(llm, "model_name", None) or type(llm).__name__
+    usage_handler = PrefixCacheUsageHandler(scenario_id, model, tier) if scenario_id else None
+    llm_config = {"callbacks": [usage_handler]} if usage_handler else None
+    if response_format is not None:
+        llm = llm.bind(response_format=response_format)
+        splitter = StructuredReplyParser()
+    else:
+        splitter = ExtractedStreamSplitter()
+
+    async def invoke():
+        started = time.perf_counter()
+        response = await llm.ainvoke(conversation, config=llm_config)
+        LLM_REQUEST_DURATION.labels(scenario_id, model, "invoke").observe(time.perf_counter() - started)
+        return response.content
+
+    sent = False
+
+    async def stream():
+        nonlocal sent
+        started = time.perf_counter()
+        first_token = True
+        with capture_stream_usage() as usage:
+            async for chunk in llm.astream(conversation, config=llm_config):
+                if first_token and chunk.content:
+                    first_token = False
+                    LLM_TIME_TO_FIRST_TOKEN.labels(scenario_id, model).observe(time.perf_counter() - started)
+                text = splitter.feed(chunk.content)
+                if text:
+                    sent = True
+                    await token_sink(text)
+        if usage and usage_handler:
+            usage_handler.record(usage)
+        LLM_REQUEST_DURATION.labels(scenario_id, model, "stream").observe(time.perf_counter() - started)
+
+    llm_guard = guard_for(tier)
+    async with llm_scheduler.slot(scheduler_key(config)):
+        if token_sink is None:
+            splitter.feed(await llm_guard.call(invoke))
+            return _close(splitter, scenario_id)
+        # Streamed tokens are already on their way to the caregiver: never hedged
+        try:
+            await llm_guard.call(stream, hedge=False)
+        except LLMUnavailable as e:
+            if sent:
+                raise LLMInterrupted(e.reason) from e
+            raise
+    text = splitter.flush()
+    if text:
+        await token_sink(text)
+    return _close(splitter, scenario_id)
+
+
+def _close(splitter, scenario_id):
+    reply, extracted_json = splitter.close()
+    if splitter.parse_error is not None:
+        EXTRACTION_PARSE_FAILURES.labels(scenario_id, splitter.parse_error).inc()
+    if scenario_id:
+        reply_format = "json_schema" if isinstance(splitter, StructuredReplyParser) else "delimiter"
+        reply_decode_stats.record(scenario_id, reply_format, splitter.outcome)
+    return reply, extracted_json
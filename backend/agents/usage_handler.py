@@ -0,0 +1,43 @@
+# backend/agents/usage_handler.py
+"""
+Callback handler for provider-reported token usage.
+
+Kept out of ``prompt_cache`` because ``langchain_core.callbacks`` (and the
+langsmith client behind it) is one of the slowest imports of the app; it is
+only imported with the first model call.
+"""
+
+from langchain_core.callbacks import AsyncCallbackHandler
+
+from metrics import LLM_COMPLETION_TOKENS, LLM_PROMPT_TOKENS
+
+from .model_router import route_stats
+from .prompt_cache import prefix_stats
+
+
+class PrefixCacheUsageHandler(AsyncCallbackHandler):
+    """Feeds provider-reported token counts into ``prefix_stats``, the route cost and the token metrics."""
+
+    def __init__(self, scenario_id, model=None, tier="large"):
+        self.scenario_id = scenario_id
+        self.model = model
+        self.tier = tier
+
+    async def on_llm_end(self, response, **kwargs):
+        # Empty for streamed calls: generate_turn records their usage itself
+        usage = (response.llm_output or {}).get("token_usage")
+        if usage:
+            self.record(usage)
+
+    def record(self, usage):
+        """Record an OpenAI ``usage`` dict."""
+        prompt_tokens = usage.get("prompt_tokens") or 0
+        details = usage.get("prompt_tokens_details") or {}
+        cached_tokens = (details.get("cached_tokens") if isinstance(details, dict) else 0) or 0
+        if prompt_tokens:
+            prefix_stats.record_usage(self.scenario_id, prompt_tokens, cached_tokens)
+            LLM_PROMPT_TOKENS.labels(self.scenario_id, self.model).inc(prompt_tokens)
+        completion_tokens = usage.get("completion_tokens") or 0
+        if completion_tokens:
+            LLM_COMPLETION_TOKENS.labels(self.scenario_id, self.model).inc(completion_tokens)
+        route_stats.record_usage(self.scenario_id, self.tier, self.model, prompt_tokens, cached_tokens, completion_tokens)
@@ -1,23 +1,240 @@
-from langchain_openai.chat_models import ChatOpenAI
-import json
+"""
+Context field extraction outside the scenario nodes.
+
+``extract_context_fields`` returns every requested field of a message at
+once. Fixed-shape fields are answered by the regex rules; the rest become an
+extraction job. Jobs submitted by concurrent sessions within a few
+milliseconds of each other are sent to the model as one batched call, and
+successful results are memoized per (message, field set) so repeated text
+costs nothing. Batches run on ``EXTRACTION_TIER`` and go to the large model
+when the small one's answer is not a JSON object or the small tier is
+unavailable.
+"""
+
+import asyncio
+import threading
+from collections import OrderedDict
+
+from config import Config
+from json_codec import decode_object
+
+from .llm_resilience import guard_for
+from .llm_scheduler import llm_scheduler
+from .model_router import resolve_tier, routed_call
+from .rule_extractors import extract_field
+
+
+def build_batch_prompt(jobs):
+    """One prompt covering ``jobs``: a list of ``(user_input, field_names, instructions)``."""
+    parts = [
+        "Extract the requested fields from each message below.\n"
+        "Return only a JSON object that maps each job number to an object with the fields found in that message. "
+        "Leave out fields that are not present; use an empty object if none are.\n"
+    ]
+    for number, (user_input, field_names, instructions) in enumerate(jobs, 1):
+        parts.append(f"\nJob {number}:\nMessage: '{user_input}'\nFields: {', '.join(field_names)}\n")
+        if instructions:
+            parts.append(f"Notes: {instructions}\n")
+    return "".join(parts)
+
+
+def _job_result(results, number, field_names):
+    """The fields of job ``number`` in a batch answer, or None when the answer has no object for it."""
+    data = results.get(str(number)) if results else None
+    if not isinstance(data, dict):
+        return None
+    fields = set(field_names)
+    return {name: value for name, value in data.items() if name in fields}
+
+
+def _retrieve(future):
+    # Waiters may all have been cancelled; don't log the error as never retrieved
+    if not future.cancelled():
+        future.exception()
+
+
+class ExtractionBatcher:
+    """
+    Collects extraction jobs for ``window`` seconds (or until ``max_batch``
+    are pending) and answers them with a single model call. Identical jobs
+    share one result: finished ones from an LRU memo, in-flight ones by
+    awaiting the same future. Only answered jobs are memoized; a failed batch
+    raises its error to every job in it.
+    """
+
+    def __init__(self, window=0.01, max_batch=16, memo_entries=2048):
+        self.window = window
+        self.max_batch = max_batch
+        self.memo_entries = memo_entries
+        self._lock = threading.Lock()
+        self._memo = OrderedDict()
+        self._inflight = {}
+        self._pending = []
+        self._flush_handle = None
+        self._tasks = set()
+        self.counts = {"jobs": 0, "memo_hits": 0, "coalesced": 0, "llm_calls": 0, "failed": 0}
+
+    def lookup(self, key):
+        with self._lock:
+            self.counts["jobs"] += 1
+            if key not in self._memo:
+                return None
+            self._memo.move_to_end(key)
+            self.counts["memo_hits"] += 1
+            return dict(self._memo[key])
+
+    def remember(self, key, data):
+        with self._lock:
+            self._memo[key] = data
+            self._memo.move_to_end(key)
+            while len(self._memo) > self.memo_entries:
+                self._memo.popitem(last=False)
+
+    async def extract(self, user_input, field_names, instructions=""):
+        key = (user_input, tuple(sorted(field_names)), instructions)
+        memoized = self.lookup(key)
+        if memoized is not None:
+            return memoized
+        future = self._inflight.get(key)
+        if future is not None:
+            self.counts["coalesced"] += 1
+            return dict(await asyncio.shield(future))
+
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+        future.add_done_callback(_retrieve)
+        self._inflight[key] = future
+        self._pending.append((key, future))
+        if len(self._pending) >= self.max_batch:
+            self._flush_now()
+        elif self._flush_handle is None:
+            self._flush_handle = loop.call_later(self.window, self._flush_now)
+        return dict(await asyncio.shield(future))
+
+    def _flush_now(self):
+        if self._flush_handle is not None:
+            self._flush_handle.cancel()
+            self._flush_handle = None
+        batch, self._pending = self._pending, []
+        if batch:
+            task = asyncio.get_running_loop().create_task(self._run_batch(batch))
+            self._tasks.add(task)
+            task.add_done_callback(self._tasks.discard)
+
+    def _fail(self, batch, error=None):
+        """Raise ``error`` to every job of ``batch`` (cancel them when there is none)."""
+        self.counts["failed"] += len(batch)
+        for key, future in batch:
+            self._inflight.pop(key, None)
+            if future.done():
+                continue
+            if error is None:
+                future.cancel()
+            else:
+                future.set_exception(error)
+
+    async def _run_batch(self, batch):
+        self.counts["llm_calls"] += 1
+        prompt = build_batch_prompt([key for key, _ in batch])
+
+        async def call(tier):
+            # Imported with the first model call, off the cold-start path
+            from .usage_handler import PrefixCacheUsageHandler
+
+            llm_config = {"callbacks": [PrefixCacheUsageHandler("extraction", tier.model, tier.name)]}
+
+            async def invoke():
+                response = await tier.chat_model(0).ainvoke(prompt, config=llm_config)
+                # None (escalated) when the reply holds no JSON object
+                return decode_object(response.content)[0]
+
+            async with llm_scheduler.slot("extraction"):
+                return await guard_for(tier.name).call(invoke)
+
+        try:
+            results = await routed_call(
+                "extraction", Config.EXTRACTION_TIER, call, lambda results: None if results is not None else "parse_failure"
+            )
+        except asyncio.CancelledError:
+            self._fail(batch)
+            raise
+        except Exception as e:
+            self._fail(batch, e)
+            return
+
+        for number, (key, future) in enumerate(batch, 1):
+            data = _job_result(results, number, key[1])
+            if data is None:
+                # Not answered: nothing found this time, but asked again next time
+                self.counts["failed"] += 1
+                data = {}
+            else:
+                self.remember(key, data)
+            self._inflight.pop(key, None)
+            if not future.done():
+                future.set_result(data)
+
+    def extract_sync(self, user_input, field_names, instructions=""):
+        """
+        ``extract`` for callers outside the event loop: one blocking call on
+        the tier's pooled client, sharing the memo but not the batches.
+        """
+        key = (user_input, tuple(sorted(field_names)), instructions)
+        memoized = self.lookup(key)
+        if memoized is not None:
+            return memoized
+        self.counts["llm_calls"] += 1
+        response = resolve_tier(Config.EXTRACTION_TIER).chat_model(0).invoke(build_batch_prompt([key]))
+        data = _job_result(decode_object(response.content)[0], 1, key[1])
+        if data is None:
+            return {}
+        self.remember(key, data)
+        return dict(data)
+
+    def stats(self):
+        with self._lock:
+            return {**self.counts, "memo_entries": len(self._memo)}
+
+
+extraction_batcher = ExtractionBatcher(
+    window=Config.EXTRACTION_BATCH_WINDOW_MS / 1000.0,
+    max_batch=Config.EXTRACTION_BATCH_MAX,
+    memo_entries=Config.EXTRACTION_MEMO_ENTRIES,
+)
+
+
+def _split_by_rules(user_input, field_names):
+    """``(rule_results, remaining_fields)``: fixed-shape fields (phones, times, dates, yes/no) don't need the model."""
+    result = {}
+    remaining = []
+    for field_name in field_names:
+        value = extract_field(field_name, user_input)
+        if value is not None:
+            result[field_name] = value
+        else:
+            remaining.append(field_name)
+    return result, remaining
+
+
+async def extract_context_fields(user_input, field_names, instructions=""):
+    """
+    Return ``{field: value}`` for every field of ``field_names`` found in
+    ``user_input``. Raises ``LLMUnavailable`` or ``LLMOverloaded`` when the
+    model is needed and cannot answer.
+    """
+    result, remaining = _split_by_rules(user_input, field_names)
+    if remaining and user_input:
+        result.update(await extraction_batcher.extract(user_input, remaining, instructions))
+    return result
+
 
 def extract_context_field(user_input, field_name, optionalMessage=""):
-    llm = ChatOpenAI(model="gpt-4o", temperature=0)
-    prompt = (
-        f"Extract the '{field_name}' from this message: '{user_input}'. {optionalMessage}"
-        f"If present, return as JSON: {{\"{field_name}\": value}}. Only JSON as. "
-        f"If not present, return an empty JSON object."
-    )
-    response = llm.invoke(prompt)
-    content = response.content.strip()
-    # Strip first and last line to remove any extra text
-    lines = content.split('\n')
-    if len(lines) > 2:
-        content = '\n'.join(lines[1:-1]).strip()
-    try:
-        data = json.loads(content)
-        if isinstance(data, dict):
-            return data
-    except Exception:
-        pass
-    return {} 
\ No newline at end of file
+    """
+    ``{field_name: value}`` if the field is in ``user_input``, else ``{}``.
+    Blocking, for callers outside the event loop; async code should await
+    ``extract_context_fields``.
+    """
+    result, remaining = _split_by_rules(user_input, [field_name])
+    if remaining and user_input:
+        result.update(extraction_batcher.extract_sync(user_input, remaining, optionalMessage))
+    return result
@@ -0,0 +1,81 @@
+#!/usr/bin/env python3
+"""
+Concurrency benchmark for the async /chat path.
+
+Runs the FastAPI app in-process against a fake LLM with a fixed latency and
+fires N concurrent conversations at each concurrency level. Each conversation
+is first taken past the templated greeting, so the measured turn is a model
+turn. With a fully async request path the wall time per level should stay
+close to one LLM latency instead of growing with N / thread-pool size.
+
+Usage (from backend/):
+    python benchmarks/bench_concurrency.py --latency 0.5 --levels 1 10 50 100 200 400
+"""
+
+import argparse
+import asyncio
+import os
+import statistics
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ.setdefault("OPENAI_API_KEY", "sk-benchmark")
+# Every conversation sends the same message; measure the model path, not the cache
+os.environ.setdefault("RESPONSE_CACHE_MAX_ENTRIES", "0")
+
+import httpx
+
+from benchmarks.fake_llm import install_fake_llm
+
+
+async def run_level(client, concurrency):
+    session_ids = []
+    for _ in range(concurrency):
+        response = await client.post("/start-session", json={"scenario_id": "no_schedule", "speculate": False})
+        session_id = response.json()["session_id"]
+        # The greeting is a template; the measured turn (get_client_name) calls the model
+        response = await client.post("/chat", json={"session_id": session_id, "message": "Hi, I just clocked in"})
+        response.raise_for_status()
+        session_ids.append(session_id)
+
+    async def one_turn(session_id):
+        started = time.perf_counter()
+        response = await client.post("/chat", json={"session_id": session_id, "message": "I'm with John Smith today"})
+        response.raise_for_status()
+        return time.perf_counter() - started
+
+    started = time.perf_counter()
+    latencies = await asyncio.gather(*(one_turn(sid) for sid in session_ids))
+    wall = time.perf_counter() - started
+    latencies = sorted(latencies)
+    return {
+        "concurrency": concurrency,
+        "wall_s": wall,
+        "turns_per_s": concurrency / wall,
+        "p50_s": statistics.median(latencies),
+        "p95_s": latencies[max(0, int(len(latencies) * 0.95) - 1)],
+    }
+
+
+async def main(args):
+    install_fake_llm(latency=args.latency)
+    from main import app
+
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench", timeout=None) as client:
+        print(f"fake LLM latency: {args.latency:.3f}s")
+        print(f"{'concurrency':>12} {'wall (s)':>10} {'turns/s':>10} {'p50 (s)':>10} {'p95 (s)':>10}")
+        for level in args.levels:
+            row = await run_level(client, level)
+            print(
+                f"{row['concurrency']:>12} {row['wall_s']:>10.3f} {row['turns_per_s']:>10.1f} "
+                f"{row['p50_s']:>10.3f} {row['p95_s']:>10.3f}"
+            )
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--latency", type=float, default=0.5, help="fake LLM latency in seconds")
+    parser.add_argument("--levels", type=int, nargs="+", default=[1, 10, 50, 100, 200, 400])
+    asyncio.run(main(parser.parse_args()))
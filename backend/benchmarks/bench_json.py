@@ -0,0 +1,141 @@
+#!/usr/bin/env python3
+"""
+JSON microbenchmarks: the standard library (previous behavior) against
+``json_codec`` and ``ORJSONResponse``.
+
+Covers the JSON work done on every turn: rendering the /chat response body,
+dumping the context into the prompt, decoding the ---EXTRACTED--- block
+(clean, fenced and with trailing text) and a structured reply cut off in its
+fields object, and the session round-trip of the shared session backends.
+
+Usage (from backend/):
+    python benchmarks/bench_json.py --number 20000
+"""
+
+import argparse
+import json
+import os
+import sys
+import timeit
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ.setdefault("OPENAI_API_KEY", "sk-benchmark")
+
+from fastapi.responses import JSONResponse, ORJSONResponse
+from langchain_core.messages import AIMessage, HumanMessage
+
+import json_codec
+from session_store import serialize_session
+
+CONTEXT = {
+    "caregiver_name": "Maria Lopez",
+    "client_name": "John Smith",
+    "system_regular_schedule": "Monday, Wednesday, Friday 9:00 AM-5:00 PM",
+    "regular_schedule": "Monday, Wednesday, Friday 9:00 AM-5:00 PM",
+    "is_regular_schedule": True,
+    "today_date": "2025-07-02",
+    "today_shift": "9:00 AM-5:00 PM",
+    "remove_day": "Friday",
+    "client_on_phone": True,
+    "client_name_confirmed": True,
+    "substep": "confirm_client_name",
+}
+CHAT_RESPONSE = {
+    "message": "Thank you, Maria. Could you please put John on the phone so he can confirm his name?\n",
+    "session_id": "session_0123456789abcdef0123456789abcdef",
+    "is_complete": False,
+    "extracted_data": None,
+    "context_data": CONTEXT,
+}
+EXTRACTED = json.dumps({"client_on_phone": True, "substep": "confirm_client_name"})
+TAILS = {
+    "clean": "\n" + EXTRACTED,
+    "fenced": "\n```json\n" + EXTRACTED + "\n```",
+    "trailing": "\n" + EXTRACTED + "\nLet me know if anything else changes.",
+}
+# A structured reply that ran out of tokens in its fields object
+STRUCTURED = json.dumps({
+    "reply": "Thank you. Could you put the client on the phone?",
+    "substep": "confirm_client_name",
+    "fields": {"client_on_phone": True, "client_name": "John Smith", "actual_start_time": None},
+})
+TRUNCATED = STRUCTURED[:STRUCTURED.index('"actual_start_time"') + 12]
+SESSION = {
+    "scenario_id": "no_schedule",
+    "context_data": CONTEXT,
+    "messages": [
+        message
+        for turn in range(6)
+        for message in (HumanMessage(content=f"Caregiver message {turn}"), AIMessage(content=f"Rosella reply {turn} " * 8))
+    ],
+    "summary": "",
+    "summarized_upto": 0,
+}
+
+
+def stdlib_decode(tail):
+    """The previous ---EXTRACTED--- decode: one json.loads, anything else is lost."""
+    try:
+        data = json.loads(tail.strip())
+    except Exception:
+        return {}
+    return data if isinstance(data, dict) else {}
+
+
+def stdlib_serialize(session):
+    data = {
+        "scenario_id": session.get("scenario_id"),
+        "context_data": session.get("context_data") or {},
+        "messages": [[message.type, message.content] for message in session.get("messages", ())],
+        "summary": session.get("summary", ""),
+        "summarized_upto": session.get("summarized_upto", 0),
+    }
+    return json.dumps(data, separators=(",", ":"), default=str).encode("utf-8")
+
+
+def measure(number, func):
+    best = min(timeit.repeat(func, number=number, repeat=3))
+    return best / number * 1e6
+
+
+def main(args):
+    backend = "orjson" if json_codec.orjson is not None else "stdlib fallback (orjson not installed)"
+    print(f"json_codec backend: {backend}, {args.number} iterations, best of 3\n")
+    print(f"{'':<34} {'stdlib us':>10} {'new us':>10} {'speedup':>8}")
+
+    serialized = serialize_session(SESSION)
+    cases = [
+        ("/chat response body", lambda: JSONResponse(CHAT_RESPONSE).body, lambda: ORJSONResponse(CHAT_RESPONSE).body),
+        (
+            "prompt context dump",
+            lambda: json.dumps(CONTEXT, sort_keys=True, separators=(",", ":"), default=str),
+            lambda: json_codec.canonical_json(CONTEXT),
+        ),
+        ("session serialize", lambda: stdlib_serialize(SESSION), lambda: serialize_session(SESSION)),
+        ("session decode", lambda: json.loads(serialized), lambda: json_codec.loads(serialized)),
+    ]
+    cases += [
+        (f"extracted decode ({name})", lambda tail=tail: stdlib_decode(tail), lambda tail=tail: json_codec.decode_object(tail))
+        for name, tail in TAILS.items()
+    ]
+    cases.append((
+        "structured decode (truncated)",
+        lambda: stdlib_decode(TRUNCATED),
+        lambda: json_codec.decode_model_object(TRUNCATED, partial=True),
+    ))
+    for name, before, after in cases:
+        old, new = measure(args.number, before), measure(args.number, after)
+        print(f"{name:<34} {old:>10.2f} {new:>10.2f} {old / new:>7.1f}x")
+
+    print("\nFields recovered from the extracted block:")
+    for name, tail in TAILS.items():
+        print(f"  {name:<10} stdlib {len(stdlib_decode(tail))}, new {len(json_codec.parse_json_object(tail))}")
+    recovered, _ = json_codec.decode_model_object(TRUNCATED, partial=True)
+    print(f"  {'truncated':<10} stdlib {len(stdlib_decode(TRUNCATED))}, new {len(recovered)} "
+          f"(fields {len(recovered.get('fields', {}))})")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--number", type=int, default=20000, help="iterations per measurement")
+    main(parser.parse_args())
@@ -0,0 +1,352 @@
+#!/usr/bin/env python3
+"""
+End-to-end load test against the local OpenAI stand-in.
+
+Starts ``llm_standin.py`` on a free port, points the backend at it through
+``OPENAI_BASE_URL`` and runs the FastAPI app in-process. Multi-turn
+conversations for every scenario listed by ``/scenarios`` are then driven at
+a fixed concurrency. Reports requests per second and p50/p95/p99 latency per
+endpoint and per graph node, and can save the results as JSON and compare
+them with an earlier run. With the stand-in's fault injection (``--error-rate``,
+``--hang-rate``, ``--slow-rate``) it also reports how turns were answered
+(model, fallback script, shed) and what the deadlines, hedges and circuit
+breaker did. Calls, escalations, latency and cost per model route are always
+reported; ``--model-latency`` and ``--garble-rate`` exercise the routing.
+How model replies were decoded (clean, salvaged, partial, failed) is reported
+for the ``REPLY_FORMAT`` in use; ``--garble-rate`` exercises the recovery.
+``--opening`` starts conversations the way the frontend does (context at
+/start-session, then the opening message), so the speculative greeting can
+serve the first turn; compare with ``SPECULATIVE_GREETING=True``.
+``--think-time`` is the client's pause before its first message.
+
+Usage (from backend/):
+    python benchmarks/bench_load.py --latency lognormal:0.4,0.35 --concurrency 50 \\
+        --conversations 350 --turns 6 --out results/after.json --compare results/before.json
+"""
+
+import argparse
+import asyncio
+import datetime
+import json
+import os
+import random
+import subprocess
+import sys
+import time
+from collections import defaultdict
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ.setdefault("OPENAI_API_KEY", "sk-benchmark")
+
+import httpx
+from langchain_core.callbacks import AsyncCallbackHandler
+
+from benchmarks.llm_standin import FaultModel, LatencyModel, parse_model_latency, start_in_thread
+
+# Seed context for the first turn of each conversation (only the fields the scenario lists)
+SAMPLE_CONTEXT = {
+    "caregiver_name": "Maria Lopez",
+    "client_name": "John Smith",
+    "system_regular_schedule": "Monday, Wednesday, Friday 9:00 AM-5:00 PM",
+    "today_date": "2025-07-02",
+    "today_shift": "9:00 AM-5:00 PM",
+    "scheduled_start_time": "9:00 AM",
+    "office_state": "New York",
+    "unregistered_phone": "555-201-3344",
+}
+
+# Caregiver messages per scenario, sent in order (cycled if there are more turns)
+SCRIPTS = {
+    "general_chat": ["Hi there", "I have a question about my schedule", "When is my next shift?", "Thanks, that's all"],
+    "no_schedule": ["Hi", "I'm with John Smith today", "Yes, this is my regular schedule", "Monday, Wednesday and Friday 9am-5pm", "Remove Friday", "Yes, he is here"],
+    "out_of_window": ["Hello", "There was a lot of traffic", "I got there at 9:20am", "Yes, she's here", "Yes, I confirm", "I can stay until 5:20pm"],
+    "gps_out_of_range": ["Hi", "I clocked in from the pharmacy", "I was picking up his prescription", "No, I can't go back right now", "Yes", "Yes, the client is on the phone"],
+    "wrong_phone": ["Hello", "The client won't let me use the house phone", "No, the app doesn't work", "Yes, that's okay"],
+    "phone_not_found": ["Hi", "It's the client's phone", "Yes, she can confirm", "Yes, she is here", "Yes, we will use this number going forward"],
+    "duplicate_call": ["Hi", "Why was my call rejected?", "Okay, thanks"],
+}
+
+
+def percentile(sorted_values, p):
+    """Nearest-rank percentile of an already sorted list."""
+    if not sorted_values:
+        return 0.0
+    rank = max(1, int(round(p / 100.0 * len(sorted_values) + 0.5)))
+    return sorted_values[min(rank, len(sorted_values)) - 1]
+
+
+def summarize(samples):
+    values = sorted(samples)
+    return {
+        "count": len(values),
+        "mean_ms": 1000 * sum(values) / len(values) if values else 0.0,
+        "p50_ms": 1000 * percentile(values, 50),
+        "p95_ms": 1000 * percentile(values, 95),
+        "p99_ms": 1000 * percentile(values, 99),
+    }
+
+
+class NodeTimer(AsyncCallbackHandler):
+    """Wall time of every graph node (runs tagged ``graph:step:N`` that are not internal)."""
+
+    def __init__(self, samples):
+        self.samples = samples
+        self._started = {}
+
+    async def on_chain_start(self, serialized, inputs, *, run_id, parent_run_id=None, tags=None, metadata=None, **kwargs):
+        tags = tags or ()
+        if any(tag.startswith("graph:step:") for tag in tags) and "langsmith:hidden" not in tags:
+            self._started[run_id] = (kwargs.get("name"), time.perf_counter())
+
+    async def on_chain_end(self, outputs, *, run_id, parent_run_id=None, **kwargs):
+        started = self._started.pop(run_id, None)
+        if started is not None:
+            self.samples[started[0]].append(time.perf_counter() - started[1])
+
+    async def on_chain_error(self, error, *, run_id, parent_run_id=None, **kwargs):
+        self._started.pop(run_id, None)
+
+
+class TimedGraph:
+    """Wraps the app's graph so every invocation reports node timings."""
+
+    def __init__(self, graph, samples):
+        self.graph = graph
+        self.samples = samples
+
+    def _config(self, config):
+        config = dict(config or {})
+        config["callbacks"] = list(config.get("callbacks") or []) + [NodeTimer(self.samples)]
+        return config
+
+    async def ainvoke(self, state, config=None, **kwargs):
+        return await self.graph.ainvoke(state, self._config(config), **kwargs)
+
+
+async def run_conversation(client, scenario, turns, stream, endpoint_samples, errors, opening=False, think_time=0.0):
+    async def timed(endpoint, **kwargs):
+        started = time.perf_counter()
+        try:
+            response = await client.post(endpoint, **kwargs)
+            if stream and endpoint == "/chat/stream":
+                await response.aread()
+            response.raise_for_status()
+        except Exception as e:
+            errors[endpoint] += 1
+            raise e
+        endpoint_samples[endpoint].append(time.perf_counter() - started)
+        return response
+
+    context = {k: v for k, v in SAMPLE_CONTEXT.items() if k in scenario.get("context_fields", ())}
+    start = {"scenario_id": scenario["id"]}
+    script = SCRIPTS.get(scenario["id"], SCRIPTS["general_chat"])
+    if opening:
+        # Imported after main() pointed the backend at the stand-in
+        from config import Config
+
+        start["context_data"] = context
+        script = [Config.SPECULATIVE_OPENING_MESSAGE] + script[1:]
+    response = await timed("/start-session", json=start)
+    session_id = response.json()["session_id"]
+    if think_time:
+        await asyncio.sleep(think_time)
+    endpoint = "/chat/stream" if stream else "/chat"
+    for turn in range(turns):
+        body = {"session_id": session_id, "message": script[turn % len(script)]}
+        if turn == 0 and not opening:
+            body["context_data"] = context
+        await timed(endpoint, json=body)
+
+
+def _git_commit():
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except Exception:
+        return None
+
+
+def print_table(title, rows):
+    print(f"\n{title}")
+    print(f"{'':<28} {'count':>7} {'mean':>9} {'p50':>9} {'p95':>9} {'p99':>9}   (ms)")
+    for name, row in rows.items():
+        print(
+            f"{name:<28} {row['count']:>7} {row['mean_ms']:>9.1f} {row['p50_ms']:>9.1f} "
+            f"{row['p95_ms']:>9.1f} {row['p99_ms']:>9.1f}"
+        )
+
+
+def print_comparison(current, baseline):
+    print(f"\nCompared with {baseline.get('commit') or 'baseline'} ({baseline.get('timestamp')}):")
+    print(f"{'':<28} {'p50':>16} {'p95':>16} {'p99':>16}   (ms, before -> after)")
+    for section in ("endpoints", "nodes"):
+        for name, row in current[section].items():
+            before = baseline.get(section, {}).get(name)
+            if before is None:
+                continue
+            cells = " ".join(f"{before[k]:>7.1f}->{row[k]:<7.1f}" for k in ("p50_ms", "p95_ms", "p99_ms"))
+            print(f"{name:<28} {cells}")
+    print(f"{'rps':<28} {baseline['rps']:.1f} -> {current['rps']:.1f}")
+
+
+def _reply_decoding():
+    from agents.streaming import reply_decode_stats
+
+    totals = defaultdict(int)
+    for counts in reply_decode_stats.snapshot().values():
+        for outcome in ("turns", "clean", "salvaged", "partial", "failed", "turns_saved"):
+            totals[outcome] += counts[outcome]
+    totals["failure_rate"] = totals["failed"] / totals["turns"] if totals["turns"] else 0.0
+    return dict(totals)
+
+
+def _turn_sources():
+    from agents.scenario_engine import turn_stats
+
+    totals = defaultdict(int)
+    for counts in turn_stats.snapshot().values():
+        for source, count in counts.items():
+            totals[source] += count
+    return dict(totals)
+
+
+async def main(args):
+    latency = LatencyModel.parse(args.latency, args.seed)
+    faults = FaultModel(
+        args.error_rate, args.hang_rate, args.slow_rate, args.slow_factor, args.garble_rate, args.garble_models, args.seed,
+    )
+    base_url, standin, server = start_in_thread(
+        latency, ttft_fraction=args.ttft_fraction, faults=faults,
+        model_latency=parse_model_latency(args.model_latency, args.seed),
+    )
+    os.environ["OPENAI_BASE_URL"] = base_url
+    if not args.response_cache:
+        os.environ["RESPONSE_CACHE_MAX_ENTRIES"] = "0"
+
+    import main as app_module
+
+    node_samples = defaultdict(list)
+    app_module.chat_graph = TimedGraph(await app_module.get_chat_graph(), node_samples)
+    endpoint_samples = defaultdict(list)
+    errors = defaultdict(int)
+
+    transport = httpx.ASGITransport(app=app_module.app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench", timeout=None) as client:
+        scenarios = (await client.get("/scenarios")).json()
+        if args.scenarios:
+            scenarios = [s for s in scenarios if s["id"] in args.scenarios]
+        rng = random.Random(args.seed)
+        plan = [scenarios[i % len(scenarios)] for i in range(args.conversations)]
+        rng.shuffle(plan)
+
+        semaphore = asyncio.Semaphore(args.concurrency)
+
+        async def worker(scenario):
+            async with semaphore:
+                try:
+                    await run_conversation(
+                        client, scenario, args.turns, args.stream, endpoint_samples, errors, args.opening, args.think_time
+                    )
+                except Exception:
+                    pass
+
+        started = time.perf_counter()
+        await asyncio.gather(*(worker(scenario) for scenario in plan))
+        wall = time.perf_counter() - started
+
+    server.should_exit = True
+    requests = sum(len(samples) for samples in endpoint_samples.values())
+    results = {
+        "timestamp": datetime.datetime.now().isoformat(timespec="seconds"),
+        "commit": _git_commit(),
+        "config": {
+            "latency": str(latency),
+            "faults": str(faults),
+            "model_latency": args.model_latency,
+            "ttft_fraction": args.ttft_fraction,
+            "concurrency": args.concurrency,
+            "conversations": args.conversations,
+            "turns": args.turns,
+            "stream": args.stream,
+            "opening": args.opening,
+            "think_time": args.think_time,
+            "response_cache": args.response_cache,
+            "scenarios": [s["id"] for s in scenarios],
+        },
+        "wall_s": wall,
+        "requests": requests,
+        "rps": requests / wall if wall else 0.0,
+        "errors": dict(errors),
+        "llm_requests": standin.state.stats["requests"],
+        "llm_requests_per_model": standin.state.stats["models"],
+        "injected": {name: standin.state.stats[name] for name in ("errors", "hangs", "slowed", "garbled")},
+        "routes": app_module.route_stats.snapshot(),
+        "speculative_turns": app_module.speculative_turns.stats(),
+        "turn_sources": _turn_sources(),
+        "reply_decoding": _reply_decoding(),
+        "llm_guard": app_module.guard_stats(),
+        "endpoints": {name: summarize(samples) for name, samples in sorted(endpoint_samples.items())},
+        "nodes": {name: summarize(samples) for name, samples in sorted(node_samples.items())},
+    }
+
+    print(f"stand-in latency {latency}, concurrency {args.concurrency}, "
+          f"{args.conversations} conversations x {args.turns} turns")
+    print(f"{requests} requests in {wall:.2f}s = {results['rps']:.1f} req/s, "
+          f"{results['llm_requests']} LLM calls, errors: {results['errors'] or 'none'}")
+    if any(results["injected"].values()):
+        print(f"injected faults: {results['injected']}; turns by source: {results['turn_sources']}")
+        for tier, guard in results["llm_guard"].items():
+            print(f"{tier} tier: hedges {guard['hedges']}, retries {guard['retries']}, "
+                  f"won by second request {guard['hedge_wins']}, timeouts {guard['timeouts']}, "
+                  f"errors {guard['errors']}, rejected by open breaker {guard['rejected']}, "
+                  f"breaker opened {guard['breaker']['opened']}x")
+    decoding = results["reply_decoding"]
+    print(f"model replies ({app_module.Config.REPLY_FORMAT}): {decoding['turns']} decoded, {decoding['clean']} clean, "
+          f"{decoding['salvaged']} salvaged, {decoding['partial']} partial, {decoding['failed']} failed "
+          f"({decoding['failure_rate']:.1%}), turns saved {decoding['turns_saved']}")
+    print(f"\n{'Per model route':<28} {'calls':>8} {'escalated':>10} {'avg ms':>9} {'cost $':>10}")
+    for scenario_id, tiers in results["routes"].items():
+        for tier, route in tiers.items():
+            print(f"{scenario_id + ' / ' + tier:<28} {route['calls']:>8} {route['escalated']:>10} "
+                  f"{route['avg_latency_s'] * 1000:>9.1f} {route['cost_usd']:>10.4f}")
+    speculation = results["speculative_turns"]
+    print(f"\nspeculative greetings: {speculation['started']} started, {speculation['ready']} served ready, "
+          f"{speculation['inflight']} served in flight, {speculation['mismatch']} discarded, {speculation['failed']} failed")
+    print_table("Per endpoint", results["endpoints"])
+    print_table("Per graph node", results["nodes"])
+
+    if args.out:
+        os.makedirs(os.path.dirname(os.path.abspath(args.out)), exist_ok=True)
+        with open(args.out, "w") as f:
+            json.dump(results, f, indent=2)
+        print(f"\nSaved {args.out}")
+    if args.compare:
+        with open(args.compare) as f:
+            print_comparison(results, json.load(f))
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--latency", default="lognormal:0.4,0.35", help="stand-in latency spec (see llm_standin.py)")
+    parser.add_argument("--ttft-fraction", type=float, default=0.3)
+    parser.add_argument("--concurrency", type=int, default=50, help="conversations in flight at once")
+    parser.add_argument("--conversations", type=int, default=140)
+    parser.add_argument("--turns", type=int, default=6, help="/chat turns per conversation")
+    parser.add_argument("--scenarios", nargs="*", help="only these scenario ids (default: all from /scenarios)")
+    parser.add_argument("--stream", action="store_true", help="use /chat/stream instead of /chat")
+    parser.add_argument("--response-cache", action="store_true", help="leave the response cache enabled")
+    parser.add_argument("--opening", action="store_true", help="open conversations like the frontend (see above)")
+    parser.add_argument("--think-time", type=float, default=0.0, help="seconds between /start-session and the first /chat")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="share of stand-in requests answered with HTTP 500")
+    parser.add_argument("--hang-rate", type=float, default=0.0, help="share of stand-in requests never answered")
+    parser.add_argument("--slow-rate", type=float, default=0.0, help="share of stand-in requests slowed by --slow-factor")
+    parser.add_argument("--slow-factor", type=float, default=10.0)
+    parser.add_argument("--garble-rate", type=float, default=0.0, help="share of stand-in replies without the extracted block")
+    parser.add_argument("--garble-models", nargs="*", default=(), help="only garble these models")
+    parser.add_argument("--model-latency", action="append", default=[], metavar="MODEL=SPEC",
+                        help="latency spec of one model, e.g. gpt-4o-mini=fixed:0.1")
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--out", help="write the results to this JSON file")
+    parser.add_argument("--compare", help="earlier results JSON to compare against")
+    asyncio.run(main(parser.parse_args()))
@@ -0,0 +1,73 @@
+#!/usr/bin/env python3
+"""
+Per-turn cost of a long conversation.
+
+Drives one session through N /chat turns against a zero-latency fake LLM and
+reports the average server time per turn in windows of turns, plus the size of
+the graph's message state on the last turn. Each turn only adds its own
+messages, so the time per turn should stay flat from turn 1 to turn N.
+
+Usage (from backend/):
+    python benchmarks/bench_long_conversation.py --turns 200 --window 20
+"""
+
+import argparse
+import asyncio
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ.setdefault("OPENAI_API_KEY", "sk-benchmark")
+# The same message is sent every turn; measure the model path, not the cache
+os.environ.setdefault("RESPONSE_CACHE_MAX_ENTRIES", "0")
+
+import httpx
+
+from benchmarks.fake_llm import install_fake_llm
+
+
+async def main(args):
+    install_fake_llm(latency=0.0)
+    import main as app_module
+
+    # Record how many messages the graph returns on each turn
+    state_sizes = []
+    graph = await app_module.get_chat_graph()
+
+    class MeasuringGraph:
+        async def ainvoke(self, *a, **kw):
+            result = await graph.ainvoke(*a, **kw)
+            state_sizes.append(len(result.get("messages", ())))
+            return result
+
+    app_module.chat_graph = MeasuringGraph()
+    app = app_module.app
+
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench", timeout=None) as client:
+        response = await client.post("/start-session", json={"scenario_id": args.scenario})
+        session_id = response.json()["session_id"]
+
+        timings = []
+        for turn in range(args.turns):
+            started = time.perf_counter()
+            response = await client.post("/chat", json={"session_id": session_id, "message": f"Turn {turn}: my client is Jane"})
+            response.raise_for_status()
+            timings.append(time.perf_counter() - started)
+
+    print(f"scenario: {args.scenario}, turns: {args.turns}")
+    print(f"{'turns':>12} {'ms/turn':>10}")
+    for start in range(0, args.turns, args.window):
+        chunk = timings[start:start + args.window]
+        print(f"{f'{start + 1}-{start + len(chunk)}':>12} {1000 * sum(chunk) / len(chunk):>10.2f}")
+    if state_sizes:
+        print(f"graph state messages on the last turn: {state_sizes[-1]}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--turns", type=int, default=200)
+    parser.add_argument("--window", type=int, default=20, help="turns per reported row")
+    parser.add_argument("--scenario", default="no_schedule")
+    asyncio.run(main(parser.parse_args()))
@@ -0,0 +1,123 @@
+#!/usr/bin/env python3
+"""
+Cold-start profile.
+
+For the eager and background STARTUP_MODEs, in fresh interpreters:
+- ``import main`` time (from ``python -X importtime``), with the packages
+  that cost the most self time
+- time until a real uvicorn server answers /health, and until the chat graph
+  is loaded and a turn can run (``graph_ready`` in /health)
+
+Usage (from backend/):
+    python benchmarks/bench_startup.py --repeat 5 --modes eager background
+"""
+
+import argparse
+import os
+import socket
+import statistics
+import subprocess
+import sys
+import time
+from collections import defaultdict
+
+import httpx
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def _env(mode):
+    env = dict(os.environ)
+    env.setdefault("OPENAI_API_KEY", "sk-benchmark")
+    env["STARTUP_MODE"] = mode
+    env["SESSION_BACKEND"] = "memory"
+    return env
+
+
+def profile_import(mode):
+    """``(import main seconds, {top-level package: self seconds})`` in a fresh interpreter."""
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", "import main"],
+        cwd=BACKEND_DIR, env=_env(mode), capture_output=True, text=True, check=True,
+    )
+    total = 0.0
+    packages = defaultdict(float)
+    for line in result.stderr.splitlines():
+        if not line.startswith("import time:") or "self [us]" in line:
+            continue
+        self_us, cumulative_us, name = line[len("import time:"):].split("|")
+        name = name.strip()
+        packages[name.split(".")[0]] += int(self_us) / 1e6
+        if name == "main":
+            total = int(cumulative_us) / 1e6
+    return total, packages
+
+
+def _free_port():
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def serve_until_ready(mode, timeout=60.0):
+    """``(seconds until /health answers, seconds until the graph is ready)`` for a fresh server."""
+    port = _free_port()
+    started = time.perf_counter()
+    process = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "main:app", "--host", "127.0.0.1", "--port", str(port), "--log-level", "warning"],
+        cwd=BACKEND_DIR, env=_env(mode), stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL,
+    )
+    up = ready = None
+    try:
+        with httpx.Client(base_url=f"http://127.0.0.1:{port}", timeout=1.0) as client:
+            while ready is None and time.perf_counter() - started < timeout:
+                try:
+                    health = client.get("/health").json()
+                except httpx.HTTPError:
+                    time.sleep(0.005)
+                    continue
+                now = time.perf_counter() - started
+                up = up if up is not None else now
+                if health["startup"]["graph_ready"]:
+                    ready = now
+                else:
+                    time.sleep(0.005)
+    finally:
+        process.terminate()
+        process.wait()
+    return up, ready
+
+
+def main(args):
+    print(f"{args.repeat} fresh processes per mode, medians\n")
+    print(f"{'mode':<12} {'import main':>12} {'/health up':>12} {'graph ready':>12}   (s)")
+    profiles = {}
+    for mode in args.modes:
+        imports, ups, readies = [], [], []
+        packages = defaultdict(list)
+        for _ in range(args.repeat):
+            total, per_package = profile_import(mode)
+            imports.append(total)
+            for name, seconds in per_package.items():
+                packages[name].append(seconds)
+            up, ready = serve_until_ready(mode)
+            ups.append(up if up is not None else float("nan"))
+            readies.append(ready if ready is not None else float("nan"))
+        profiles[mode] = {name: statistics.median(values) for name, values in packages.items()}
+        print(
+            f"{mode:<12} {statistics.median(imports):>12.3f} {statistics.median(ups):>12.3f} "
+            f"{statistics.median(readies):>12.3f}"
+        )
+
+    for mode, packages in profiles.items():
+        print(f"\nSlowest packages imported by `import main` ({mode}, self time):")
+        for name, seconds in sorted(packages.items(), key=lambda item: -item[1])[:args.top]:
+            print(f"  {name:<28} {seconds * 1000:>8.1f} ms")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--modes", nargs="*", default=["eager", "background"], choices=["eager", "background"])
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--top", type=int, default=10, help="packages to list per mode")
+    main(parser.parse_args())
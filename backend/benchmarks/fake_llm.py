@@ -0,0 +1,62 @@
+# backend/benchmarks/fake_llm.py
+"""
+In-process stand-in for ChatOpenAI used by the benchmarks.
+
+Replies follow the scenario node protocol (reply text, the ---EXTRACTED---
+delimiter, then a JSON object, or with a ``response_format`` one JSON object
+with the reply) after sleeping for a configurable latency, so
+the graph and the FastAPI app can be exercised without calling OpenAI.
+"""
+
+import asyncio
+import json
+import time
+from typing import Any, AsyncIterator, List, Optional
+
+from langchain_core.language_models.chat_models import BaseChatModel
+from langchain_core.messages import AIMessage, AIMessageChunk, BaseMessage
+from langchain_core.outputs import ChatGeneration, ChatGenerationChunk, ChatResult
+
+
+class FakeChatModel(BaseChatModel):
+    latency: float = 0.5
+    reply: str = "Thank you, could you tell me the client's name?"
+    extracted: dict = {"substep": "get_client_name"}
+    calls: int = 0
+
+    @property
+    def _llm_type(self) -> str:
+        return "fake-chat"
+
+    def _content(self, response_format: Optional[dict] = None) -> str:
+        self.calls += 1
+        if response_format is not None:
+            fields = {name: value for name, value in self.extracted.items() if name != "substep"}
+            return json.dumps({"reply": self.reply, "substep": self.extracted.get("substep"), "fields": fields})
+        return f"{self.reply}\n---EXTRACTED---\n{json.dumps(self.extracted)}"
+
+    def _result(self, response_format: Optional[dict] = None) -> ChatResult:
+        return ChatResult(generations=[ChatGeneration(message=AIMessage(content=self._content(response_format)))])
+
+    def _generate(self, messages: List[BaseMessage], stop: Optional[List[str]] = None, run_manager: Any = None, **kwargs: Any) -> ChatResult:
+        time.sleep(self.latency)
+        return self._result(kwargs.get("response_format"))
+
+    async def _agenerate(self, messages: List[BaseMessage], stop: Optional[List[str]] = None, run_manager: Any = None, **kwargs: Any) -> ChatResult:
+        await asyncio.sleep(self.latency)
+        return self._result(kwargs.get("response_format"))
+
+    async def _astream(self, messages: List[BaseMessage], stop: Optional[List[str]] = None, run_manager: Any = None, **kwargs: Any) -> AsyncIterator[ChatGenerationChunk]:
+        # Spread the latency over ~4-character chunks, like a token stream.
+        content = self._content(kwargs.get("response_format"))
+        pieces = [content[i:i + 4] for i in range(0, len(content), 4)]
+        for piece in pieces:
+            await asyncio.sleep(self.latency / len(pieces))
+            yield ChatGenerationChunk(message=AIMessageChunk(content=piece))
+
+
+def install_fake_llm(latency=0.5):
+    """Route every get_chat_model() lookup to a FakeChatModel with the given latency."""
+    from agents.llm_clients import set_chat_model_factory
+
+    set_chat_model_factory(lambda model, temperature: FakeChatModel(latency=latency))
@@ -0,0 +1,355 @@
+#!/usr/bin/env python3
+"""
+Local OpenAI-compatible stand-in for load tests.
+
+Serves ``POST /v1/chat/completions`` (plain and ``stream=true``) with scripted
+replies and a configurable latency distribution, so the backend can be driven
+end to end - real HTTP, the pooled OpenAI client, streaming - without calling
+OpenAI. Point the backend at it with ``OPENAI_BASE_URL=http://127.0.0.1:8900/v1``.
+
+Scenario prompts get a reply that follows the node protocol: a short answer,
+``---EXTRACTED---`` and a JSON object that fills the current step's fields and
+moves to the next workflow step - or, when the request has a ``json_schema``
+``response_format``, a JSON object with the reply, the next substep and every
+schema field. Streamed replies end with a usage chunk when the request asks
+for one (``stream_options.include_usage``). Batched extraction prompts get one object per job, and anything
+else (e.g. summaries) gets plain text.
+
+Latency specs:
+    fixed:0.5             always 0.5 s
+    uniform:0.2,0.8       uniform between 0.2 and 0.8 s
+    normal:0.5,0.1        mean 0.5 s, sd 0.1 s (clamped at 0)
+    lognormal:0.4,0.35    median 0.4 s, sigma 0.35 (long right tail)
+
+``--model-latency MODEL=SPEC`` gives one model its own latency, e.g. a faster
+small tier: ``--model-latency gpt-4o-mini=lognormal:0.15,0.3``.
+
+Fault injection (per request, for deadline, hedging, circuit breaker and
+routing tests): ``--error-rate`` answers HTTP 500, ``--hang-rate`` never
+answers (the client has to give up), ``--slow-rate`` multiplies the latency
+by ``--slow-factor`` and ``--garble-rate`` drops the ``---EXTRACTED---`` block
+(or cuts a structured reply off in its fields object, like a completion that
+ran out of tokens) of the models listed in ``--garble-models`` (all models if
+none). The rates
+live on ``app.state.faults`` and can be changed while the stand-in runs, e.g.
+to simulate an outage and its recovery.
+
+Usage (from backend/):
+    python benchmarks/llm_standin.py --port 8900 --latency lognormal:0.4,0.35 --error-rate 0.05
+"""
+
+import argparse
+import asyncio
+import json
+import math
+import random
+import re
+import threading
+import time
+import uuid
+
+from fastapi import FastAPI, Request
+from fastapi.responses import JSONResponse, StreamingResponse
+
+_CURRENT_STEP = re.compile(r"^Current workflow step: (\S+)$", re.MULTILINE)
+_WORKFLOW_STEP = re.compile(r"^- (\w+): .*\(extract: ([^)]*)\)$", re.MULTILINE)
+_PREFILLED = re.compile(r"^Already extracted from the latest message \(do not repeat\): (.*)$", re.MULTILINE)
+_BATCH_JOB = re.compile(r"^Job (\d+):\nMessage: .*\nFields: (.*)$", re.MULTILINE)
+
+# Placeholder values for scripted extractions
+_FIELD_VALUES = {
+    "client_name": "John Smith",
+    "regular_schedule": "Monday, Wednesday, Friday 9:00 AM-5:00 PM",
+    "remove_day": "Friday",
+    "actual_start_time": "9:20 AM",
+    "makeup_time": "5:20 PM",
+    "late_reason": "traffic",
+    "errand_reason": "picking up a prescription",
+    "clock_in_location": "the pharmacy",
+    "clock_out_location": "the pharmacy",
+    "gps_issue_type": "clock-in",
+    "phone_owner": "client",
+    "phone_response": "client allows house phone",
+    "general_chat_topic": "schedule",
+    "duplicate_call_reason": "pressed clock-in twice",
+    "client_confirmed_reason": "errand for the client",
+}
+
+
+class LatencyModel:
+    def __init__(self, kind, params, seed=None):
+        self.kind = kind
+        self.params = params
+        self._rng = random.Random(seed)
+
+    @classmethod
+    def parse(cls, spec, seed=None):
+        kind, _, params = spec.partition(":")
+        values = tuple(float(value) for value in params.split(",")) if params else ()
+        expected = {"fixed": 1, "uniform": 2, "normal": 2, "lognormal": 2}
+        if kind not in expected or len(values) != expected[kind]:
+            raise ValueError(f"Bad latency spec {spec!r} (see llm_standin.py for the format)")
+        return cls(kind, values, seed)
+
+    def sample(self):
+        if self.kind == "fixed":
+            return self.params[0]
+        if self.kind == "uniform":
+            return self._rng.uniform(*self.params)
+        if self.kind == "normal":
+            return max(0.0, self._rng.gauss(*self.params))
+        median, sigma = self.params
+        return self._rng.lognormvariate(math.log(median), sigma)
+
+    def __str__(self):
+        return f"{self.kind}:{','.join(str(value) for value in self.params)}"
+
+
+class FaultModel:
+    def __init__(
+        self, error_rate=0.0, hang_rate=0.0, slow_rate=0.0, slow_factor=10.0, garble_rate=0.0, garble_models=(), seed=None,
+    ):
+        self.error_rate = error_rate
+        self.hang_rate = hang_rate
+        self.slow_rate = slow_rate
+        self.slow_factor = slow_factor
+        self.garble_rate = garble_rate
+        self.garble_models = tuple(garble_models)
+        self._rng = random.Random(seed)
+
+    def draw(self, model=None):
+        """The fault of the next request to ``model``: "error", "hang", "slow", "garble" or None."""
+        garble_rate = self.garble_rate if not self.garble_models or model in self.garble_models else 0.0
+        roll = self._rng.random()
+        for fault, rate in (
+            ("error", self.error_rate), ("hang", self.hang_rate), ("slow", self.slow_rate), ("garble", garble_rate),
+        ):
+            if roll < rate:
+                return fault
+            roll -= rate
+        return None
+
+    def __str__(self):
+        garbled = f" of {', '.join(self.garble_models)}" if self.garble_models else ""
+        return (
+            f"error {self.error_rate}, hang {self.hang_rate}, slow {self.slow_rate} (x{self.slow_factor}), "
+            f"garble {self.garble_rate}{garbled}"
+        )
+
+
+def parse_model_latency(items, seed=None):
+    """``{model: LatencyModel}`` from ``MODEL=SPEC`` strings."""
+    result = {}
+    for item in items:
+        model, _, spec = item.partition("=")
+        if not model or not spec:
+            raise ValueError(f"Bad model latency {item!r}: expected MODEL=SPEC")
+        result[model] = LatencyModel.parse(spec, seed)
+    return result
+
+
+def _field_value(name):
+    if name in _FIELD_VALUES:
+        return _FIELD_VALUES[name]
+    if name.endswith(("_confirmed", "_on_phone", "_works", "_ok", "_attempted")) or name.startswith(("can_", "is_", "client_can")):
+        return True
+    return f"<{name}>"
+
+
+def scripted_reply(messages, response_format=None):
+    """The stand-in's completion for a chat request (structured for a ``json_schema`` response format)."""
+    system = "\n".join(m.get("content") or "" for m in messages if m.get("role") == "system")
+    user = next((m.get("content") or "" for m in reversed(messages) if m.get("role") == "user"), "")
+
+    jobs = _BATCH_JOB.findall(user)
+    if jobs:
+        return json.dumps({number: {name: _field_value(name) for name in fields.split(", ")} for number, fields in jobs})
+
+    current = _CURRENT_STEP.search(system)
+    steps = _WORKFLOW_STEP.findall(system)
+    if current is None or not steps:
+        return "The caregiver and Rosella discussed the issue; nothing is pending."
+
+    names = [name for name, _ in steps]
+    substep = current.group(1)
+    index = names.index(substep) if substep in names else 0
+    next_substep = names[min(index + 1, len(names) - 1)]
+    fields = [f.strip() for f in dict(steps).get(substep, "").split(",") if f.strip() and f.strip() != "none"]
+    prefilled = _PREFILLED.search(system)
+    skip = set(prefilled.group(1).split(", ")) if prefilled else set()
+    extracted = {name: _field_value(name) for name in fields if name not in skip}
+    reply = "Thank you, I have noted that. Let's continue."
+    schema = ((response_format or {}).get("json_schema") or {}).get("schema")
+    if schema is not None:
+        properties = schema["properties"]["fields"]["properties"]
+        fields = {name: None for name in properties}
+        fields.update({name: value for name, value in extracted.items() if name in properties})
+        return json.dumps({"reply": reply, "substep": next_substep, "fields": fields})
+    extracted["substep"] = next_substep
+    return f"{reply}\n---EXTRACTED---\n{json.dumps(extracted)}"
+
+
+def garble(content):
+    """``content`` with its context update lost or cut off."""
+    if content.startswith("{"):
+        return content[:len(content) - len(content) // 4]
+    return content.split("---EXTRACTED---")[0].rstrip() + "\nLet me know if anything else changes."
+
+
+def _approx_tokens(text):
+    return max(1, len(text) // 4)
+
+
+def create_app(latency, ttft_fraction=0.3, chunk_chars=16, faults=None, model_latency=None):
+    """
+    The stand-in ASGI app. ``app.state.stats`` counts requests (in total and
+    per model), injected faults and simulated cached prompt tokens.
+    ``model_latency`` maps model names to their own ``LatencyModel``.
+    """
+    app = FastAPI()
+    app.state.stats = {
+        "requests": 0, "streamed": 0, "prompt_tokens": 0, "cached_tokens": 0,
+        "errors": 0, "hangs": 0, "slowed": 0, "garbled": 0, "models": {},
+    }
+    model_latency = model_latency or {}
+    app.state.faults = faults or FaultModel()
+    seen_prefixes = set()
+
+    def usage(messages, content):
+        system = next((m.get("content") or "" for m in messages if m.get("role") == "system"), "")
+        prompt_tokens = sum(_approx_tokens(m.get("content") or "") for m in messages)
+        # Simulate provider prefix caching of the static part of the system prompt (128-token blocks)
+        prefix = system.split("Current workflow step:")[0]
+        cached = (_approx_tokens(prefix) // 128) * 128 if prefix in seen_prefixes else 0
+        seen_prefixes.add(prefix)
+        app.state.stats["prompt_tokens"] += prompt_tokens
+        app.state.stats["cached_tokens"] += cached
+        completion_tokens = _approx_tokens(content)
+        return {
+            "prompt_tokens": prompt_tokens,
+            "completion_tokens": completion_tokens,
+            "total_tokens": prompt_tokens + completion_tokens,
+            "prompt_tokens_details": {"cached_tokens": cached},
+        }
+
+    @app.post("/v1/chat/completions")
+    async def chat_completions(request: Request):
+        body = await request.json()
+        messages = body.get("messages", [])
+        model = body.get("model", "standin")
+        content = scripted_reply(messages, body.get("response_format"))
+        total = model_latency.get(model, latency).sample()
+        completion_id = f"chatcmpl-{uuid.uuid4().hex[:12]}"
+        created = int(time.time())
+        app.state.stats["requests"] += 1
+        app.state.stats["models"][model] = app.state.stats["models"].get(model, 0) + 1
+
+        fault = app.state.faults.draw(model)
+        if fault == "error":
+            app.state.stats["errors"] += 1
+            await asyncio.sleep(total * ttft_fraction)
+            return JSONResponse(
+                {"error": {"message": "Injected failure", "type": "server_error", "code": None}}, status_code=500
+            )
+        if fault == "hang":
+            app.state.stats["hangs"] += 1
+            # Until the client disconnects and the request is cancelled
+            await asyncio.Event().wait()
+        if fault == "slow":
+            app.state.stats["slowed"] += 1
+            total *= app.state.faults.slow_factor
+        if fault == "garble":
+            app.state.stats["garbled"] += 1
+            content = garble(content)
+
+        if not body.get("stream"):
+            await asyncio.sleep(total)
+            return JSONResponse({
+                "id": completion_id,
+                "object": "chat.completion",
+                "created": created,
+                "model": model,
+                "choices": [{"index": 0, "message": {"role": "assistant", "content": content}, "finish_reason": "stop"}],
+                "usage": usage(messages, content),
+            })
+
+        app.state.stats["streamed"] += 1
+        pieces = [content[i:i + chunk_chars] for i in range(0, len(content), chunk_chars)] or [""]
+
+        def chunk(delta, finish_reason=None):
+            return "data: " + json.dumps({
+                "id": completion_id,
+                "object": "chat.completion.chunk",
+                "created": created,
+                "model": model,
+                "choices": [{"index": 0, "delta": delta, "finish_reason": finish_reason}],
+            }) + "\n\n"
+
+        async def stream():
+            await asyncio.sleep(total * ttft_fraction)
+            yield chunk({"role": "assistant", "content": ""})
+            per_piece = total * (1 - ttft_fraction) / len(pieces)
+            for piece in pieces:
+                yield chunk({"content": piece})
+                await asyncio.sleep(per_piece)
+            yield chunk({}, "stop")
+            if (body.get("stream_options") or {}).get("include_usage"):
+                yield "data: " + json.dumps({
+                    "id": completion_id,
+                    "object": "chat.completion.chunk",
+                    "created": created,
+                    "model": model,
+                    "choices": [],
+                    "usage": usage(messages, content),
+                }) + "\n\n"
+            yield "data: [DONE]\n\n"
+
+        return StreamingResponse(stream(), media_type="text/event-stream")
+
+    return app
+
+
+def start_in_thread(latency, host="127.0.0.1", port=0, **app_kwargs):
+    """
+    Run the stand-in with uvicorn on a background thread. Returns
+    ``(base_url, app, server)``; call ``server.should_exit = True`` to stop it.
+    """
+    import uvicorn
+
+    app = create_app(latency, **app_kwargs)
+    server = uvicorn.Server(uvicorn.Config(app, host=host, port=port, log_level="warning", lifespan="off"))
+    thread = threading.Thread(target=server.run, daemon=True)
+    thread.start()
+    while not server.started:
+        time.sleep(0.01)
+    bound_port = server.servers[0].sockets[0].getsockname()[1]
+    return f"http://{host}:{bound_port}/v1", app, server
+
+
+if __name__ == "__main__":
+    import uvicorn
+
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8900)
+    parser.add_argument("--latency", default="lognormal:0.4,0.35")
+    parser.add_argument("--ttft-fraction", type=float, default=0.3, help="share of the latency before the first streamed chunk")
+    parser.add_argument("--seed", type=int, default=None)
+    parser.add_argument("--error-rate", type=float, default=0.0, help="share of requests answered with HTTP 500")
+    parser.add_argument("--hang-rate", type=float, default=0.0, help="share of requests never answered")
+    parser.add_argument("--slow-rate", type=float, default=0.0, help="share of requests slowed by --slow-factor")
+    parser.add_argument("--slow-factor", type=float, default=10.0)
+    parser.add_argument("--garble-rate", type=float, default=0.0, help="share of replies without the extracted block (structured replies are cut off)")
+    parser.add_argument("--garble-models", nargs="*", default=(), help="only garble these models")
+    parser.add_argument("--model-latency", action="append", default=[], metavar="MODEL=SPEC")
+    args = parser.parse_args()
+    faults = FaultModel(
+        args.error_rate, args.hang_rate, args.slow_rate, args.slow_factor, args.garble_rate, args.garble_models, args.seed,
+    )
+    uvicorn.run(
+        create_app(
+            LatencyModel.parse(args.latency, args.seed), ttft_fraction=args.ttft_fraction, faults=faults,
+            model_latency=parse_model_latency(args.model_latency, args.seed),
+        ),
+        host=args.host, port=args.port, log_level="warning",
+    )
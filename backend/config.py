@@ -7,6 +7,8 @@ load_dotenv()
 class Config:
     # OpenAI Configuration
     OPENAI_API_KEY = os.getenv("OPENAI_API_KEY")
+    # Any OpenAI-compatible endpoint (e.g. the benchmark stand-in); unset uses api.openai.com
+    OPENAI_BASE_URL = os.getenv("OPENAI_BASE_URL") or None
     
     # Server Configuration
     HOST = os.getenv("HOST", "0.0.0.0")
@@ -23,6 +25,102 @@ class Config:
     MODEL_NAME = os.getenv("MODEL_NAME", "gpt-4o")
     MODEL_TEMPERATURE = float(os.getenv("MODEL_TEMPERATURE", "0.4"))
     
+    # Tiered routing (agents/model_router.py): MODEL_NAME is the large tier; simple
+    # steps, extraction and history summaries use the small tier, which can be any OpenAI-compatible
+    # server (SMALL_MODEL_BASE_URL, default OPENAI_BASE_URL). MODEL_ROUTING=False
+    # sends everything to the large tier.
+    MODEL_ROUTING = os.getenv("MODEL_ROUTING", "True").lower() == "true"
+    SMALL_MODEL_NAME = os.getenv("SMALL_MODEL_NAME", "gpt-4o-mini")
+    SMALL_MODEL_BASE_URL = os.getenv("SMALL_MODEL_BASE_URL") or None
+    SMALL_MODEL_API_KEY = os.getenv("SMALL_MODEL_API_KEY") or None
+    EXTRACTION_TIER = os.getenv("EXTRACTION_TIER", "small").lower()
+    # USD per million tokens as "model=input/cached input/output,..."; models not
+    # listed (e.g. local ones) cost nothing
+    MODEL_PRICES = os.getenv("MODEL_PRICES", "gpt-4o=2.50/1.25/10.00,gpt-4o-mini=0.15/0.075/0.60")
+    # How scenario turns return their context update: "json_schema" (structured
+    # output: a reply plus a fields object constrained by each scenario's
+    # context schema) or "delimiter" (reply text, ---EXTRACTED---, then JSON;
+    # for OpenAI-compatible servers without structured outputs)
+    REPLY_FORMAT = os.getenv("REPLY_FORMAT", "json_schema").lower()
+    
+    # LLM HTTP connection pool (shared by every chat model client)
+    LLM_MAX_CONNECTIONS = int(os.getenv("LLM_MAX_CONNECTIONS", "100"))
+    LLM_MAX_KEEPALIVE_CONNECTIONS = int(os.getenv("LLM_MAX_KEEPALIVE_CONNECTIONS", "20"))
+    LLM_KEEPALIVE_EXPIRY = float(os.getenv("LLM_KEEPALIVE_EXPIRY", "30"))
+    LLM_REQUEST_TIMEOUT = float(os.getenv("LLM_REQUEST_TIMEOUT", "60"))
+    LLM_CONNECT_TIMEOUT = float(os.getenv("LLM_CONNECT_TIMEOUT", "5"))
+    
+    # LLM scheduler (per worker): concurrent model calls (0 = unlimited), the
+    # longest a call may wait for a slot before it is shed, and the queue size.
+    # Shed chat turns get a "please hold" reply ("hold") or HTTP 429 ("429").
+    LLM_MAX_INFLIGHT = int(os.getenv("LLM_MAX_INFLIGHT", "32"))
+    LLM_QUEUE_DEADLINE = float(os.getenv("LLM_QUEUE_DEADLINE", "10"))
+    LLM_MAX_QUEUE = int(os.getenv("LLM_MAX_QUEUE", "1000"))
+    LLM_SHED_RESPONSE = os.getenv("LLM_SHED_RESPONSE", "hold").lower()
+    
+    # Scenario model calls: deadline per call in seconds (0 = none), hedging of slow
+    # calls after the recent p95 call time (never sooner than LLM_HEDGE_MIN_DELAY),
+    # and a circuit breaker that opens after LLM_BREAKER_FAILURES failed calls in a
+    # row (0 = never) for LLM_BREAKER_RESET seconds. Failed turns get the step's fallback reply.
+    LLM_CALL_DEADLINE = float(os.getenv("LLM_CALL_DEADLINE", "20"))
+    LLM_HEDGE = os.getenv("LLM_HEDGE", "False").lower() == "true"
+    LLM_HEDGE_PERCENTILE = float(os.getenv("LLM_HEDGE_PERCENTILE", "95"))
+    LLM_HEDGE_MIN_DELAY = float(os.getenv("LLM_HEDGE_MIN_DELAY", "1.0"))
+    LLM_BREAKER_FAILURES = int(os.getenv("LLM_BREAKER_FAILURES", "5"))
+    LLM_BREAKER_RESET = float(os.getenv("LLM_BREAKER_RESET", "30"))
+    
+    # Session storage: "memory" (single worker), "sqlite" (all workers on one host)
+    # or "network" (redis:// URL, or local:// for the in-process stand-in)
+    SESSION_BACKEND = os.getenv("SESSION_BACKEND", "memory").lower()
+    SESSION_SQLITE_PATH = os.getenv("SESSION_SQLITE_PATH", "data/sessions.sqlite3")
+    SESSION_NETWORK_URL = os.getenv("SESSION_NETWORK_URL", "local://")
+    WORKERS = int(os.getenv("WEB_CONCURRENCY", "1"))
+    # When to import and compile the LangGraph graph: "background" (on a worker
+    # thread once the server is up), "lazy" (on the first chat turn) or "eager" (at import)
+    STARTUP_MODE = os.getenv("STARTUP_MODE", "background").lower()
+    
+    # Responses kept per idempotency key, so client retries do not run a turn twice
+    IDEMPOTENCY_TTL = float(os.getenv("IDEMPOTENCY_TTL", "300"))
+    IDEMPOTENCY_MAX_ENTRIES = int(os.getenv("IDEMPOTENCY_MAX_ENTRIES", "10000"))
+    
+    # Generate the opening turn at /start-session, for a first /chat that sends
+    # SPECULATIVE_OPENING_MESSAGE (what the bundled frontend sends). Off by
+    # default: a session whose first message differs pays for a discarded call
+    SPECULATIVE_GREETING = os.getenv("SPECULATIVE_GREETING", "False").lower() == "true"
+    SPECULATIVE_OPENING_MESSAGE = os.getenv("SPECULATIVE_OPENING_MESSAGE", "Hello, I need help with my issue")
+    SPECULATION_TTL = float(os.getenv("SPECULATION_TTL", "120"))
+    SPECULATION_MAX_ENTRIES = int(os.getenv("SPECULATION_MAX_ENTRIES", "10000"))
+    
+    # Session storage limits
+    SESSION_MAX_ENTRIES = int(os.getenv("SESSION_MAX_ENTRIES", "10000"))
+    SESSION_MAX_BYTES = int(os.getenv("SESSION_MAX_BYTES", str(256 * 1024 * 1024)))
+    SESSION_IDLE_TTL = float(os.getenv("SESSION_IDLE_TTL", "1800"))
+    SESSION_SWEEP_INTERVAL = float(os.getenv("SESSION_SWEEP_INTERVAL", "60"))
+
+    # Response cache for repeated scenario turns (0 entries disables it)
+    RESPONSE_CACHE_MAX_ENTRIES = int(os.getenv("RESPONSE_CACHE_MAX_ENTRIES", "5000"))
+    RESPONSE_CACHE_TTL = float(os.getenv("RESPONSE_CACHE_TTL", "3600"))
+    RESPONSE_CACHE_DISABLED_SCENARIOS = [
+        s.strip() for s in os.getenv("RESPONSE_CACHE_DISABLED_SCENARIOS", "").split(",") if s.strip()
+    ]
+
+    # Batched context extraction (utils_context_extraction)
+    EXTRACTION_BATCH_WINDOW_MS = float(os.getenv("EXTRACTION_BATCH_WINDOW_MS", "10"))
+    EXTRACTION_BATCH_MAX = int(os.getenv("EXTRACTION_BATCH_MAX", "16"))
+    EXTRACTION_MEMO_ENTRIES = int(os.getenv("EXTRACTION_MEMO_ENTRIES", "2048"))
+
+    # Conversation memory: last N turns verbatim, older turns folded into a
+    # summary in the background (0 turns disables history)
+    HISTORY_WINDOW_TURNS = int(os.getenv("HISTORY_WINDOW_TURNS", "6"))
+    HISTORY_SUMMARIZE_EVERY = int(os.getenv("HISTORY_SUMMARIZE_EVERY", "4"))
+    HISTORY_SUMMARY_TIER = os.getenv("HISTORY_SUMMARY_TIER", "small").lower()
+
+    # Default per-turn prompt budgets in tokens; over-budget input is trimmed or rejected (413)
+    PROMPT_BUDGET_USER_INPUT = int(os.getenv("PROMPT_BUDGET_USER_INPUT", "1000"))
+    PROMPT_BUDGET_CONTEXT = int(os.getenv("PROMPT_BUDGET_CONTEXT", "1500"))
+    PROMPT_BUDGET_HISTORY = int(os.getenv("PROMPT_BUDGET_HISTORY", "3000"))
+    PROMPT_BUDGET_ON_OVERFLOW = os.getenv("PROMPT_BUDGET_ON_OVERFLOW", "trim").lower()
+
     @classmethod
     def validate(cls):
         """Validate required configuration"""
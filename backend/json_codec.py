@@ -0,0 +1,170 @@
+# backend/json_codec.py
+"""
+JSON encoding and decoding shared by the API, the prompts and the session
+backends.
+
+Uses orjson when it is installed and falls back to the standard library
+otherwise; both produce compact output. ``decode_object`` is the tolerant
+decoder for model output such as the ``---EXTRACTED---`` block: it accepts
+code fences, leading chatter and trailing text around the JSON object, so a
+slightly malformed completion does not need another model call. With
+``partial=True``, ``decode_model_object`` also recovers the complete members
+of an object that was cut off (e.g. a completion that ran out of tokens).
+"""
+
+import json
+import re
+
+try:
+    import orjson
+except ImportError:  # pragma: no cover - orjson is in requirements.txt
+    orjson = None
+
+_CODE_FENCE = re.compile(r"^```[a-zA-Z]*\s*|\s*```$")
+_DECODER = json.JSONDecoder()
+
+
+def dumps_bytes(data, sort_keys=False):
+    """Compact UTF-8 JSON; values JSON cannot represent are written with ``str()``."""
+    if orjson is not None:
+        option = orjson.OPT_NON_STR_KEYS | (orjson.OPT_SORT_KEYS if sort_keys else 0)
+        try:
+            return orjson.dumps(data, default=str, option=option)
+        except TypeError:
+            # e.g. integers wider than 64 bits
+            pass
+    return json.dumps(data, sort_keys=sort_keys, separators=(",", ":"), ensure_ascii=False, default=str).encode("utf-8")
+
+
+def dumps(data, sort_keys=False):
+    return dumps_bytes(data, sort_keys).decode("utf-8")
+
+
+def canonical_json(data):
+    """Sorted-key compact JSON: the same data always gives the same string."""
+    return dumps(data, sort_keys=True)
+
+
+def loads(raw):
+    return orjson.loads(raw) if orjson is not None else json.loads(raw)
+
+
+def _salvage(text):
+    """The first JSON object embedded in ``text``, or None."""
+    unfenced = _CODE_FENCE.sub("", text)
+    if unfenced != text:
+        try:
+            return loads(unfenced)
+        except ValueError:
+            pass
+    text = unfenced
+    start = text.find("{")
+    if start < 0:
+        return None
+    try:
+        # Stops at the end of the object, ignoring whatever follows it
+        return _DECODER.raw_decode(text, start)[0]
+    except ValueError:
+        end = text.rfind("}")
+        if end <= start:
+            return None
+        try:
+            return loads(text[start:end + 1])
+        except ValueError:
+            return None
+
+
+def recover_partial(text):
+    """
+    The complete members of a truncated JSON object, or None.
+
+    Open arrays and objects are closed; a member cut off in its key or value
+    (a string, number or literal may be incomplete) is dropped.
+    """
+    start = text.find("{")
+    if start < 0:
+        return None
+    closers = []
+    # (end of a prefix that is valid once closed, closers at that point)
+    cuts = []
+    in_string = escape = False
+    for index in range(start, len(text)):
+        char = text[index]
+        if in_string:
+            if escape:
+                escape = False
+            elif char == "\\":
+                escape = True
+            elif char == '"':
+                in_string = False
+                cuts.append((index + 1, "".join(reversed(closers))))
+            continue
+        if char == '"':
+            in_string = True
+        elif char in "{[":
+            closers.append("}" if char == "{" else "]")
+            cuts.append((index + 1, "".join(reversed(closers))))
+        elif char in "}]":
+            if not closers:
+                break
+            closers.pop()
+            if not closers:
+                # The object is complete after all
+                return _object_or_none(text[start:index + 1])
+            cuts.append((index + 1, "".join(reversed(closers))))
+        elif char == ",":
+            cuts.append((index, "".join(reversed(closers))))
+
+    # Latest cut first; a cut after a key or a dangling colon does not parse
+    for end, closing in reversed(cuts):
+        data = _object_or_none(text[start:end] + closing)
+        if data is not None:
+            return data
+    return None
+
+
+def _object_or_none(text):
+    try:
+        data = loads(text)
+    except ValueError:
+        return None
+    return data if isinstance(data, dict) else None
+
+
+def decode_model_object(text, partial=False):
+    """
+    ``(object, how)`` for model output that should be a JSON object. ``how``
+    is "clean" (parsed as is), "salvaged" (fences or text around it),
+    "partial" (truncated, only with ``partial=True``), or with no object
+    "invalid_json" or "not_object".
+    """
+    text = (text or "").strip()
+    try:
+        data = loads(text)
+        how = "clean"
+    except ValueError:
+        data = _salvage(text)
+        how = "salvaged"
+        if data is None and partial:
+            data = recover_partial(text)
+            how = "partial"
+        if data is None:
+            return None, "invalid_json"
+    if not isinstance(data, dict):
+        return None, "not_object"
+    return data, how
+
+
+def decode_object(text):
+    """
+    ``(object, error)`` for model output that should be a JSON object, with
+    error None, "invalid_json" or "not_object". Clean payloads take the fast
+    path; fenced or chatty ones are salvaged.
+    """
+    data, how = decode_model_object(text)
+    return (data, None) if data is not None else (None, how)
+
+
+def parse_json_object(text):
+    """The JSON object in a model reply, or ``{}``."""
+    return decode_object(text)[0] or {}
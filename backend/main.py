@@ -1,16 +1,51 @@
 # backend/main.py
-from fastapi import FastAPI, Request
+import asyncio
+import copy
+import inspect
+import logging
+import math
+import time
+from fastapi import FastAPI, Header, HTTPException, Request
+from fastapi.responses import JSONResponse, ORJSONResponse, Response, StreamingResponse
 from fastapi.middleware.cors import CORSMiddleware
 from pydantic import BaseModel
-from typing import Optional, Dict
+from typing import Any, Optional, Dict
 from uuid import uuid4
-from agents.caregiver_agent import chat_graph
+from agents.llm_clients import aclose_chat_models
+from agents.llm_resilience import LLMInterrupted, guard_stats
+from agents.llm_scheduler import LLMOverloaded, llm_scheduler
+from agents.model_router import resolve_tier, route_stats
+from agents.memory import conversation_memory
+from agents.prompt_budget import PromptBudgetExceeded, fit_context, fit_user_input, get_encoding, prompt_accounting
+from agents.prompt_cache import prefix_stats
+from agents.response_cache import response_cache
+from agents.utils_context_extraction import extraction_batcher
+from agents.scenario_engine import record_deferred, turn_stats
+from agents.streaming import reply_decode_stats
+from agents.scenario_registry import (
+    DEFAULT_SCENARIO_ID, SCENARIO_CATALOG_JSON, SCENARIO_NODES, SCENARIO_SCHEMAS, SCENARIO_SPECS,
+)
 from langchain_core.messages import HumanMessage, AIMessage
+from config import Config
+from json_codec import dumps, orjson
+from metrics import HTTP_REQUEST_DURATION, refresh_sessions, register_sessions, render as render_metrics
+from session_store import create_session_store
+from session_turns import IdempotentRequests, SessionLocks
+from speculative_turns import SpeculativeTurns, speculation_key
+
+logger = logging.getLogger(__name__)
 
-# In-memory session storage
-sessions = {}
+# Session storage (in-memory by default; SESSION_BACKEND=sqlite/network to share across workers)
+sessions = create_session_store(Config)
+register_sessions(sessions)
+# Per-session request ordering and retry coalescing (see session_turns.py)
+session_locks = SessionLocks()
+idempotent_requests = IdempotentRequests(Config.IDEMPOTENCY_MAX_ENTRIES, Config.IDEMPOTENCY_TTL)
+# Opening turns generated at /start-session (see speculative_turns.py)
+speculative_turns = SpeculativeTurns(Config.SPECULATION_TTL, Config.SPECULATION_MAX_ENTRIES)
 
-app = FastAPI()
+# orjson renders the response bodies (context_data on every turn) several times faster
+app = FastAPI(default_response_class=ORJSONResponse if orjson is not None else JSONResponse)
 
 # Allow all origins (in dev)
 app.add_middleware(
@@ -21,94 +56,177 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+@app.middleware("http")
+async def record_request_latency(request: Request, call_next):
+    started = time.perf_counter()
+    response = await call_next(request)
+    route = request.scope.get("route")
+    HTTP_REQUEST_DURATION.labels(
+        request.method, route.path if route is not None else "unmatched", response.status_code
+    ).observe(time.perf_counter() - started)
+    return response
+
+# The LangGraph graph (langgraph, langchain and the OpenAI SDK behind the chat
+# models) is the slow part of a cold start. It is loaded on a worker thread so
+# the port is bound and /health, /scenarios and /start-session answer while
+# it loads; chat turns wait for it. See Config.STARTUP_MODE.
+chat_graph = None
+_graph_loading = None
+_startup = {"mode": Config.STARTUP_MODE, "graph_load_s": None}
+
+def _load_chat_graph():
+    started = time.perf_counter()
+    from agents.caregiver_agent import chat_graph as graph
+    for spec in SCENARIO_SPECS.values():
+        for tier in {spec.tier, *(step.tier for step in spec.workflow if step.tier)}:
+            resolve_tier(tier).chat_model(spec.temperature)
+    _startup["graph_load_s"] = time.perf_counter() - started
+    return graph
+
+async def get_chat_graph():
+    """The compiled graph, loading it first if needed (without blocking the event loop)."""
+    global chat_graph, _graph_loading
+    if chat_graph is None:
+        if _graph_loading is None:
+            _graph_loading = asyncio.get_running_loop().run_in_executor(None, _load_chat_graph)
+        try:
+            # Shared by every waiter: one that is cancelled (e.g. a discarded speculation) must not cancel it
+            graph = await asyncio.shield(_graph_loading)
+        except Exception:
+            # Let the next turn retry
+            _graph_loading = None
+            raise
+        if chat_graph is None:
+            chat_graph = graph
+    return chat_graph
+
+if Config.STARTUP_MODE == "eager":
+    chat_graph = _load_chat_graph()
+
+def _log_warm_up_failure(task):
+    if not task.cancelled() and task.exception() is not None:
+        logger.error("Loading the chat graph failed: %r", task.exception())
+
+@app.on_event("startup")
+async def start_session_sweeper():
+    sessions.start_sweeper()
+    # Load the tokenizer off the event loop (it may download its encoding once)
+    asyncio.get_running_loop().run_in_executor(None, get_encoding)
+    if Config.STARTUP_MODE == "background":
+        # Not awaited: uvicorn binds the port right after the startup hooks return
+        asyncio.get_running_loop().create_task(get_chat_graph()).add_done_callback(_log_warm_up_failure)
+
+@app.on_event("shutdown")
+async def close_llm_clients():
+    await sessions.stop_sweeper()
+    await conversation_memory.aclose()
+    sessions.close()
+    await aclose_chat_models()
+
 class StartSessionRequest(BaseModel):
     scenario_id: str
+    context_data: Optional[Dict[str, Any]] = None
+    # Generate the opening turn right away (default: Config.SPECULATIVE_GREETING)
+    speculate: Optional[bool] = None
 
 class ChatRequest(BaseModel):
     message: str
     session_id: str
     scenario_id: Optional[str] = None
     context_data: Optional[Dict] = {}
+    # Same key = same turn: retries get the original response (also accepted as an Idempotency-Key header)
+    idempotency_key: Optional[str] = None
 
 class UpdateContextRequest(BaseModel):
     session_id: str
-    context_data: Dict[str, str]
+    context_data: Dict[str, Any]
+
+
+# Sections of /health: each subsystem reports its own stats (a coroutine
+# when it has to query the session backend)
+HEALTH_SECTIONS = {
+    "sessions": sessions.astats,
+    "prompt_cache": prefix_stats.snapshot,
+    "turns": turn_stats.snapshot,
+    "response_cache": response_cache.snapshot,
+    "extraction": extraction_batcher.stats,
+    "memory": conversation_memory.stats,
+    "prompt_tokens": prompt_accounting.snapshot,
+    "context_rejected": lambda: {scenario_id: schema.rejected for scenario_id, schema in SCENARIO_SCHEMAS.items()},
+    "startup": lambda: {**_startup, "graph_ready": chat_graph is not None},
+    "session_locks": session_locks.stats,
+    "idempotency": idempotent_requests.stats,
+    "llm_scheduler": llm_scheduler.stats,
+    "llm_guard": guard_stats,
+    "model_routes": route_stats.snapshot,
+    "reply_decoding": reply_decode_stats.snapshot,
+    "speculative_turns": speculative_turns.stats,
+}
 
 @app.get("/health")
-def health_check():
-    return {"status": "healthy"}
+async def health_check():
+    health = {"status": "healthy"}
+    for name, report in HEALTH_SECTIONS.items():
+        section = report()
+        health[name] = await section if inspect.isawaitable(section) else section
+    return health
+
+@app.get("/metrics")
+async def metrics():
+    await refresh_sessions()
+    body, content_type = render_metrics()
+    return Response(content=body, media_type=content_type)
 
 @app.get("/scenarios")
-def get_scenarios():
-    return [
-        {"id": "general_chat", "name": "General Chat", "description": "Test generic conversation", "context_fields": ["caregiver_name", "client_name", "general_chat_topic", "substep"]},
-        {
-            "id": "no_schedule",
-            "name": "No Schedule on Calendar",
-            "description": "Caregiver clocked in but no schedule appears on calendar",
-            "context_fields": [
-                "client_name",
-                "caregiver_name",
-                "system_regular_schedule",
-                "regular_schedule",
-                "is_regular_schedule",
-                "today_date",
-                "today_shift",
-                "remove_day",
-                "client_on_phone",
-                "client_name_confirmed",
-                "swap_confirmed",
-                "substep"
-            ]
-        },
-        {
-            "id": "out_of_window",
-            "name": "Out of Window (Late Clock In)",
-            "description": "Caregiver clocked in late for their shift",
-            "context_fields": [
-                "client_name", "caregiver_name", "scheduled_start_time", "actual_start_time", "late_reason", "client_on_phone", "client_name_confirmed", "client_confirmed_time", "can_makeup_hours", "makeup_time", "makeup_later", "substep"
-            ]
-        },
-        {
-            "id": "gps_out_of_range",
-            "name": "GPS Signal Out of Range",
-            "description": "Caregiver clocked in or out outside client's service area",
-            "context_fields": [
-                "caregiver_name", "client_name", "gps_issue_type", "clock_in_location", "clock_out_location", "can_try_again", "unscheduled_visit_attempted", "errand_reason", "client_on_phone", "client_confirmed_reason", "office_state", "substep"
-            ]
-        },
-        {
-            "id": "wrong_phone",
-            "name": "Call From Caregiver Number",
-            "description": "Caregiver used IVR number from their phone instead of client's house phone",
-            "context_fields": [
-                "caregiver_name", "client_name", "phone_response", "app_works", "coordinator_ok", "substep"
-            ]
-        },
+async def get_scenarios():
+    # Serialized once from the scenario registry
+    return Response(content=SCENARIO_CATALOG_JSON, media_type="application/json")
+
+def _opens_with_template(scenario_id, context_data):
+    """Whether the session's first turn is a template, answered at once without the model."""
+    compiled = (SCENARIO_NODES.get(scenario_id) or SCENARIO_NODES[DEFAULT_SCENARIO_ID]).compiled
+    return compiled.render_template(context_data.get("substep", compiled.first_substep), context_data) is not None
+
+async def _generate_opening(session_id, scenario_id, context_data):
+    """
+    ``(result, deferred_stats)`` of the first turn of a session that opens
+    with Config.SPECULATIVE_OPENING_MESSAGE. Its turn stats are only recorded
+    if the turn is served.
+    """
+    graph = await get_chat_graph()
+    deferred_stats = []
+    result = await graph.ainvoke(
         {
-            "id": "phone_not_found",
-            "name": "Phone Number Not Found",
-            "description": "Caregiver used unregistered phone number",
-            "context_fields": [
-                "caregiver_name", "client_name", "unregistered_phone", "phone_owner", "client_can_confirm", "client_on_phone", "client_name_confirmed", "new_phone_confirmed", "substep"
-            ]
+            "messages": [HumanMessage(content=Config.SPECULATIVE_OPENING_MESSAGE)],
+            "history": [],
+            "summary": "",
+            "scenario_id": scenario_id,
+            "context_data": context_data,
         },
-        {
-            "id": "duplicate_call",
-            "name": "Duplicate Call",
-            "description": "Caregiver accidentally clocked in or out more than once; no call needed, call will be rejected.",
-            "context_fields": ["caregiver_name", "client_name", "duplicate_call_reason", "substep"]
-        }
-    ]
+        config={"thread_id": session_id, "configurable": {"session_id": session_id, "deferred_stats": deferred_stats}},
+    )
+    return result, deferred_stats
 
 @app.post("/start-session")
-def start_session(data: StartSessionRequest):
+async def start_session(data: StartSessionRequest):
     session_id = f"session_{uuid4().hex}"
-    sessions[session_id] = {
+    context_data = {}
+    if data.context_data:
+        _, context_data = _fit_to_budget(data.scenario_id, context_data=data.context_data)
+        context_data = _context_schema(data.scenario_id).clean(context_data)
+    await sessions.aput(session_id, {
         "messages": [],
         "scenario_id": data.scenario_id,
-        "context_data": {},  # Start with completely empty context
-    }
+        "context_data": context_data,  # Empty unless the client sent initial context
+    })
+
+    speculate = Config.SPECULATIVE_GREETING if data.speculate is None else data.speculate
+    if speculate and not _opens_with_template(data.scenario_id, context_data):
+        # Served by the first /chat if it sends the opening message with this context
+        key = speculation_key(data.scenario_id, Config.SPECULATIVE_OPENING_MESSAGE, context_data)
+        speculative_turns.start(
+            session_id, key, lambda: _generate_opening(session_id, data.scenario_id, copy.deepcopy(context_data))
+        )
     
     # Get scenario info for the response
     scenario_info = {
@@ -123,33 +241,67 @@ def start_session(data: StartSessionRequest):
         "message": f"Session started for {scenario_info['name']}"
     }
 
-@app.post("/chat")
-def chat(request: ChatRequest):
-    session = sessions.get(request.session_id)
-    if not session:
-        return {"message": "Invalid session", "is_complete": True}
+def _fit_to_budget(scenario_id, message=None, context_data=None):
+    """
+    Apply the scenario's prompt budget to client input: trimmed values, or a
+    413 when the scenario rejects over-budget input.
+    """
+    spec = SCENARIO_SPECS.get(scenario_id) or SCENARIO_SPECS[DEFAULT_SCENARIO_ID]
+    try:
+        if message is not None:
+            message = fit_user_input(spec.scenario_id, message, spec.budget)
+        if context_data:
+            context_data = fit_context(spec.scenario_id, context_data, spec.context_fields, spec.budget)
+    except PromptBudgetExceeded as e:
+        raise HTTPException(status_code=413, detail=str(e))
+    return message, context_data
+
+def _context_schema(scenario_id):
+    """The scenario's context schema (unknown scenarios run as the default one)."""
+    return SCENARIO_SCHEMAS.get(scenario_id) or SCENARIO_SCHEMAS[DEFAULT_SCENARIO_ID]
+
+def _begin_turn(session, request: ChatRequest):
+    request.message, request.context_data = _fit_to_budget(
+        request.scenario_id or session.get("scenario_id"), request.message, request.context_data
+    )
 
     # Update scenario_id if provided in the request
     if request.scenario_id:
         session["scenario_id"] = request.scenario_id
 
-    # Merge all incoming context fields into session context (no filtering)
+    # Merge the incoming context fields the scenario declares, typed; empty values clear a field
     if request.context_data:
-        session["context_data"].update(request.context_data)
+        _context_schema(session.get("scenario_id")).apply(session["context_data"], request.context_data, clear_empty=True)
 
     # Add user message as LangChain HumanMessage
     human_message = HumanMessage(content=request.message)
     session["messages"].append(human_message)
 
-    # Prepare state for LangGraph
-    state = {
-        "messages": session["messages"],
+    # Prepare state for LangGraph. Only this turn's message goes in: copying
+    # the whole history into the graph every turn makes long calls quadratic.
+    # Nodes that want earlier turns get a bounded window plus a summary.
+    history, summary = conversation_memory.history(session)
+    return {
+        "messages": [human_message],
+        "history": history,
+        "summary": summary,
         "scenario_id": session.get("scenario_id", "general_chat"),
         "context_data": session.get("context_data", {})
     }
 
-    result = chat_graph.invoke(state, config={"thread_id": request.session_id})
+async def _speculated_turn(request: ChatRequest, session, state):
+    """The graph result generated at /start-session, if this first turn is the one it anticipated."""
+    if len(session["messages"]) != 1:
+        return None
+    key = speculation_key(state["scenario_id"], request.message, state["context_data"])
+    speculated = await speculative_turns.take(request.session_id, key)
+    if speculated is None:
+        return None
+    result, deferred_stats = speculated
+    record_deferred(deferred_stats)
+    return result
 
+async def _finish_turn(session, request: ChatRequest, result):
     # Extract bot message from the result
     if "messages" in result and result["messages"]:
         # Get the last message which should be the AI response
@@ -169,6 +321,9 @@ def chat(request: ChatRequest):
     # Append bot response to history
     ai_message = AIMessage(content=bot_response)
     session["messages"].append(ai_message)
+    await sessions.aput(request.session_id, session)
+    # Fold older turns into the summary off the request path
+    conversation_memory.schedule_refresh(request.session_id, session, sessions, session_locks)
 
     # Always return the full context_data
     return {
@@ -179,15 +334,181 @@ def chat(request: ChatRequest):
         "context_data": session["context_data"],  # Return the updated context_data
     }
 
+# Reply to a turn shed by the LLM scheduler (LLM_SHED_RESPONSE=hold)
+HOLD_MESSAGE = "Thank you for your patience. All of our lines are busy right now; please hold a moment and send your message again."
+
+def _turn_snapshot(session):
+    """The scenario and context before a turn, for _abandon_turn."""
+    return session.get("scenario_id"), dict(session["context_data"])
+
+def _abandon_turn(session, snapshot):
+    """
+    Undo a turn that did not complete (shed, interrupted, failed or
+    cancelled), which the caregiver resends:
+    _begin_turn's history append and client context merge, and the values
+    the turn itself wrote into the context (e.g. rule-extracted fields).
+    """
+    if session["messages"] and isinstance(session["messages"][-1], HumanMessage):
+        session["messages"].pop()
+    session["scenario_id"], context_data = snapshot
+    session["context_data"].clear()
+    session["context_data"].update(context_data)
+
+async def _hold_response(request: ChatRequest, error: LLMOverloaded):
+    session = await sessions.aget(request.session_id) or {}
+    return {
+        "message": HOLD_MESSAGE,
+        "session_id": request.session_id,
+        "is_complete": False,
+        "extracted_data": None,
+        "context_data": session.get("context_data", {}),
+        "retry_after": math.ceil(error.retry_after),
+    }
+
+def _idempotency_scope(request: ChatRequest, header_key):
+    """Idempotency keys are scoped to their session; None when the client sent none."""
+    key = request.idempotency_key or header_key
+    return (request.session_id, key) if key else None
+
+@app.post("/chat")
+async def chat(request: ChatRequest, idempotency_key: Optional[str] = Header(None)):
+    async def run_turn():
+        # One turn per session at a time; the session is read once the lock is held
+        async with session_locks.hold(request.session_id):
+            session = await sessions.aget(request.session_id)
+            if not session:
+                return {"message": "Invalid session", "is_complete": True}
+
+            snapshot = _turn_snapshot(session)
+            state = _begin_turn(session, request)
+            try:
+                result = await _speculated_turn(request, session, state)
+                if result is None:
+                    graph = await get_chat_graph()
+                    result = await graph.ainvoke(
+                        state, config={"thread_id": request.session_id, "configurable": {"session_id": request.session_id}}
+                    )
+            except BaseException:
+                # Shed, failed or cancelled: the session is left as it was before the turn
+                _abandon_turn(session, snapshot)
+                raise
+            return await _finish_turn(session, request, result)
+
+    # A retry with the same key gets the original turn's response
+    try:
+        return await idempotent_requests.run(_idempotency_scope(request, idempotency_key), run_turn)
+    except LLMOverloaded as e:
+        # Shed turns are not stored under the idempotency key, so a retry runs again
+        if Config.LLM_SHED_RESPONSE == "429":
+            raise HTTPException(status_code=429, detail=str(e), headers={"Retry-After": str(math.ceil(e.retry_after))})
+        return await _hold_response(request, e)
+
+def _sse_event(event, data):
+    return f"event: {event}\ndata: {dumps(data)}\n\n"
+
+@app.post("/chat/stream")
+async def chat_stream(request: ChatRequest, idempotency_key: Optional[str] = Header(None)):
+    """
+    Same turn as /chat, streamed as Server-Sent Events:
+    - ``token``: ``{"text": ...}`` for each visible piece of the reply as it is generated
+    - ``done``: the /chat response body, with ``extracted_data`` set to the context delta
+    - ``error``: ``{"message": ...}`` if the turn could not be completed, with
+      ``status`` 413 for input over the prompt budget
+    The context update (fields, substep) is never sent as tokens. A retry with the
+    idempotency key of a turn in flight only gets its ``done`` event. A turn
+    shed by the LLM scheduler gets the hold message, or an ``error`` with
+    ``status`` 429 and ``retry_after``. A reply cut off by a model failure
+    ends with an ``error`` (``interrupted``: true); the partial reply is
+    dropped and the caregiver resends the message.
+    """
+    queue = asyncio.Queue()
+
+    async def token_sink(text):
+        await queue.put(("token", {"text": text}))
+
+    async def stream_turn():
+        async with session_locks.hold(request.session_id):
+            session = await sessions.aget(request.session_id)
+            if not session:
+                return None
+            snapshot = _turn_snapshot(session)
+            state = _begin_turn(session, request)
+            context_before = dict(session["context_data"])
+            try:
+                result = await _speculated_turn(request, session, state)
+                if result is not None:
+                    await token_sink(result["messages"][-1].content)
+                else:
+                    graph = await get_chat_graph()
+                    result = await graph.ainvoke(
+                        state,
+                        config={
+                            "thread_id": request.session_id,
+                            "configurable": {"token_sink": token_sink, "session_id": request.session_id},
+                        },
+                    )
+            except BaseException:
+                # Also when the client disconnects and the turn is cancelled
+                _abandon_turn(session, snapshot)
+                raise
+            response = await _finish_turn(session, request, result)
+            response["extracted_data"] = {
+                k: v for k, v in session["context_data"].items() if context_before.get(k) != v
+            }
+            return response
+
+    async def run_turn():
+        try:
+            response = await idempotent_requests.run(_idempotency_scope(request, idempotency_key), stream_turn)
+            if response is None:
+                await queue.put(("error", {"message": "Invalid session", "is_complete": True}))
+            else:
+                await queue.put(("done", response))
+        except HTTPException as e:
+            # Over-budget input (413)
+            await queue.put(("error", {"message": e.detail, "status": e.status_code}))
+        except LLMOverloaded as e:
+            if Config.LLM_SHED_RESPONSE == "429":
+                await queue.put(("error", {"message": str(e), "status": 429, "retry_after": math.ceil(e.retry_after)}))
+            else:
+                await queue.put(("token", {"text": HOLD_MESSAGE}))
+                await queue.put(("done", await _hold_response(request, e)))
+        except LLMInterrupted as e:
+            await queue.put(("error", {"message": str(e), "interrupted": True}))
+        except Exception as e:
+            await queue.put(("error", {"message": str(e)}))
+
+    async def events():
+        task = asyncio.create_task(run_turn())
+        try:
+            while True:
+                event, data = await queue.get()
+                yield _sse_event(event, data)
+                if event != "token":
+                    break
+        finally:
+            if not task.done():
+                task.cancel()
+
+    return StreamingResponse(
+        events(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
 @app.post("/update-context")
-def update_context(request: UpdateContextRequest):
-    session = sessions.get(request.session_id)
-    if not session:
-        return {"error": "Invalid session"}
-    
-    # Update context data
-    session["context_data"].update(request.context_data)
-    
+async def update_context(request: UpdateContextRequest):
+    async with session_locks.hold(request.session_id):
+        session = await sessions.aget(request.session_id)
+        if not session:
+            return {"error": "Invalid session"}
+
+        _, context_data = _fit_to_budget(session.get("scenario_id"), context_data=request.context_data)
+        # Update context data (declared fields only, typed; empty values clear a field)
+        _context_schema(session.get("scenario_id")).apply(session["context_data"], context_data, clear_empty=True)
+        await sessions.aput(request.session_id, session)
+        speculative_turns.discard(request.session_id)
+
     return {
         "session_id": request.session_id,
         "context_data": session["context_data"],
@@ -195,16 +516,20 @@ def update_context(request: UpdateContextRequest):
     }
 
 @app.post("/reset-session-context")
-def reset_session_context(request: UpdateContextRequest):
-    session = sessions.get(request.session_id)
-    if not session:
-        return {"error": "Invalid session"}
-    
-    # Completely reset context data to the provided data
-    session["context_data"] = request.context_data
-    
+async def reset_session_context(request: UpdateContextRequest):
+    async with session_locks.hold(request.session_id):
+        session = await sessions.aget(request.session_id)
+        if not session:
+            return {"error": "Invalid session"}
+
+        _, context_data = _fit_to_budget(session.get("scenario_id"), context_data=request.context_data)
+        # Completely reset context data to the provided data
+        session["context_data"] = _context_schema(session.get("scenario_id")).clean(context_data)
+        await sessions.aput(request.session_id, session)
+        speculative_turns.discard(request.session_id)
+
     return {
         "session_id": request.session_id,
         "context_data": session["context_data"],
         "message": "Session context reset successfully"
-    }
\ No newline at end of file
+    }
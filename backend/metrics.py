@@ -0,0 +1,201 @@
+# backend/metrics.py
+"""
+Prometheus metrics, served by ``GET /metrics``.
+
+Histograms and counters are updated inline: HTTP routes by the middleware in
+``main.py``, graph nodes by the scenario engine, model calls and reply
+decoding by ``agents.streaming``, routes and cost by ``agents.model_router``,
+the call queue by ``agents.llm_scheduler`` and deadlines, hedges and the
+circuit breaker by ``agents.llm_resilience``.
+Session gauges (live sessions, sessions per active substep) are computed from
+the session backend at scrape time.
+
+With several uvicorn workers, set ``PROMETHEUS_MULTIPROC_DIR`` to an empty
+directory shared by the workers so every scrape aggregates all of them.
+"""
+
+import os
+
+from prometheus_client import (
+    CONTENT_TYPE_LATEST,
+    CollectorRegistry,
+    Counter,
+    Gauge,
+    Histogram,
+    REGISTRY,
+    generate_latest,
+)
+from prometheus_client.core import GaugeMetricFamily
+
+# Model calls take seconds; local work (templates, cache hits) takes milliseconds
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+HTTP_REQUEST_DURATION = Histogram(
+    "caregiver_http_request_duration_seconds",
+    "HTTP request latency by route (until the response headers for streamed routes).",
+    ["method", "route", "status"],
+    buckets=LATENCY_BUCKETS,
+)
+NODE_DURATION = Histogram(
+    "caregiver_graph_node_duration_seconds",
+    "Scenario node duration, by how the turn was answered (template, cache or llm) or shed.",
+    ["node", "source"],
+    buckets=LATENCY_BUCKETS,
+)
+LLM_REQUEST_DURATION = Histogram(
+    "caregiver_llm_request_duration_seconds",
+    "Model call latency, from request to the last token.",
+    ["scenario", "model", "mode"],
+    buckets=LATENCY_BUCKETS,
+)
+LLM_TIME_TO_FIRST_TOKEN = Histogram(
+    "caregiver_llm_time_to_first_token_seconds",
+    "Time until the first streamed token of a model call.",
+    ["scenario", "model"],
+    buckets=LATENCY_BUCKETS,
+)
+LLM_PROMPT_TOKENS = Counter(
+    "caregiver_llm_prompt_tokens",
+    "Prompt tokens reported by the provider.",
+    ["scenario", "model"],
+)
+LLM_COMPLETION_TOKENS = Counter(
+    "caregiver_llm_completion_tokens",
+    "Completion tokens reported by the provider.",
+    ["scenario", "model"],
+)
+PROMPT_TOKENS = Histogram(
+    "caregiver_prompt_tokens",
+    "Tokens per prompt section of each model call (instructions, rules, workflow, examples, context, history, user_input, total).",
+    ["scenario", "section"],
+    buckets=(50, 100, 250, 500, 1000, 2000, 4000, 8000, 16000, 32000),
+)
+LLM_INFLIGHT = Gauge(
+    "caregiver_llm_inflight",
+    "Model calls currently holding a scheduler slot.",
+    multiprocess_mode="livesum",
+)
+LLM_QUEUE_DEPTH = Gauge(
+    "caregiver_llm_queue_depth",
+    "Model calls waiting for a scheduler slot.",
+    multiprocess_mode="livesum",
+)
+LLM_QUEUE_WAIT = Histogram(
+    "caregiver_llm_queue_wait_seconds",
+    "Time model calls waited for a scheduler slot.",
+    buckets=LATENCY_BUCKETS,
+)
+LLM_SHED = Counter(
+    "caregiver_llm_shed",
+    "Model calls shed by the scheduler (queue_full, predicted_wait or timeout).",
+    ["reason"],
+)
+ROUTE_DURATION = Histogram(
+    "caregiver_llm_route_duration_seconds",
+    "Time of routed model calls per scenario and model tier (small or large).",
+    ["scenario", "tier"],
+    buckets=LATENCY_BUCKETS,
+)
+ROUTE_ESCALATIONS = Counter(
+    "caregiver_llm_route_escalations",
+    "Small-tier calls re-run on the large tier (parse_failure, bad_substep or unavailable).",
+    ["scenario", "reason"],
+)
+LLM_COST = Counter(
+    "caregiver_llm_cost_usd",
+    "Estimated model spend in USD from provider-reported tokens and MODEL_PRICES.",
+    ["scenario", "model"],
+)
+LLM_HEDGED = Counter(
+    "caregiver_llm_hedged",
+    "Second requests of model calls per tier: hedge (first was slow), retry (first failed), won (second answered first).",
+    ["tier", "kind"],
+)
+LLM_CALL_FAILURES = Counter(
+    "caregiver_llm_call_failures",
+    "Model calls per tier that failed (timeout, error or circuit_open).",
+    ["tier", "reason"],
+)
+LLM_BREAKER_STATE = Gauge(
+    "caregiver_llm_breaker_state",
+    "State of each model tier's circuit breaker: 0 closed, 1 half-open, 2 open.",
+    ["tier"],
+    multiprocess_mode="max",
+)
+IDEMPOTENT_REQUESTS = Counter(
+    "caregiver_idempotent_requests",
+    "Requests answered with another request's response: coalesced (original still running) or replayed (already finished).",
+    ["outcome"],
+)
+SPECULATIVE_TURNS = Counter(
+    "caregiver_speculative_turns",
+    "Opening turns generated at /start-session, by outcome: started, ready (served finished), inflight (served once done), mismatch, failed or expired.",
+    ["outcome"],
+)
+EXTRACTION_PARSE_FAILURES = Counter(
+    "caregiver_extraction_parse_failures",
+    "Scenario completions whose context update could not be used.",
+    ["scenario", "reason"],
+)
+REPLY_DECODES = Counter(
+    "caregiver_reply_decodes",
+    "Decoded scenario completions by reply format and outcome: clean, salvaged (text around the JSON), partial (truncated JSON recovered) or failed.",
+    ["scenario", "format", "outcome"],
+)
+
+
+class SessionCollector:
+    """
+    Live sessions and sessions per (scenario, substep), as last read from the
+    session backend by ``refresh`` (called on scrape, off the event loop
+    for the backends that query a database).
+    """
+
+    def __init__(self, sessions):
+        self.sessions = sessions
+        self.live_sessions = 0
+        self.substeps = {}
+
+    async def refresh(self):
+        self.live_sessions = (await self.sessions.astats()).get("live_sessions", 0)
+        self.substeps = await self.sessions.asubstep_counts()
+
+    def collect(self):
+        live = GaugeMetricFamily("caregiver_live_sessions", "Sessions currently stored.")
+        live.add_metric([], self.live_sessions)
+        yield live
+        substeps = GaugeMetricFamily(
+            "caregiver_session_substep", "Sessions currently at each workflow substep.", labels=["scenario", "substep"]
+        )
+        for (scenario_id, substep), count in self.substeps.items():
+            substeps.add_metric([str(scenario_id), str(substep)], count)
+        yield substeps
+
+
+_session_collector = None
+
+
+def register_sessions(sessions):
+    global _session_collector
+    _session_collector = SessionCollector(sessions)
+    if not os.environ.get("PROMETHEUS_MULTIPROC_DIR"):
+        REGISTRY.register(_session_collector)
+
+
+async def refresh_sessions():
+    """Read the session gauges before a scrape."""
+    if _session_collector is not None:
+        await _session_collector.refresh()
+
+
+def render():
+    """``(body, content_type)`` for the /metrics response."""
+    if os.environ.get("PROMETHEUS_MULTIPROC_DIR"):
+        from prometheus_client import multiprocess
+
+        registry = CollectorRegistry()
+        multiprocess.MultiProcessCollector(registry)
+        if _session_collector is not None:
+            registry.register(_session_collector)
+        return generate_latest(registry), CONTENT_TYPE_LATEST
+    return generate_latest(REGISTRY), CONTENT_TYPE_LATEST
@@ -20,12 +20,20 @@ def main():
     print(f"📍 Server will run on http://{Config.HOST}:{Config.PORT}")
     print(f"🔧 Debug mode: {Config.DEBUG}")
     
+    # Reload mode is single-process; more than one worker needs a shared session backend
+    workers = 1 if Config.DEBUG else Config.WORKERS
+    if workers > 1 and Config.SESSION_BACKEND == "memory":
+        print("⚠️  SESSION_BACKEND=memory only works with one worker; starting a single worker")
+        workers = 1
+    print(f"👷 Workers: {workers} (session backend: {Config.SESSION_BACKEND})")
+    
     try:
         uvicorn.run(
             "main:app",
             host=Config.HOST,
             port=Config.PORT,
             reload=Config.DEBUG,
+            workers=workers,
             log_level="info"
         )
     except KeyboardInterrupt:
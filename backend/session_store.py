@@ -0,0 +1,437 @@
+# backend/session_store.py
+"""
+Session storage backends.
+
+Every backend has the same small interface (``get``/``put``/``delete``/
+``sweep``/``stats``), and ``main.py`` does exactly one ``get`` and one ``put``
+per turn, so sessions can live in process memory or in a store shared by all
+uvicorn workers. The event loop uses the ``aget``/``aput``/``adelete``
+variants, which a backend doing blocking I/O runs in a worker thread:
+
+- ``SessionStore``: bounded in-memory store (LRU + idle TTL + byte budget).
+  Only valid with a single worker.
+- ``SQLiteSessionStore``: one SQLite file in WAL mode, shared by every worker
+  on the host.
+- ``NetworkSessionStore``: any key-value client with redis-style
+  ``get``/``set(ex=)``/``delete`` (e.g. ``redis.Redis``); ``LocalKeyValueStore``
+  is an in-process stand-in that satisfies the same interface.
+"""
+
+import asyncio
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+
+from langchain_core.messages import AIMessage, HumanMessage, SystemMessage
+
+from json_codec import dumps_bytes, loads
+
+# Rough per-object overhead added to the size estimate of each message/session
+MESSAGE_OVERHEAD_BYTES = 64
+SESSION_OVERHEAD_BYTES = 256
+
+
+def estimate_session_bytes(session):
+    """Cheap, approximate size of a session (message text + context JSON)."""
+    size = SESSION_OVERHEAD_BYTES
+    for message in session.get("messages", ()):
+        size += MESSAGE_OVERHEAD_BYTES + len(getattr(message, "content", "") or "")
+    size += len(dumps_bytes(session.get("context_data") or {}))
+    size += len(session.get("summary") or "")
+    return size
+
+
+# Compact message encoding for shared backends: [type, content]
+_MESSAGE_TYPES = {"human": HumanMessage, "ai": AIMessage, "system": SystemMessage}
+
+
+def serialize_session(session):
+    data = {
+        "scenario_id": session.get("scenario_id"),
+        "context_data": session.get("context_data") or {},
+        "messages": [[message.type, message.content] for message in session.get("messages", ())],
+        "summary": session.get("summary", ""),
+        "summarized_upto": session.get("summarized_upto", 0),
+    }
+    return dumps_bytes(data)
+
+
+def deserialize_session(raw):
+    data = loads(raw)
+    data["messages"] = [
+        _MESSAGE_TYPES.get(message_type, HumanMessage)(content=content)
+        for message_type, content in data.get("messages", ())
+    ]
+    return data
+
+
+class SessionBackend:
+    """Interface shared by the session backends."""
+
+    sweep_interval = 60.0
+    _sweeper = None
+
+    def get(self, session_id):
+        """Return the session dict, or None if it does not exist or expired."""
+        raise NotImplementedError
+
+    def put(self, session_id, session):
+        """Create or overwrite a session."""
+        raise NotImplementedError
+
+    def delete(self, session_id):
+        raise NotImplementedError
+
+    async def aget(self, session_id):
+        return self.get(session_id)
+
+    async def aput(self, session_id, session):
+        self.put(session_id, session)
+
+    async def adelete(self, session_id):
+        self.delete(session_id)
+
+    def sweep(self):
+        """Drop expired sessions. Returns how many were dropped."""
+        return 0
+
+    def stats(self):
+        raise NotImplementedError
+
+    def substep_counts(self):
+        """``{(scenario_id, substep): sessions}`` for the metrics; empty if the backend cannot tell."""
+        return {}
+
+    async def astats(self):
+        return self.stats()
+
+    async def asubstep_counts(self):
+        return self.substep_counts()
+
+    def __contains__(self, session_id):
+        return self.get(session_id) is not None
+
+    async def _sweep_forever(self):
+        while True:
+            await asyncio.sleep(self.sweep_interval)
+            await self.asweep()
+
+    async def asweep(self):
+        return self.sweep()
+
+    def start_sweeper(self):
+        if self._sweeper is None:
+            self._sweeper = asyncio.get_running_loop().create_task(self._sweep_forever())
+
+    async def stop_sweeper(self):
+        if self._sweeper is not None:
+            self._sweeper.cancel()
+            try:
+                await self._sweeper
+            except asyncio.CancelledError:
+                pass
+            self._sweeper = None
+
+    def close(self):
+        pass
+
+
+class SessionStore(SessionBackend):
+    def __init__(self, max_sessions=10000, max_bytes=256 * 1024 * 1024, idle_ttl=1800.0, sweep_interval=60.0):
+        self.max_sessions = max_sessions
+        self.max_bytes = max_bytes
+        self.idle_ttl = idle_ttl
+        self.sweep_interval = sweep_interval
+        # session_id -> [session, last_access, size]
+        self._entries = OrderedDict()
+        self._total_bytes = 0
+        self.evictions = {"ttl": 0, "lru": 0, "bytes": 0}
+
+    def __len__(self):
+        return len(self._entries)
+
+    def get(self, session_id):
+        """Return the session (marking it recently used), or None if missing/expired."""
+        entry = self._entries.get(session_id)
+        if entry is None:
+            return None
+        now = time.monotonic()
+        if now - entry[1] > self.idle_ttl:
+            self._remove(session_id)
+            self.evictions["ttl"] += 1
+            return None
+        entry[1] = now
+        self._entries.move_to_end(session_id)
+        return entry[0]
+
+    def put(self, session_id, session):
+        """Store or re-measure a session after it changed, then enforce the budgets."""
+        size = estimate_session_bytes(session)
+        entry = self._entries.get(session_id)
+        if entry is not None:
+            self._total_bytes -= entry[2]
+        self._entries[session_id] = [session, time.monotonic(), size]
+        self._entries.move_to_end(session_id)
+        self._total_bytes += size
+        self._enforce_budgets(keep=session_id)
+
+    def delete(self, session_id):
+        self._remove(session_id)
+
+    def _remove(self, session_id):
+        entry = self._entries.pop(session_id, None)
+        if entry is not None:
+            self._total_bytes -= entry[2]
+
+    def _enforce_budgets(self, keep=None):
+        while len(self._entries) > self.max_sessions:
+            if not self._evict_oldest(keep):
+                break
+            self.evictions["lru"] += 1
+        while self._total_bytes > self.max_bytes:
+            if not self._evict_oldest(keep):
+                break
+            self.evictions["bytes"] += 1
+
+    def _evict_oldest(self, keep):
+        for session_id in self._entries:
+            if session_id != keep:
+                self._remove(session_id)
+                return True
+        return False
+
+    def sweep(self):
+        """Drop every session idle for longer than the TTL. Returns how many were dropped."""
+        cutoff = time.monotonic() - self.idle_ttl
+        expired = []
+        # Entries are in access order, so stop at the first one still alive.
+        for session_id, entry in self._entries.items():
+            if entry[1] > cutoff:
+                break
+            expired.append(session_id)
+        for session_id in expired:
+            self._remove(session_id)
+        self.evictions["ttl"] += len(expired)
+        return len(expired)
+
+    def substep_counts(self):
+        counts = {}
+        for session, _, _ in list(self._entries.values()):
+            key = (session.get("scenario_id"), (session.get("context_data") or {}).get("substep"))
+            counts[key] = counts.get(key, 0) + 1
+        return counts
+
+    def stats(self):
+        return {
+            "backend": "memory",
+            "live_sessions": len(self._entries),
+            "approx_bytes": self._total_bytes,
+            "evictions": dict(self.evictions),
+        }
+
+
+class SQLiteSessionStore(SessionBackend):
+    """
+    Sessions in a single SQLite database in WAL mode, so every uvicorn worker
+    on the host sees the same sessions. Readers never block the writer, and
+    each turn costs one SELECT and one UPSERT. The async methods run them in
+    a worker thread: a write waiting out another worker's lock (up to the
+    5 s busy timeout) must not stall the event loop.
+    """
+
+    def __init__(self, path, idle_ttl=1800.0, sweep_interval=60.0):
+        self.path = path
+        self.idle_ttl = idle_ttl
+        self.sweep_interval = sweep_interval
+        self._lock = threading.Lock()
+        self.evictions = {"ttl": 0}
+        directory = os.path.dirname(os.path.abspath(path))
+        os.makedirs(directory, exist_ok=True)
+        self._conn = sqlite3.connect(path, timeout=5.0, check_same_thread=False, isolation_level=None)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS sessions ("
+            "session_id TEXT PRIMARY KEY, data BLOB NOT NULL, last_access REAL NOT NULL)"
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS sessions_last_access ON sessions (last_access)")
+
+    def get(self, session_id):
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT data, last_access FROM sessions WHERE session_id = ?", (session_id,)
+            ).fetchone()
+        if row is None:
+            return None
+        if time.time() - row[1] > self.idle_ttl:
+            self.delete(session_id)
+            self.evictions["ttl"] += 1
+            return None
+        return deserialize_session(row[0])
+
+    def put(self, session_id, session):
+        with self._lock:
+            self._conn.execute(
+                "INSERT INTO sessions (session_id, data, last_access) VALUES (?, ?, ?) "
+                "ON CONFLICT(session_id) DO UPDATE SET data = excluded.data, last_access = excluded.last_access",
+                (session_id, serialize_session(session), time.time()),
+            )
+
+    def delete(self, session_id):
+        with self._lock:
+            self._conn.execute("DELETE FROM sessions WHERE session_id = ?", (session_id,))
+
+    async def aget(self, session_id):
+        return await asyncio.to_thread(self.get, session_id)
+
+    async def aput(self, session_id, session):
+        await asyncio.to_thread(self.put, session_id, session)
+
+    async def adelete(self, session_id):
+        await asyncio.to_thread(self.delete, session_id)
+
+    async def asweep(self):
+        return await asyncio.to_thread(self.sweep)
+
+    async def astats(self):
+        return await asyncio.to_thread(self.stats)
+
+    async def asubstep_counts(self):
+        return await asyncio.to_thread(self.substep_counts)
+
+    def sweep(self):
+        with self._lock:
+            cursor = self._conn.execute(
+                "DELETE FROM sessions WHERE last_access < ?", (time.time() - self.idle_ttl,)
+            )
+        self.evictions["ttl"] += cursor.rowcount
+        return cursor.rowcount
+
+    def stats(self):
+        with self._lock:
+            live_sessions = self._conn.execute("SELECT COUNT(*) FROM sessions").fetchone()[0]
+        return {
+            "backend": "sqlite",
+            "live_sessions": live_sessions,
+            "evictions": dict(self.evictions),
+        }
+
+    def substep_counts(self):
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT json_extract(data, '$.scenario_id'), json_extract(data, '$.context_data.substep'), COUNT(*) "
+                "FROM sessions GROUP BY 1, 2"
+            ).fetchall()
+        return {(scenario_id, substep): count for scenario_id, substep, count in rows}
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+
+class LocalKeyValueStore:
+    """
+    In-process stand-in for a network key-value store (redis-style
+    ``get``/``set(ex=)``/``delete``). Useful for development and benchmarks;
+    it is not shared between workers.
+    """
+
+    def __init__(self):
+        self._data = {}
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            item = self._data.get(key)
+            if item is None:
+                return None
+            value, expires_at = item
+            if expires_at is not None and time.time() >= expires_at:
+                del self._data[key]
+                return None
+            return value
+
+    def set(self, key, value, ex=None):
+        with self._lock:
+            self._data[key] = (value, time.time() + ex if ex else None)
+        return True
+
+    def delete(self, key):
+        with self._lock:
+            return 1 if self._data.pop(key, None) is not None else 0
+
+
+class NetworkSessionStore(SessionBackend):
+    """
+    Sessions in a network key-value store. The client only needs redis-style
+    ``get(key)``, ``set(key, value, ex=seconds)`` and ``delete(key)``, so a
+    ``redis.Redis`` instance or ``LocalKeyValueStore`` both work. Idle TTL is
+    delegated to the store by refreshing the expiry on every write.
+    """
+
+    def __init__(self, client, idle_ttl=1800.0, key_prefix="session:"):
+        self.client = client
+        self.idle_ttl = idle_ttl
+        self.key_prefix = key_prefix
+        self.reads = 0
+        self.writes = 0
+
+    def get(self, session_id):
+        self.reads += 1
+        raw = self.client.get(self.key_prefix + session_id)
+        return deserialize_session(raw) if raw is not None else None
+
+    def put(self, session_id, session):
+        self.writes += 1
+        self.client.set(self.key_prefix + session_id, serialize_session(session), ex=int(self.idle_ttl))
+
+    def delete(self, session_id):
+        self.client.delete(self.key_prefix + session_id)
+
+    # Network round trips stay off the event loop
+    async def aget(self, session_id):
+        return await asyncio.to_thread(self.get, session_id)
+
+    async def aput(self, session_id, session):
+        await asyncio.to_thread(self.put, session_id, session)
+
+    async def adelete(self, session_id):
+        await asyncio.to_thread(self.delete, session_id)
+
+    def start_sweeper(self):
+        # Expiry is handled by the store itself
+        pass
+
+    def stats(self):
+        return {"backend": "network", "reads": self.reads, "writes": self.writes}
+
+
+def create_session_store(config):
+    """Build the session backend selected by ``config.SESSION_BACKEND``."""
+    backend = config.SESSION_BACKEND
+    if backend == "memory":
+        return SessionStore(
+            max_sessions=config.SESSION_MAX_ENTRIES,
+            max_bytes=config.SESSION_MAX_BYTES,
+            idle_ttl=config.SESSION_IDLE_TTL,
+            sweep_interval=config.SESSION_SWEEP_INTERVAL,
+        )
+    if backend == "sqlite":
+        return SQLiteSessionStore(
+            config.SESSION_SQLITE_PATH,
+            idle_ttl=config.SESSION_IDLE_TTL,
+            sweep_interval=config.SESSION_SWEEP_INTERVAL,
+        )
+    if backend == "network":
+        if config.SESSION_NETWORK_URL == "local://":
+            client = LocalKeyValueStore()
+        else:
+            try:
+                import redis
+            except ImportError as e:
+                raise ValueError("SESSION_BACKEND=network requires the 'redis' package for redis:// URLs.") from e
+            client = redis.Redis.from_url(config.SESSION_NETWORK_URL)
+        return NetworkSessionStore(client, idle_ttl=config.SESSION_IDLE_TTL)
+    raise ValueError(f"Unknown SESSION_BACKEND: {backend!r} (expected memory, sqlite or network)")
@@ -0,0 +1,114 @@
+# backend/session_turns.py
+"""
+Ordering and de-duplication of requests that touch a session.
+
+``SessionLocks`` runs the requests of one session one at a time, in arrival
+order, so two turns never interleave their messages or context updates.
+Locks are per process: with several workers, requests of one session are
+only ordered when they reach the same worker.
+
+``IdempotentRequests`` coalesces retries. A request that repeats the
+idempotency key of a request still in flight waits for the original's
+response instead of running the turn (and its model call) again, and a
+repeat shortly after the original finished gets the stored response. The
+original turn runs as its own task, so a client that drops the connection
+and retries does not cancel the work its retry is waiting for.
+"""
+
+import asyncio
+import copy
+import time
+from collections import OrderedDict
+from contextlib import asynccontextmanager
+
+from metrics import IDEMPOTENT_REQUESTS
+
+
+class SessionLocks:
+    def __init__(self):
+        # session_id -> [lock, holders and waiters]
+        self._locks = {}
+        self.waits = 0
+
+    @asynccontextmanager
+    async def hold(self, session_id):
+        entry = self._locks.get(session_id)
+        if entry is None:
+            entry = self._locks[session_id] = [asyncio.Lock(), 0]
+        entry[1] += 1
+        try:
+            if entry[0].locked():
+                self.waits += 1
+            async with entry[0]:
+                yield
+        finally:
+            entry[1] -= 1
+            if entry[1] == 0:
+                del self._locks[session_id]
+
+    def stats(self):
+        return {"active_sessions": len(self._locks), "waits": self.waits}
+
+
+class IdempotentRequests:
+    def __init__(self, max_entries=10000, ttl=300.0):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self._inflight = {}
+        # key -> (response, stored_at), oldest first
+        self._done = OrderedDict()
+        self.coalesced = 0
+        self.replayed = 0
+
+    def _completed(self, key):
+        entry = self._done.get(key)
+        if entry is None:
+            return None
+        if time.monotonic() - entry[1] > self.ttl:
+            del self._done[key]
+            return None
+        return entry[0]
+
+    def _store(self, key, response):
+        if self.max_entries <= 0:
+            return
+        self._done[key] = (response, time.monotonic())
+        self._done.move_to_end(key)
+        while len(self._done) > self.max_entries:
+            self._done.popitem(last=False)
+
+    async def run(self, key, handler):
+        """
+        ``await handler()``, unless ``key`` (None disables coalescing) is
+        already running or recently finished; then the same response.
+        """
+        if key is None:
+            return await handler()
+        response = self._completed(key)
+        if response is not None:
+            self.replayed += 1
+            IDEMPOTENT_REQUESTS.labels("replayed").inc()
+            return copy.deepcopy(response)
+        task = self._inflight.get(key)
+        if task is not None:
+            self.coalesced += 1
+            IDEMPOTENT_REQUESTS.labels("coalesced").inc()
+            return copy.deepcopy(await asyncio.shield(task))
+
+        task = self._inflight[key] = asyncio.ensure_future(handler())
+
+        def finish(task):
+            self._inflight.pop(key, None)
+            if not task.cancelled() and task.exception() is None:
+                self._store(key, copy.deepcopy(task.result()))
+
+        task.add_done_callback(finish)
+        return await asyncio.shield(task)
+
+    def stats(self):
+        return {
+            "inflight": len(self._inflight),
+            "stored": len(self._done),
+            "coalesced": self.coalesced,
+            "replayed": self.replayed,
+        }
@@ -0,0 +1,106 @@
+# backend/speculative_turns.py
+"""
+Opening turns generated before the caregiver asks for them.
+
+``/start-session`` can start the session's first turn (the ``greet`` step)
+right away, with the scenario, the initial context and the opening message
+clients send (``Config.SPECULATIVE_OPENING_MESSAGE``). The first ``/chat`` of
+the session takes the result if it asks exactly that turn - same scenario,
+message and context - either finished or by awaiting the generation still in
+flight. Any other first turn discards it and runs normally, and so does a
+context change before the first turn (``discard``).
+
+Speculations are kept per process (an in-flight generation cannot be shared
+across workers) and expire after ``ttl`` seconds.
+"""
+
+import asyncio
+import time
+from collections import OrderedDict
+
+from json_codec import canonical_json
+from metrics import SPECULATIVE_TURNS
+
+
+def speculation_key(scenario_id, message, context_data):
+    """What a first turn must match to be served from a speculation."""
+    return (scenario_id, (message or "").strip(), canonical_json(context_data or {}))
+
+
+class SpeculativeTurns:
+    def __init__(self, ttl=120.0, max_entries=10000):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        # session_id -> (key, task, started_at), oldest first
+        self._entries = OrderedDict()
+        self.counts = {"started": 0, "ready": 0, "inflight": 0, "mismatch": 0, "failed": 0, "expired": 0}
+
+    def _count(self, outcome):
+        self.counts[outcome] += 1
+        SPECULATIVE_TURNS.labels(outcome).inc()
+
+    def _drop(self, session_id, outcome):
+        _, task, _ = self._entries.pop(session_id)
+        task.cancel()
+        self._count(outcome)
+
+    def _expire(self):
+        now = time.monotonic()
+        while self._entries:
+            session_id, (_, _, started_at) = next(iter(self._entries.items()))
+            if now - started_at <= self.ttl and len(self._entries) <= self.max_entries:
+                break
+            self._drop(session_id, "expired")
+
+    def start(self, session_id, key, generate):
+        """Run ``await generate()`` in the background as the speculation for ``session_id``."""
+        if self.max_entries <= 0:
+            return
+        if session_id in self._entries:
+            self._drop(session_id, "mismatch")
+        task = asyncio.ensure_future(generate())
+        # Retrieve a failure here so it is not logged as never retrieved
+        task.add_done_callback(lambda task: task.cancelled() or task.exception())
+        self._entries[session_id] = (key, task, time.monotonic())
+        self._count("started")
+        self._expire()
+
+    async def take(self, session_id, key):
+        """The speculated result for this first turn, or None if there is none to use."""
+        self._expire()
+        entry = self._entries.pop(session_id, None)
+        if entry is None:
+            return None
+        expected, task, _ = entry
+        if expected != key:
+            task.cancel()
+            self._count("mismatch")
+            return None
+        outcome = "ready" if task.done() else "inflight"
+        try:
+            result = await asyncio.shield(task)
+        except asyncio.CancelledError:
+            if task.cancelled():
+                self._count("failed")
+                return None
+            # The caller was cancelled, not the generation: keep it for a retry
+            self._entries[session_id] = entry
+            raise
+        except Exception:
+            self._count("failed")
+            return None
+        self._count(outcome)
+        return result
+
+    def discard(self, session_id):
+        """Drop the session's speculation, if any (its context no longer matches)."""
+        if session_id in self._entries:
+            self._drop(session_id, "mismatch")
+
+    def stats(self):
+        served = self.counts["ready"] + self.counts["inflight"]
+        return {
+            **self.counts,
+            "pending": len(self._entries),
+            "served_rate": served / self.counts["started"] if self.counts["started"] else 0.0,
+        }
@@ -0,0 +1,52 @@
+from json_codec import decode_model_object, decode_object, recover_partial
+
+
+def test_recover_partial_drops_a_member_cut_off_in_its_key():
+    assert recover_partial('{"reply": "Hi", "subs') == {"reply": "Hi"}
+
+
+def test_recover_partial_drops_a_member_cut_off_in_its_value():
+    assert recover_partial('{"reply": "Hi", "substep": "gre') == {"reply": "Hi"}
+    assert recover_partial('{"reply": "Hi", "count": 12') == {"reply": "Hi"}
+    assert recover_partial('{"reply": "Hi", "ok": tr') == {"reply": "Hi"}
+    assert recover_partial('{"reply": "Hi", "substep":') == {"reply": "Hi"}
+
+
+def test_recover_partial_closes_a_nested_array():
+    text = '{"reply": "Hi", "fields": {"days": ["mon", "tu'
+    assert recover_partial(text) == {"reply": "Hi", "fields": {"days": ["mon"]}}
+
+
+def test_recover_partial_keeps_escapes_and_braces_inside_strings():
+    assert recover_partial('{"reply": "a \\"}\\" b", "x": "{') == {"reply": 'a "}" b'}
+
+
+def test_recover_partial_of_a_complete_object_with_text_after_it():
+    assert recover_partial('{"a": [1, 2]} and more') == {"a": [1, 2]}
+
+
+def test_recover_partial_without_an_object():
+    assert recover_partial("no json here") is None
+    assert recover_partial('["a", "b"') is None
+
+
+def test_decode_clean():
+    assert decode_model_object('{"a": 1}') == ({"a": 1}, "clean")
+
+
+def test_decode_fenced_and_chatty_payloads():
+    assert decode_model_object('```json\n{"a": 1}\n```') == ({"a": 1}, "salvaged")
+    assert decode_model_object('Sure! Here it is: {"a": {"b": 2}} Let me know.') == ({"a": {"b": 2}}, "salvaged")
+
+
+def test_decode_truncated_only_recovered_when_asked():
+    text = '{"a": 1, "b": "cut'
+    assert decode_model_object(text) == (None, "invalid_json")
+    assert decode_model_object(text, partial=True) == ({"a": 1}, "partial")
+
+
+def test_decode_non_objects():
+    assert decode_model_object("[1, 2]") == (None, "not_object")
+    assert decode_model_object("Just some text.") == (None, "invalid_json")
+    assert decode_model_object("") == (None, "invalid_json")
+    assert decode_object(None) == (None, "invalid_json")
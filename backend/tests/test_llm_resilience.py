@@ -0,0 +1,95 @@
+import asyncio
+import time
+
+import pytest
+
+from agents.llm_resilience import CircuitBreaker, LLMGuard, LLMUnavailable
+
+
+def test_breaker_opens_after_consecutive_failures():
+    breaker = CircuitBreaker(failure_threshold=2, reset_timeout=60.0)
+    breaker.record_failure()
+    assert breaker.allow()
+    breaker.record_failure()
+    assert breaker.state == "open"
+    assert not breaker.allow()
+
+
+def test_half_open_lets_one_probe_through():
+    breaker = CircuitBreaker(failure_threshold=1, reset_timeout=0.05)
+    breaker.record_failure()
+    time.sleep(0.06)
+    assert breaker.allow()
+    assert breaker.state == "half_open"
+    # Only one probe at a time
+    assert not breaker.allow()
+    breaker.record_success()
+    assert breaker.state == "closed"
+    assert breaker.allow()
+
+
+def test_failed_probe_reopens():
+    breaker = CircuitBreaker(failure_threshold=1, reset_timeout=0.05)
+    breaker.record_failure()
+    time.sleep(0.06)
+    assert breaker.allow()
+    breaker.record_failure()
+    assert breaker.state == "open"
+    assert not breaker.allow()
+    assert breaker.opened == 2
+
+
+def test_probe_that_never_reports_back_expires():
+    breaker = CircuitBreaker(failure_threshold=1, reset_timeout=0.05)
+    breaker.record_failure()
+    time.sleep(0.06)
+    assert breaker.allow()
+    assert not breaker.allow()
+    time.sleep(0.06)
+    assert breaker.allow()
+
+
+class Transient(Exception):
+    status_code = 503
+
+
+class Invalid(Exception):
+    status_code = 400
+
+
+def test_guard_counts_transient_errors_against_the_breaker():
+    guard = LLMGuard(deadline=1.0, breaker=CircuitBreaker(failure_threshold=2, reset_timeout=60.0))
+
+    async def attempt():
+        raise Transient()
+
+    for _ in range(2):
+        with pytest.raises(LLMUnavailable) as error:
+            asyncio.run(guard.call(attempt))
+        assert error.value.reason == "error"
+    with pytest.raises(LLMUnavailable) as error:
+        asyncio.run(guard.call(attempt))
+    assert error.value.reason == "circuit_open"
+
+
+def test_guard_raises_invalid_requests_without_opening_the_breaker():
+    guard = LLMGuard(deadline=1.0, breaker=CircuitBreaker(failure_threshold=1, reset_timeout=60.0))
+
+    async def attempt():
+        raise Invalid()
+
+    with pytest.raises(Invalid):
+        asyncio.run(guard.call(attempt))
+    assert guard.breaker.state == "closed"
+    assert guard.stats()["invalid"] == 1
+
+
+def test_guard_times_out_a_slow_call():
+    guard = LLMGuard(deadline=0.05)
+
+    async def attempt():
+        await asyncio.sleep(1.0)
+
+    with pytest.raises(LLMUnavailable) as error:
+        asyncio.run(guard.call(attempt))
+    assert error.value.reason == "timeout"
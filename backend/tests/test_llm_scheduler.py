@@ -0,0 +1,118 @@
+import asyncio
+
+import pytest
+
+from agents.llm_scheduler import LLMOverloaded, LLMScheduler
+
+
+async def _hold(scheduler, release, key="default"):
+    async with scheduler.slot(key):
+        await release.wait()
+
+
+async def _settle():
+    for _ in range(5):
+        await asyncio.sleep(0)
+
+
+def test_full_queue_is_shed():
+    async def run():
+        scheduler = LLMScheduler(max_inflight=1, deadline=5.0, max_queue=1)
+        release = asyncio.Event()
+        holder = asyncio.ensure_future(_hold(scheduler, release))
+        queued = asyncio.ensure_future(_hold(scheduler, release))
+        await _settle()
+        with pytest.raises(LLMOverloaded) as shed:
+            await _hold(scheduler, release)
+        release.set()
+        await asyncio.gather(holder, queued)
+        return shed.value, scheduler.stats()
+
+    error, stats = asyncio.run(run())
+    assert error.reason == "queue_full"
+    assert error.retry_after >= 1.0
+    assert stats["shed"] == 1
+    assert stats["inflight"] == 0 and stats["queue_depth"] == 0
+
+
+def test_predicted_wait_over_the_deadline_is_shed_without_queueing():
+    async def run():
+        scheduler = LLMScheduler(max_inflight=1, deadline=0.05)
+        async with scheduler.slot():
+            # Sets the recent call duration to ~0.1s, twice the deadline
+            await asyncio.sleep(0.1)
+        release = asyncio.Event()
+        holder = asyncio.ensure_future(_hold(scheduler, release))
+        await _settle()
+        with pytest.raises(LLMOverloaded) as shed:
+            await _hold(scheduler, release)
+        release.set()
+        await holder
+        return shed.value, scheduler.stats()
+
+    error, stats = asyncio.run(run())
+    assert error.reason == "predicted_wait"
+    assert stats["queued"] == 0
+
+
+def test_wait_past_the_deadline_is_shed():
+    async def run():
+        scheduler = LLMScheduler(max_inflight=1, deadline=0.05)
+        release = asyncio.Event()
+        holder = asyncio.ensure_future(_hold(scheduler, release))
+        await _settle()
+        with pytest.raises(LLMOverloaded) as shed:
+            await _hold(scheduler, release)
+        release.set()
+        await holder
+        return shed.value, scheduler.stats()
+
+    error, stats = asyncio.run(run())
+    assert error.reason == "timeout"
+    assert stats["queued"] == 1
+    assert stats["inflight"] == 0 and stats["queue_depth"] == 0
+
+
+def test_cancelled_waiter_is_skipped():
+    async def run():
+        scheduler = LLMScheduler(max_inflight=1, deadline=5.0)
+        release = asyncio.Event()
+        holder = asyncio.ensure_future(_hold(scheduler, release, "a"))
+        cancelled = asyncio.ensure_future(_hold(scheduler, asyncio.Event(), "b"))
+        waiter = asyncio.ensure_future(_hold(scheduler, release, "c"))
+        await _settle()
+        cancelled.cancel()
+        await _settle()
+        assert scheduler.stats()["queue_depth"] == 1
+        release.set()
+        await asyncio.wait_for(asyncio.gather(holder, waiter), 1.0)
+        return scheduler.stats()
+
+    stats = asyncio.run(run())
+    assert stats["inflight"] == 0 and stats["queue_depth"] == 0
+
+
+def test_slot_granted_to_a_cancelled_waiter_is_handed_on():
+    async def run():
+        scheduler = LLMScheduler(max_inflight=1, deadline=5.0)
+        release = asyncio.Event()
+        first_done = asyncio.Event()
+
+        async def first():
+            async with scheduler.slot("a"):
+                await first_done.wait()
+
+        holder = asyncio.ensure_future(first())
+        granted = asyncio.ensure_future(_hold(scheduler, asyncio.Event(), "b"))
+        waiter = asyncio.ensure_future(_hold(scheduler, release, "c"))
+        await _settle()
+        first_done.set()
+        await holder
+        # "b" was granted the slot but is cancelled before it resumes
+        granted.cancel()
+        release.set()
+        await asyncio.wait_for(waiter, 1.0)
+        return scheduler.stats()
+
+    stats = asyncio.run(run())
+    assert stats["inflight"] == 0 and stats["queue_depth"] == 0
@@ -0,0 +1,137 @@
+import datetime
+
+from agents.rule_extractors import (
+    DEFAULT_FIELD_RULES,
+    extract_date,
+    extract_phone,
+    extract_schedule,
+    extract_time,
+    extract_weekday,
+    extract_yes_no,
+    prefill_fields,
+)
+
+TODAY = datetime.date(2026, 3, 10)
+
+
+def test_phone():
+    assert extract_phone("my number is (555) 123-4567") == "555-123-4567"
+    assert extract_phone("+1 555.123.4567") == "555-123-4567"
+    assert extract_phone("call 555-123-4567 or 555-987-6543") is None
+    assert extract_phone("visit 12345") is None
+
+
+def test_time_with_meridiem():
+    assert extract_time("I got there at 9:20 am") == "9:20 AM"
+    assert extract_time("around 5pm") == "5:00 PM"
+    assert extract_time("at noon") == "12:00 PM"
+    assert extract_time("at 12 am") == "12:00 AM"
+
+
+def test_bare_time_is_only_read_when_unambiguous():
+    assert extract_time("1:15") is None
+    assert extract_time("I arrived at 9:05") is None
+    assert extract_time("I arrived at 13:40") == "1:40 PM"
+    assert extract_time("0:30") == "12:30 AM"
+    assert extract_time("9:05 in the morning") == "9:05 AM"
+    assert extract_time("7:30 tonight") == "7:30 PM"
+    assert extract_time("13:40 in the evening") is None
+
+
+def test_time_needs_a_single_value():
+    assert extract_time("between 9 am and 5 pm") is None
+    assert extract_time("13 am") is None
+    assert extract_time("no time here") is None
+
+
+def test_weekday():
+    assert extract_weekday("remove Friday please") == "Friday"
+    assert extract_weekday("tues") == "Tuesday"
+    assert extract_weekday("Monday or Tuesday") is None
+    assert extract_weekday("we sat down on the sun deck") is None
+
+
+def test_schedule():
+    assert extract_schedule("Mon-Wed 9am to 5pm") == "Monday, Tuesday, Wednesday 9:00 AM-5:00 PM"
+    assert extract_schedule("Friday") == "Friday"
+    assert extract_schedule("9 to 5") is None
+
+
+def test_date():
+    assert extract_date("2026-04-01") == "2026-04-01"
+    assert extract_date("on 4/1", today=TODAY) == "2026-04-01"
+    assert extract_date("March 3rd", today=TODAY) == "2026-03-03"
+    assert extract_date("4/1/26") == "2026-04-01"
+    assert extract_date("13/40") is None
+    assert extract_date("4/1 or 4/2", today=TODAY) is None
+
+
+def test_explicit_date_ignores_fractions():
+    assert extract_date("half 1/2 day", explicit=True) is None
+    assert extract_date("1/2/2026", explicit=True) == "2026-01-02"
+    assert extract_date("Jan 2", today=TODAY, explicit=True) == "2026-01-02"
+
+
+def test_yes_no():
+    assert extract_yes_no("Yes, that's him") is True
+    assert extract_yes_no("yep") is True
+    assert extract_yes_no("Okay.") is True
+    assert extract_yes_no("right") is True
+    assert extract_yes_no("No, I can't") is False
+    assert extract_yes_no("Yes, but I can't right now") is None
+
+
+def test_yes_no_ignores_filler_openers():
+    assert extract_yes_no("Right now I'm at the house") is None
+    assert extract_yes_no("Ok so the app broke") is None
+    assert extract_yes_no("Okay, what do I do next?") is None
+    assert extract_yes_no("I think so") is None
+
+
+def test_yes_no_cant_is_not_can():
+    assert extract_yes_no("I can't") is False
+    assert extract_yes_no("I can't do that") is False
+    assert extract_yes_no("I can’t") is False
+    assert extract_yes_no("I cannot") is False
+    assert extract_yes_no("I can") is True
+    assert extract_yes_no("I can do that") is True
+
+
+def test_yes_no_no_problem_is_a_yes():
+    assert extract_yes_no("No problem") is True
+    assert extract_yes_no("Not a problem at all") is True
+    assert extract_yes_no("no worries!") is True
+    assert extract_yes_no("No problem, but I can't today") is None
+    assert extract_yes_no("No") is False
+
+
+def test_prefill_reads_cant_as_no():
+    rules = {"can_try_again": "yes_no"}
+    assert prefill_fields("I can’t do that", rules, ("can_try_again",), {}) == {"can_try_again": False}
+
+
+def test_prefill_step_fields():
+    rules = {"actual_start_time": "time", "client_on_phone": "yes_no"}
+    assert prefill_fields("9:20 am", rules, ("actual_start_time",), {}) == {"actual_start_time": "9:20 AM"}
+    assert prefill_fields("1:15", rules, ("actual_start_time",), {}) == {}
+    assert prefill_fields("yes", rules, ("client_on_phone",), {}) == {"client_on_phone": True}
+
+
+def test_prefill_yes_no_needs_one_question():
+    rules = {"client_on_phone": "yes_no", "client_name_confirmed": "yes_no"}
+    assert prefill_fields("yes", rules, ("client_on_phone", "client_name_confirmed"), {}) == {}
+
+
+def test_prefill_self_evident_values():
+    rules = {"today_date": "date", "unregistered_phone": "phone", "client_on_phone": "yes_no"}
+    assert prefill_fields("I only worked half 1/2 day", rules, (), {}) == {}
+    assert prefill_fields("it was on 2026-04-01", rules, (), {}) == {"today_date": "2026-04-01"}
+    assert prefill_fields("use 555-123-4567", rules, (), {}) == {"unregistered_phone": "555-123-4567"}
+    # Already set: not overwritten from outside the step
+    assert prefill_fields("use 555-123-4567", rules, (), {"unregistered_phone": "555-000-0000"}) == {}
+    # A step asking for the date still reads a bare M/D
+    assert prefill_fields("1/2", rules, ("today_date",), {})["today_date"].endswith("-01-02")
+
+
+def test_default_rules_use_known_kinds():
+    assert set(DEFAULT_FIELD_RULES.values()) <= {"phone", "time", "weekday", "date", "schedule", "yes_no"}
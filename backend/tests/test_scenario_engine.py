@@ -0,0 +1,33 @@
+from agents.scenario_duplicate_call import SPEC as DUPLICATE_CALL
+from agents.scenario_engine import CompiledScenario
+from agents.scenario_gps_out_of_range import SPEC as GPS_OUT_OF_RANGE
+from agents.scenario_no_schedule import SPEC as NO_SCHEDULE
+
+
+def test_single_next_step_that_extracts_can_stay():
+    compiled = CompiledScenario.compile(GPS_OUT_OF_RANGE)
+    assert compiled.next_substep("greet", "greet") == "greet"
+    assert compiled.next_substep("greet", "get_location") == "get_location"
+    # Anything else keeps the step
+    assert compiled.next_substep("greet", "end") == "greet"
+    assert compiled.next_substep("greet", None) == "greet"
+
+
+def test_explain_duplicate_stays_while_questions_continue():
+    compiled = CompiledScenario.compile(DUPLICATE_CALL)
+    assert compiled.next_substep("explain_duplicate", "explain_duplicate") == "explain_duplicate"
+    assert compiled.next_substep("explain_duplicate", "end") == "end"
+
+
+def test_templated_step_always_moves_on():
+    compiled = CompiledScenario.compile(NO_SCHEDULE)
+    nxt = compiled.transitions["greet"]
+    assert len(nxt) == 1
+    assert compiled.next_substep("greet", None) == nxt[0]
+    assert compiled.next_substep("greet", "greet") == nxt[0]
+
+
+def test_route_check_rejects_a_substep_outside_stay_or_advance():
+    compiled = CompiledScenario.compile(GPS_OUT_OF_RANGE)
+    assert compiled.route_check("greet", {"substep": "greet"}) is None
+    assert compiled.route_check("greet", {"substep": "end"}) == "bad_substep"
@@ -0,0 +1,80 @@
+import asyncio
+
+import pytest
+
+from session_turns import IdempotentRequests
+
+
+def test_concurrent_retry_is_coalesced():
+    requests = IdempotentRequests()
+    calls = []
+
+    async def handler():
+        calls.append(1)
+        await asyncio.sleep(0.01)
+        return {"message": "hi"}
+
+    async def run():
+        return await asyncio.gather(requests.run("k", handler), requests.run("k", handler))
+
+    assert asyncio.run(run()) == [{"message": "hi"}, {"message": "hi"}]
+    assert len(calls) == 1
+    assert requests.stats()["coalesced"] == 1
+
+
+def test_finished_request_is_replayed_as_a_copy():
+    requests = IdempotentRequests()
+    calls = []
+
+    async def handler():
+        calls.append(1)
+        return {"message": "hi"}
+
+    first = asyncio.run(requests.run("k", handler))
+    first["message"] = "changed"
+    assert asyncio.run(requests.run("k", handler)) == {"message": "hi"}
+    assert len(calls) == 1
+    assert requests.stats()["replayed"] == 1
+
+
+def test_failed_turn_is_not_stored():
+    requests = IdempotentRequests()
+    outcomes = [RuntimeError("provider down"), {"message": "hi"}]
+
+    async def handler():
+        outcome = outcomes.pop(0)
+        if isinstance(outcome, Exception):
+            raise outcome
+        return outcome
+
+    with pytest.raises(RuntimeError):
+        asyncio.run(requests.run("k", handler))
+    assert requests.stats()["stored"] == 0
+    assert asyncio.run(requests.run("k", handler)) == {"message": "hi"}
+    assert requests.stats()["replayed"] == 0
+
+
+def test_no_key_is_never_coalesced():
+    requests = IdempotentRequests()
+    calls = []
+
+    async def handler():
+        calls.append(1)
+        return {}
+
+    asyncio.run(requests.run(None, handler))
+    asyncio.run(requests.run(None, handler))
+    assert len(calls) == 2
+
+
+def test_expired_response_runs_again():
+    requests = IdempotentRequests(ttl=0.0)
+    calls = []
+
+    async def handler():
+        calls.append(1)
+        return {}
+
+    asyncio.run(requests.run("k", handler))
+    asyncio.run(requests.run("k", handler))
+    assert len(calls) == 2
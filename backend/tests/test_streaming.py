@@ -0,0 +1,87 @@
+from agents.streaming import ExtractedStreamSplitter, StructuredReplyParser, split_extracted
+
+
+def _feed_all(parser, chunks):
+    shown = [parser.feed(chunk) for chunk in chunks]
+    shown.append(parser.flush())
+    return shown, parser.close()
+
+
+def test_splitter_holds_back_a_delimiter_split_across_chunks():
+    splitter = ExtractedStreamSplitter()
+    shown, (reply, extracted) = _feed_all(splitter, ["Hello there ---EXT", "RACT", 'ED---\n{"substep": "greet"}'])
+    assert "".join(shown) == "Hello there "
+    assert reply == "Hello there\n"
+    assert extracted == {"substep": "greet"}
+    assert splitter.outcome == "clean"
+
+
+def test_splitter_releases_text_that_was_not_the_delimiter():
+    splitter = ExtractedStreamSplitter()
+    assert splitter.feed("Wait --") == "Wait "
+    assert splitter.feed("- ok") == "--- ok"
+
+
+def test_splitter_salvages_a_fenced_block():
+    reply, extracted = split_extracted('Hi\n---EXTRACTED---\n```json\n{"substep": "end"}\n```')
+    assert (reply, extracted) == ("Hi\n", {"substep": "end"})
+
+
+def test_splitter_without_delimiter_keeps_the_reply():
+    splitter = ExtractedStreamSplitter()
+    shown, (reply, extracted) = _feed_all(splitter, ["Just a ", "reply -"])
+    assert "".join(shown) == "Just a reply -"
+    assert (reply, extracted) == ("Just a reply -", {})
+    assert splitter.parse_error == "missing_delimiter"
+
+
+def test_splitter_reports_a_broken_block():
+    splitter = ExtractedStreamSplitter()
+    _feed_all(splitter, ["Hi\n---EXTRACTED---\nnot json"])
+    assert splitter.parse_error == "invalid_json"
+
+
+def test_parser_streams_the_reply_across_split_key_and_escapes():
+    parser = StructuredReplyParser()
+    chunks = ['{"rep', 'ly": "Caf', "\\u00", 'e9 \\ud83d', '\\ude00 \\', 'n!", "substep": "greet", ', '"fields": {"a": 1, "b": null}}']
+    shown, (reply, extracted) = _feed_all(parser, chunks)
+    assert shown == ["", "Caf", "", "é ", "\U0001F600 ", "\n!", "", ""]
+    assert reply == "Café \U0001F600 \n!\n"
+    assert extracted == {"a": 1, "substep": "greet"}
+    assert parser.outcome == "clean"
+
+
+def test_parser_recovers_a_completion_cut_off_in_the_fields():
+    parser = StructuredReplyParser()
+    _, (reply, extracted) = _feed_all(parser, ['{"reply": "Hi", "substep": "s", "fields": {"days": ["mon", "tu'])
+    assert reply == "Hi\n"
+    assert extracted == {"days": ["mon"], "substep": "s"}
+    assert parser.outcome == "partial"
+
+
+def test_parser_keeps_the_streamed_reply_when_cut_off_inside_it():
+    parser = StructuredReplyParser()
+    shown, (reply, extracted) = _feed_all(parser, ['{"reply": "Hello the'])
+    assert "".join(shown) == "Hello the"
+    assert (reply, extracted) == ("Hello the\n", {})
+    assert parser.parse_error == "missing_fields"
+
+
+def test_parser_reads_fenced_and_chatty_payloads():
+    for text in (
+        '```json\n{"reply": "Hi", "substep": "end", "fields": {}}\n```',
+        'Here you go: {"reply": "Hi", "substep": "end", "fields": {}} Thanks!',
+    ):
+        parser = StructuredReplyParser()
+        shown, (reply, extracted) = _feed_all(parser, [text])
+        assert "".join(shown) == "Hi"
+        assert (reply, extracted) == ("Hi\n", {"substep": "end"})
+        assert parser.outcome == "salvaged"
+
+
+def test_parser_makes_a_non_json_completion_the_reply():
+    parser = StructuredReplyParser()
+    shown, (reply, extracted) = _feed_all(parser, ["Sure, I can ", "help with that."])
+    assert "".join(shown) == "Sure, I can help with that."
+    assert (reply, extracted) == ("Sure, I can help with that.\n", {})
+    assert parser.parse_error == "invalid_json"
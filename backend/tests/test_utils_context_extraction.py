@@ -0,0 +1,120 @@
+import asyncio
+import json
+import re
+
+import pytest
+
+from agents import model_router, utils_context_extraction
+from agents.utils_context_extraction import ExtractionBatcher, extract_context_field
+
+_JOB = re.compile(r"^Job (\d+):\nMessage: '(.*)'\nFields: (.*)$", re.MULTILINE)
+
+
+class FakeModel:
+    """Answers each job with ``answer(message, field)`` for every field, or raises ``error``."""
+
+    def __init__(self, answer=None, error=None):
+        self.answer = answer or (lambda message, field: message.upper())
+        self.error = error
+        self.prompts = []
+
+    def _reply(self, prompt):
+        self.prompts.append(prompt)
+        if self.error is not None:
+            raise self.error
+        jobs = {
+            number: {field: self.answer(message, field) for field in fields.split(", ")}
+            for number, message, fields in _JOB.findall(prompt)
+        }
+
+        class Reply:
+            content = json.dumps(jobs)
+
+        return Reply()
+
+    async def ainvoke(self, prompt, config=None):
+        return self._reply(prompt)
+
+    def invoke(self, prompt, config=None):
+        return self._reply(prompt)
+
+
+class FakeTier:
+    def __init__(self, name, model):
+        self.name = name
+        self.model = name
+        self._model = model
+
+    def chat_model(self, temperature=None):
+        return self._model
+
+
+@pytest.fixture
+def fake_model(monkeypatch):
+    model = FakeModel()
+    for name in ("large", "small"):
+        monkeypatch.setitem(model_router.TIERS, name, FakeTier(name, model))
+    return model
+
+
+def test_concurrent_jobs_share_one_call_and_are_memoized(fake_model):
+    batcher = ExtractionBatcher(window=0.01)
+
+    async def run():
+        first = await asyncio.gather(
+            batcher.extract("john smith", ["client_name"]),
+            batcher.extract("mary jones", ["client_name"]),
+            batcher.extract("john smith", ["client_name"]),
+        )
+        again = await batcher.extract("john smith", ["client_name"])
+        return first, again
+
+    first, again = asyncio.run(run())
+    assert first == [{"client_name": "JOHN SMITH"}, {"client_name": "MARY JONES"}, {"client_name": "JOHN SMITH"}]
+    assert again == {"client_name": "JOHN SMITH"}
+    assert len(fake_model.prompts) == 1
+    assert batcher.stats()["coalesced"] == 1
+    assert batcher.stats()["memo_hits"] == 1
+
+
+def test_failed_batch_raises_to_every_job_and_is_not_memoized(fake_model):
+    batcher = ExtractionBatcher(window=0.01)
+    fake_model.error = ValueError("bad request")
+
+    async def run():
+        return await asyncio.gather(
+            batcher.extract("john smith", ["client_name"]),
+            batcher.extract("mary jones", ["client_name"]),
+            return_exceptions=True,
+        )
+
+    results = asyncio.run(run())
+    assert all(isinstance(result, ValueError) for result in results)
+
+    fake_model.error = None
+    assert asyncio.run(batcher.extract("john smith", ["client_name"])) == {"client_name": "JOHN SMITH"}
+    assert len(fake_model.prompts) == 2
+    assert batcher.stats()["memo_hits"] == 0
+
+
+def test_unanswered_job_is_not_memoized(fake_model):
+    batcher = ExtractionBatcher(window=0.01)
+    real_reply = fake_model._reply
+    fake_model._reply = lambda prompt: type("Reply", (), {"content": "{}"})
+
+    assert asyncio.run(batcher.extract("john smith", ["client_name"])) == {}
+    fake_model._reply = real_reply
+    assert asyncio.run(batcher.extract("john smith", ["client_name"])) == {"client_name": "JOHN SMITH"}
+    assert batcher.stats()["memo_entries"] == 1
+
+
+def test_extract_context_field_is_blocking_and_shares_the_memo(fake_model, monkeypatch):
+    batcher = ExtractionBatcher(window=0.01)
+    monkeypatch.setattr(utils_context_extraction, "extraction_batcher", batcher)
+
+    assert extract_context_field("john smith", "client_name") == {"client_name": "JOHN SMITH"}
+    assert asyncio.run(batcher.extract("john smith", ["client_name"])) == {"client_name": "JOHN SMITH"}
+    assert len(fake_model.prompts) == 1
+    # Rule fields never reach the model
+    assert extract_context_field("call me at 555-123-4567", "unregistered_phone") == {"unregistered_phone": "555-123-4567"}
+    assert len(fake_model.prompts) == 1